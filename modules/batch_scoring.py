@@ -0,0 +1,275 @@
+import argparse
+import glob
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from typing import Dict, Iterator, List, NamedTuple, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from gensim import corpora
+from gensim.models import LdaModel
+from scipy import sparse
+
+from modules.phrases import load_phrasers, phrase_and_lemmatize
+from modules.preprocessing import (
+    MORE_STOPWORDS,
+    VADER_COLUMNS,
+    ReviewCleaner,
+    score_sentiment,
+)
+
+KEY_COLUMNS = ["id", "user"]
+
+# topic probabilities below this are dropped, as in `get_document_topics`
+MINIMUM_PROBABILITY = 0.01
+
+# model and preprocessing objects loaded once by each worker process
+_scorer = None
+
+
+class ReviewScores(NamedTuple):
+    """Output of `score_reviews`: the topic mixture of each review, and a
+    dataframe with its keys, dominant topic and VADER scores.
+    """
+
+    topics: sparse.csr_matrix
+    reviews: pd.DataFrame
+
+
+class ReviewScorer:
+    """Preprocess reviews and compute their topic mixtures and sentiment.
+
+    Args:
+        model_path (str): location of the saved LDA model
+        dictionary_path (str): location of the saved Dictionary. Defaults
+            to the dictionary saved with the model.
+        phrasers_dir (str): folder holding the phrase models saved with
+            `save_phrasers`, when the model was trained on bigrams or
+            trigrams
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        dictionary_path: Union[str, None] = None,
+        phrasers_dir: Union[str, None] = None,
+    ) -> None:
+        self.model = LdaModel.load(model_path)
+        self.dictionary = (
+            corpora.Dictionary.load(dictionary_path)
+            if dictionary_path
+            else self.model.id2word
+        )
+        self.phrasers = load_phrasers(phrasers_dir) if phrasers_dir else []
+        self.cleaner = ReviewCleaner(extra_stop_words=MORE_STOPWORDS)
+
+    def score(self, reviews: List[str]) -> Tuple[sparse.csr_matrix, np.ndarray]:
+        """Topic mixtures and VADER scores of a chunk of reviews.
+
+        Args:
+            reviews (List[str]): raw book reviews
+
+        Returns:
+            A sparse matrix of topic probabilities and an array of VADER
+            scores, both with one row per review.
+        """
+        tokenized_reviews = [self.cleaner.tokenize(review) for review in reviews]
+        lemmas = list(phrase_and_lemmatize(tokenized_reviews, self.phrasers))
+
+        gamma, _ = self.model.inference(
+            [self.dictionary.doc2bow(review_lemmas) for review_lemmas in lemmas]
+        )
+        topics = (gamma / gamma.sum(axis=1, keepdims=True)).astype(np.float32)
+        topics[topics < MINIMUM_PROBABILITY] = 0
+
+        vader = score_sentiment(
+            [" ".join(review_lemmas) for review_lemmas in lemmas]
+        ).values
+        return sparse.csr_matrix(topics), vader
+
+
+def _init_worker(*args) -> None:
+    global _scorer
+    _scorer = ReviewScorer(*args)
+
+
+def _score_chunk(reviews: List[str]) -> Tuple[sparse.csr_matrix, np.ndarray]:
+    return _scorer.score(reviews)
+
+
+def iter_scored_chunks(
+    chunks: Iterator[pd.DataFrame],
+    model_path: str,
+    dictionary_path: Union[str, None] = None,
+    phrasers_dir: Union[str, None] = None,
+    n_jobs: int = 1,
+) -> Iterator[Tuple[pd.DataFrame, sparse.csr_matrix, np.ndarray]]:
+    """Score chunks of reviews, in order. With `n_jobs` > 1 chunks are
+    scored in a process pool where each worker loads the model once; at
+    most `2 * n_jobs` chunks are in flight at a time.
+    """
+    scorer_args = (model_path, dictionary_path, phrasers_dir)
+    if n_jobs == 1:
+        scorer = ReviewScorer(*scorer_args)
+        for chunk in chunks:
+            yield (chunk, *scorer.score(chunk.reviews.fillna("").tolist()))
+        return
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs, initializer=_init_worker, initargs=scorer_args
+    ) as executor:
+
+        def submit(chunk):
+            reviews = chunk.reviews.fillna("").tolist()
+            return chunk, executor.submit(_score_chunk, reviews)
+
+        pending = [submit(chunk) for chunk in islice(chunks, 2 * n_jobs)]
+        while pending:
+            chunk, future = pending.pop(0)
+            result = future.result()
+            for next_chunk in islice(chunks, 1):
+                pending.append(submit(next_chunk))
+            yield (chunk, *result)
+
+
+def _review_columns(
+    keys: pd.DataFrame, topics: sparse.csr_matrix, vader: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """Columns saved in reviews.npz for a chunk of scored reviews: their
+    keys (book IDs stay strings), dominant topic and VADER scores.
+    """
+    # topics numbered from 1, as in the notebooks and pyLDAvis
+    dominant_topic = np.asarray(topics.argmax(axis=1)).ravel() + 1
+    return {
+        "id": keys.id.fillna("").values.astype(str),
+        "user": keys.user.fillna("unknown").values.astype(str),
+        "dominant_topic": dominant_topic.astype(np.int16),
+        **{col: vader[:, i] for i, col in enumerate(VADER_COLUMNS)},
+    }
+
+
+def score_reviews(
+    reviews_path: str,
+    model_path: str,
+    output_dir: str,
+    dictionary_path: Union[str, None] = None,
+    phrasers_dir: Union[str, None] = None,
+    chunksize: int = 10000,
+    n_jobs: int = 1,
+) -> ReviewScores:
+    """Compute the topic mixture, dominant topic and VADER scores of every
+    review of a csv, streaming it in chunks. Results are written to
+    `output_dir`: the topic mixtures as a sparse matrix in topics.npz, and
+    the review keys, dominant topics and VADER scores as compressed
+    columns in reviews.npz. Load them with `load_review_scores`.
+
+    The scores of each chunk are written to `output_dir/shards` as soon as
+    they are computed, so memory use doesn't grow with the number of
+    reviews while scoring; the shards are joined into the final files at
+    the end. An empty csv gives empty scores.
+
+    Args:
+        reviews_path (str): csv with `id`, `user` and `reviews` columns
+        model_path (str): location of the saved LDA model
+        output_dir (str): folder where the scores are written
+        dictionary_path (str): location of the saved Dictionary
+        phrasers_dir (str): folder holding the saved phrase models
+        chunksize (int): number of reviews per chunk
+        n_jobs (int): number of processes
+
+    Returns:
+        The scores.
+    """
+    chunks = pd.read_csv(
+        reviews_path,
+        usecols=KEY_COLUMNS + ["reviews"],
+        dtype=object,
+        chunksize=chunksize,
+    )
+    chunks = (chunk for chunk in chunks if len(chunk))
+    shards_dir = os.path.join(output_dir, "shards")
+    # shards left by an interrupted run may come from other reviews
+    shutil.rmtree(shards_dir, ignore_errors=True)
+    os.makedirs(shards_dir)
+
+    n_scored = 0
+    for i, (chunk, chunk_topics, chunk_vader) in enumerate(
+        iter_scored_chunks(
+            chunks, model_path, dictionary_path, phrasers_dir, n_jobs=n_jobs
+        )
+    ):
+        shard = os.path.join(shards_dir, f"{i:06d}")
+        sparse.save_npz(shard + "_topics.npz", chunk_topics)
+        np.savez(
+            shard + "_reviews.npz",
+            **_review_columns(chunk[KEY_COLUMNS], chunk_topics, chunk_vader),
+        )
+        n_scored += len(chunk)
+        print(f"Scored {n_scored} reviews")
+
+    topic_shards = sorted(glob.glob(os.path.join(shards_dir, "*_topics.npz")))
+    if topic_shards:
+        topics = sparse.vstack(
+            [sparse.load_npz(path) for path in topic_shards], format="csr"
+        )
+    else:
+        num_topics = LdaModel.load(model_path).num_topics
+        topics = sparse.csr_matrix((0, num_topics), dtype=np.float32)
+    empty_columns = _review_columns(
+        pd.DataFrame(columns=KEY_COLUMNS),
+        topics[:0],
+        np.empty((0, len(VADER_COLUMNS)), dtype=np.float32),
+    )
+    sparse.save_npz(os.path.join(output_dir, "topics.npz"), topics)
+    del topics
+
+    review_shards = []
+    for path in sorted(glob.glob(os.path.join(shards_dir, "*_reviews.npz"))):
+        with np.load(path) as columns:
+            review_shards.append({name: columns[name] for name in columns.files})
+    columns = {
+        name: np.concatenate([empty] + [shard[name] for shard in review_shards])
+        for name, empty in empty_columns.items()
+    }
+    np.savez_compressed(os.path.join(output_dir, "reviews.npz"), **columns)
+    shutil.rmtree(shards_dir)
+    return load_review_scores(output_dir)
+
+
+def load_review_scores(output_dir: str) -> ReviewScores:
+    """Load the scores written by `score_reviews`."""
+    topics = sparse.load_npz(os.path.join(output_dir, "topics.npz"))
+    with np.load(os.path.join(output_dir, "reviews.npz")) as columns:
+        reviews = pd.DataFrame({name: columns[name] for name in columns.files})
+    return ReviewScores(topics, reviews)
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Score every review with a trained LDA model and VADER."
+    )
+    parser.add_argument("reviews_path", help="csv with id, user and reviews columns")
+    parser.add_argument("model_path", help="saved LDA model")
+    parser.add_argument("output_dir", help="folder where the scores are written")
+    parser.add_argument("--dictionary", default=None)
+    parser.add_argument("--phrasers-dir", default=None)
+    parser.add_argument("--chunksize", type=int, default=10000)
+    parser.add_argument("--n-jobs", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    scores = score_reviews(
+        args.reviews_path,
+        args.model_path,
+        args.output_dir,
+        dictionary_path=args.dictionary,
+        phrasers_dir=args.phrasers_dir,
+        chunksize=args.chunksize,
+        n_jobs=args.n_jobs,
+    )
+    print(scores.reviews.dominant_topic.value_counts().sort_index().to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,658 @@
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Dict, List
+
+import numpy as np
+import pandas as pd
+import requests
+
+if TYPE_CHECKING:
+    from modules.topic_inference import TopicInferenceService
+
+
+def benchmark_scraper_throughput(
+    n_books: int = 200,
+    max_workers: int = 8,
+    requests_per_second: float = 50.0,
+    latency: float = 0.05,
+) -> Dict[str, float]:
+    """Compare the pages per second achieved by the original serial
+    scraping loop and the thread pool in `write_htmls_to_csv`, using a
+    local stub server. The serial loop sleeps 1 / `requests_per_second`
+    seconds between pages, i.e. the same rate limit as the pool.
+
+    Args:
+        n_books (int): number of pages to scrape.
+        max_workers (int): number of concurrent requests in pooled mode.
+        requests_per_second (float): rate limit used by both modes.
+        latency (float): response time of the stub server, in seconds.
+
+    Returns:
+        Pages per second for each mode and the speedup of the pool.
+    """
+    from modules.scraper import simple_get, write_htmls_to_csv
+    from tests.stub_servers import stub_librarything_server
+
+    books_list = list(range(1, n_books + 1))
+    with stub_librarything_server(latency=latency) as url_template:
+        start = time.perf_counter()
+        for book_id in books_list:
+            simple_get(url_template.format(book_id))
+            time.sleep(1 / requests_per_second)
+        serial_time = time.perf_counter() - start
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            start = time.perf_counter()
+            write_htmls_to_csv(
+                books_list,
+                tmp_dir,
+                max_workers=max_workers,
+                requests_per_second=requests_per_second,
+                url_template=url_template,
+                max_retries=0,
+            )
+            pooled_time = time.perf_counter() - start
+
+    results = {
+        "serial_pages_per_second": n_books / serial_time,
+        "pooled_pages_per_second": n_books / pooled_time,
+        "speedup": serial_time / pooled_time,
+    }
+    print(
+        f"Serial: {results['serial_pages_per_second']:.1f} pages/s, "
+        f"pooled ({max_workers} workers): "
+        f"{results['pooled_pages_per_second']:.1f} pages/s "
+        f"({results['speedup']:.1f}x)"
+    )
+    return results
+
+
+def benchmark_html_storage(
+    csv_path: str, n_random_reads: int = 100
+) -> Dict[str, float]:
+    """Compare a csv of raw HTMLs written by `write_htmls_to_csv` with
+    the same pages in an `HtmlStore`: size on disk, time to load every
+    page and time to read single pages by book ID.
+
+    Args:
+        csv_path (str): location of the csv containing raw HTMLs.
+        n_random_reads (int): number of single pages read from each format.
+
+    Returns:
+        Sizes in MB and timings in seconds for both formats.
+    """
+    from modules.html_store import HtmlStore, convert_csv_to_store
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store_path = convert_csv_to_store(csv_path, os.path.join(tmp_dir, "pages.db"))
+
+        start = time.perf_counter()
+        raw_data = pd.read_csv(csv_path)
+        csv_load_time = time.perf_counter() - start
+        book_ids = random.sample(list(raw_data.book_id), n_random_reads)
+
+        start = time.perf_counter()
+        for book_id in book_ids:
+            raw_data.raw_html[raw_data.book_id == book_id].iloc[0]
+        csv_read_time = csv_load_time + time.perf_counter() - start
+
+        with HtmlStore(store_path) as store:
+            start = time.perf_counter()
+            store.to_dataframe()
+            store_load_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            for book_id in book_ids:
+                store.get(book_id)
+            store_read_time = time.perf_counter() - start
+
+        results = {
+            "csv_size_mb": os.path.getsize(csv_path) / 1e6,
+            "store_size_mb": os.path.getsize(store_path) / 1e6,
+            "csv_load_seconds": csv_load_time,
+            "store_load_seconds": store_load_time,
+            "csv_random_reads_seconds": csv_read_time,
+            "store_random_reads_seconds": store_read_time,
+        }
+    print(
+        f"Size: csv {results['csv_size_mb']:.1f} MB, "
+        f"store {results['store_size_mb']:.1f} MB\n"
+        f"Full load: csv {csv_load_time:.2f}s, store {store_load_time:.2f}s\n"
+        f"{n_random_reads} random reads: csv {csv_read_time:.2f}s "
+        f"(including load), store {store_read_time:.3f}s"
+    )
+    return results
+
+
+def benchmark_genre_assignment(shelves: pd.Series) -> Dict[str, float]:
+    """Compare the per-book `extract_book_genre_info` with the vectorised
+    `assign_book_genres` on a series of Goodreads shelves, e.g. the
+    goodreads_shelves column of the ~5K-book table, and check that both
+    assign the same genres.
+
+    Args:
+        shelves (pd.Series): Goodreads shelves and counts for each book.
+
+    Returns:
+        Timings in seconds and the share of books with identical genres.
+    """
+    from modules.book_genre_extractor import assign_book_genres, extract_book_genre_info
+
+    start = time.perf_counter()
+    per_book = shelves.map(extract_book_genre_info)
+    per_book_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    vectorised = assign_book_genres(shelves)
+    vectorised_time = time.perf_counter() - start
+
+    results = {
+        "per_book_seconds": per_book_time,
+        "vectorised_seconds": vectorised_time,
+        "speedup": per_book_time / vectorised_time,
+        "agreement": (per_book == vectorised).mean(),
+    }
+    print(
+        f"Per book: {per_book_time:.2f}s, vectorised: {vectorised_time:.2f}s "
+        f"({results['speedup']:.1f}x), identical genres for "
+        f"{100 * results['agreement']:.1f}% of books"
+    )
+    return results
+
+
+def benchmark_lemmatization(
+    texts: List[List[str]], batch_size: int = 1000, n_process: int = 1
+) -> Dict[str, float]:
+    """Compare the reviews per second lemmatized by the original
+    one-review-at-a-time loop and by `lemmatize_text_stream`, and check
+    that both produce the same lemmas.
+
+    Args:
+        texts (List[List[str]]): tokenized reviews
+        batch_size (int): number of reviews spaCy processes at a time
+        n_process (int): number of processes running the spaCy pipeline
+
+    Returns:
+        Reviews per second for each method and whether outputs match.
+    """
+    from modules.utils import get_nlp, lemmatize_text_stream
+
+    tags = ["NOUN", "ADJ"]
+    nlp = get_nlp()
+    start = time.perf_counter()
+    loop_lemmas = []
+    for sent in texts:
+        doc = nlp(" ".join(sent))
+        loop_lemmas.append([token.lemma_ for token in doc if token.pos_ in tags])
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stream_lemmas = list(
+        lemmatize_text_stream(
+            texts, tags=tags, batch_size=batch_size, n_process=n_process
+        )
+    )
+    stream_time = time.perf_counter() - start
+
+    results = {
+        "loop_reviews_per_second": len(texts) / loop_time,
+        "stream_reviews_per_second": len(texts) / stream_time,
+        "speedup": loop_time / stream_time,
+        "identical_output": float(loop_lemmas == stream_lemmas),
+    }
+    print(
+        f"Loop: {results['loop_reviews_per_second']:.0f} reviews/s, "
+        f"nlp.pipe ({n_process} processes): "
+        f"{results['stream_reviews_per_second']:.0f} reviews/s "
+        f"({results['speedup']:.1f}x), identical output: "
+        f"{loop_lemmas == stream_lemmas}"
+    )
+    return results
+
+
+def benchmark_import_time(
+    module: str = "modules.utils", warm_up: str = "", repeats: int = 5
+) -> Dict[str, float]:
+    """Measure how long a fresh Python process takes to import `module`,
+    and its peak memory, optionally after running `warm_up` code (e.g.
+    "m.get_nlp()" to include loading the spaCy model).
+
+    Args:
+        module (str): module to import, imported as `m`.
+        warm_up (str): code run after the import.
+        repeats (int): number of processes started; the fastest is kept.
+
+    Returns:
+        Import time in seconds and peak memory in MB.
+    """
+    code = (
+        "import resource, time\n"
+        "start = time.perf_counter()\n"
+        f"import {module} as m\n"
+        f"{warm_up}\n"
+        "elapsed = time.perf_counter() - start\n"
+        "print(elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)"
+    )
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    timings = []
+    for _ in range(repeats):
+        output = subprocess.run(
+            [sys.executable, "-c", code],
+            cwd=repo_root,
+            stdout=subprocess.PIPE,
+            check=True,
+            universal_newlines=True,
+        ).stdout.split()
+        timings.append((float(output[0]), int(output[1]) / 1024))
+
+    import_time, peak_memory = min(timings)
+    print(f"import {module}: {import_time:.2f}s, peak memory {peak_memory:.0f} MB")
+    return {"import_seconds": import_time, "peak_memory_mb": peak_memory}
+
+
+def benchmark_language_detection(
+    texts: List[str], n_jobs: int = 4, sample_size: int = 2000
+) -> Dict[str, float]:
+    """Compare `detect_language` applied one review at a time with the
+    batch `detect_languages` (fast path and process pool, no cache), and
+    measure how often the fast path agrees with full detection.
+
+    Args:
+        texts (List[str]): reviews
+        n_jobs (int): number of processes used by `detect_languages`
+        sample_size (int): number of reviews used for the comparison
+
+    Returns:
+        Timings in seconds, the share of reviews handled by the fast path
+        and the agreement of the fast path with full detection.
+    """
+    from modules.utils import detect_language, detect_languages, looks_english
+
+    sample = random.sample(list(texts), min(sample_size, len(texts)))
+
+    start = time.perf_counter()
+    full = [detect_language(text) for text in sample]
+    serial_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = detect_languages(sample, n_jobs=n_jobs)
+    batch_time = time.perf_counter() - start
+
+    fast_path = [looks_english(text) for text in sample]
+    n_fast = sum(fast_path)
+    n_agree = sum(lang == "en" for lang, fast in zip(full, fast_path) if fast)
+    results = {
+        "serial_seconds": serial_time,
+        "batch_seconds": batch_time,
+        "speedup": serial_time / batch_time,
+        "fast_path_share": n_fast / len(sample),
+        "fast_path_agreement": n_agree / n_fast if n_fast else float("nan"),
+        "overall_agreement": sum(a == b for a, b in zip(full, batch)) / len(sample),
+    }
+    print(
+        f"Serial: {serial_time:.2f}s, batch ({n_jobs} processes): "
+        f"{batch_time:.2f}s ({results['speedup']:.1f}x)\n"
+        f"Fast path used for {100 * results['fast_path_share']:.1f}% of reviews, "
+        f"agreeing with full detection {100 * results['fast_path_agreement']:.2f}% "
+        f"of the time ({100 * results['overall_agreement']:.2f}% overall)"
+    )
+    return results
+
+
+def benchmark_create_final_dataset(
+    df1: pd.DataFrame, df2: pd.DataFrame, df3: pd.DataFrame
+) -> Dict[str, float]:
+    """Compare time, peak memory and final memory use of
+    `create_final_dataset` with and without `compact=True`, and check
+    that both produce the same rows. The inputs are copied, so they are
+    left unchanged.
+
+    Args:
+        df1 (pd.Dataframe): dataframe containing reviews and book IDs
+        df2 (pd.Dataframe): dataframe containing book authors, titles and ISBNs
+        df3 (pd.Dataframe): dataframe containing book genre information
+
+    Returns:
+        Timings in seconds and memory in MB for both modes.
+    """
+    from modules.utils import create_final_dataset
+
+    results = {}
+    outputs = {}
+    for mode in ["original", "compact"]:
+        inputs = [df1.copy(), df2.copy(), df3.copy()]
+        tracemalloc.start()
+        start = time.perf_counter()
+        outputs[mode] = create_final_dataset(*inputs, compact=mode == "compact")
+        results[f"{mode}_seconds"] = time.perf_counter() - start
+        results[f"{mode}_peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+        results[f"{mode}_result_mb"] = outputs[mode].memory_usage(deep=True).sum() / 1e6
+
+    original = outputs["original"].astype(str).reset_index(drop=True)
+    compact = outputs["compact"].astype(str).reset_index(drop=True)
+    results["identical_rows"] = float(original.equals(compact))
+    for mode in ["original", "compact"]:
+        print(
+            f"{mode}: {results[f'{mode}_seconds']:.2f}s, "
+            f"peak {results[f'{mode}_peak_mb']:.0f} MB, "
+            f"result {results[f'{mode}_result_mb']:.0f} MB"
+        )
+    print(f"Identical rows: {original.equals(compact)}")
+    return results
+
+
+def benchmark_topic_inference(
+    service: "TopicInferenceService",
+    reviews: List[str],
+    n_requests: int = 500,
+    concurrency: int = 16,
+) -> Dict[str, float]:
+    """Load-test the topic inference HTTP server with `concurrency` clients
+    sending one review per request.
+
+    Args:
+        service (TopicInferenceService): started inference service
+        reviews (List[str]): reviews sent, cycling through them
+        n_requests (int): total number of requests
+        concurrency (int): number of requests in flight at once
+
+    Returns:
+        Median and 99th percentile latencies (in milliseconds) and the
+        number of requests answered per second.
+    """
+    from modules.topic_inference import make_topic_server
+
+    server = make_topic_server(service, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    url = f"http://127.0.0.1:{server.server_port}/topics"
+    sessions = threading.local()
+
+    def send(review: str) -> float:
+        if not hasattr(sessions, "session"):
+            sessions.session = requests.Session()
+        start = time.perf_counter()
+        resp = sessions.session.post(url, json={"review": review})
+        resp.raise_for_status()
+        return time.perf_counter() - start
+
+    try:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            latencies = list(
+                executor.map(
+                    send, (reviews[i % len(reviews)] for i in range(n_requests))
+                )
+            )
+        total_time = time.perf_counter() - start
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    results = {
+        "p50_ms": 1000 * float(np.percentile(latencies, 50)),
+        "p99_ms": 1000 * float(np.percentile(latencies, 99)),
+        "requests_per_second": n_requests / total_time,
+    }
+    print(
+        f"p50: {results['p50_ms']:.1f} ms, p99: {results['p99_ms']:.1f} ms, "
+        f"{results['requests_per_second']:.1f} requests/s "
+        f"({concurrency} concurrent clients)"
+    )
+    return results
+
+
+def benchmark_sentiment_scoring(texts: List[str], n_jobs: int = 4) -> Dict[str, float]:
+    """Compare the notebook's VADER scoring (`map(polarity_scores)`, then
+    DictVectorizer and one dense column at a time) with `score_sentiment`.
+
+    Args:
+        texts (List[str]): processed reviews
+        n_jobs (int): number of processes used by `score_sentiment`
+
+    Returns:
+        Timings in seconds and the largest difference between the scores.
+    """
+    from sklearn.feature_extraction import DictVectorizer
+
+    from modules.preprocessing import (
+        VADER_COLUMNS,
+        get_sentiment_analyzer,
+        score_sentiment,
+    )
+
+    analyzer = get_sentiment_analyzer()
+    start = time.perf_counter()
+    vader_scores = pd.Series(texts).map(analyzer.polarity_scores)
+    dvec = DictVectorizer()
+    vader_scores = dvec.fit_transform(vader_scores)
+    notebook = pd.DataFrame()
+    for i, col in enumerate(dvec.feature_names_):
+        notebook[f"vader_{col}"] = vader_scores[:, i].toarray().ravel()
+    notebook_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = score_sentiment(texts, n_jobs=n_jobs)
+    batch_time = time.perf_counter() - start
+
+    results = {
+        "notebook_seconds": notebook_time,
+        "batch_seconds": batch_time,
+        "speedup": notebook_time / batch_time,
+        "max_difference": float(
+            np.abs(notebook[VADER_COLUMNS].values - batch.values).max()
+        ),
+    }
+    print(
+        f"Notebook: {notebook_time:.2f}s, batch ({n_jobs} processes): "
+        f"{batch_time:.2f}s ({results['speedup']:.1f}x), "
+        f"largest difference {results['max_difference']:.1e}"
+    )
+    return results
+
+
+def benchmark_word_frequencies(
+    df: pd.DataFrame, genres: List[str], terms: int = 30
+) -> Dict[str, float]:
+    """Compare the top terms of several genres computed as in
+    `generate_word_counts_fig` (joining, splitting and counting the reviews
+    of each genre with FreqDist) with queries to a `TermIndex`.
+
+    Args:
+        df (pd.DataFrame): reviews with `reviews`, `book_genres` and `id`
+        genres (List[str]): genres compared
+        terms (int): number of top terms per genre
+
+    Returns:
+        Timings in seconds, and whether both give the same counts (terms
+        with equal counts may come in a different order).
+    """
+    from nltk import FreqDist
+
+    from modules.term_index import TermIndex
+
+    start = time.perf_counter()
+    freqdist_top = []
+    for genre in genres:
+        all_words = " ".join(df.reviews[df.book_genres == genre]).split()
+        fdist = FreqDist(all_words)
+        words_df = pd.DataFrame(
+            {"word": list(fdist.keys()), "count": list(fdist.values())}
+        )
+        freqdist_top.append(words_df.nlargest(columns="count", n=terms))
+    freqdist_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index = TermIndex.build(df)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    index_top = [index.top_terms(genre, n=terms) for genre in genres]
+    query_time = time.perf_counter() - start
+
+    identical = True
+    for genre, top, words_df in zip(genres, index_top, freqdist_top):
+        frequencies = index.term_frequencies(genre)
+        identical &= list(top.values) == list(words_df["count"])
+        identical &= list(frequencies[words_df.word].values) == list(words_df["count"])
+    results = {
+        "freqdist_seconds": freqdist_time,
+        "index_build_seconds": build_time,
+        "index_query_seconds": query_time,
+        "identical_counts": float(identical),
+    }
+    print(
+        f"FreqDist: {freqdist_time:.2f}s for {len(genres)} genres; "
+        f"index: built in {build_time:.2f}s, queried in {1000 * query_time:.1f}ms"
+    )
+    print(f"Identical counts: {identical}")
+    return results
+
+
+def benchmark_goodreads_metadata(
+    n_books: int = 50, delay: float = 0.05, latency: float = 0.01
+) -> Dict[str, float]:
+    """Compare collecting the titles then the shelves of books with one
+    request per book and field (as before the Goodreads cache) and with
+    `get_book_titles`/`get_book_shelves` sharing a `GoodreadsCache`,
+    against a local stub of the Goodreads API.
+
+    Args:
+        n_books (int): number of distinct books, each listed twice
+        delay (float): seconds between requests, in both modes
+        latency (float): response time of the stub server, in seconds
+
+    Returns:
+        The number of requests sent and the time taken by each mode, and
+        by a second run with the cache already filled.
+    """
+    from modules.goodreads_api_functions import (
+        fetch_goodreads_book,
+        get_book_shelves,
+        get_book_titles,
+        make_goodreads_scheduler,
+    )
+    from modules.goodreads_cache import GoodreadsCache
+    from tests.stub_servers import stub_goodreads_server
+
+    book_ids = list(range(1, n_books + 1)) * 2
+    results = {}
+    with stub_goodreads_server(latency=latency) as server:
+        base_url = server["base_url"]
+        start = time.perf_counter()
+        titles = []
+        for book_id in book_ids:
+            titles.append(fetch_goodreads_book(book_id, base_url)["title"])
+            time.sleep(delay)
+        shelves = []
+        for book_id in book_ids:
+            book = fetch_goodreads_book(book_id, base_url)
+            shelves.append(book["popular_shelves"]["shelf"])
+            time.sleep(delay)
+        results["uncached_seconds"] = time.perf_counter() - start
+        results["uncached_requests"] = server["requests"]
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            cache_path = os.path.join(tmp_dir, "goodreads.db")
+            for run in ["cached", "warm"]:
+                server["requests"] = 0
+                with GoodreadsCache(cache_path) as cache:
+                    scheduler = make_goodreads_scheduler(1 / delay, max_concurrency=1)
+                    kwargs = dict(cache=cache, base_url=base_url, scheduler=scheduler)
+                    start = time.perf_counter()
+                    assert get_book_titles(book_ids, **kwargs) == titles
+                    assert get_book_shelves(book_ids, **kwargs) == shelves
+                    results[f"{run}_seconds"] = time.perf_counter() - start
+                results[f"{run}_requests"] = server["requests"]
+
+    print(
+        f"Uncached: {results['uncached_requests']} requests, "
+        f"{results['uncached_seconds']:.2f}s; cached: "
+        f"{results['cached_requests']} requests, {results['cached_seconds']:.2f}s; "
+        f"second run: {results['warm_requests']} requests, "
+        f"{results['warm_seconds']:.2f}s"
+    )
+    return results
+
+
+def benchmark_goodreads_scheduler(
+    n_isbns: int = 300,
+    server_rate: float = 50.0,
+    latency: float = 0.05,
+    fixed_delay: float = 1.0,
+    n_fixed: int = 20,
+) -> Dict[str, float]:
+    """Compare looking up ISBNs with a fixed delay after each request (as
+    `acquire_goodreads_id` did before) and with an `AdaptiveScheduler`,
+    against a local stub of the Goodreads API that answers 429 with a
+    Retry-After header above `server_rate` requests per second. The
+    scheduler has no rate ceiling, so it has to find the limit from the
+    errors it gets.
+
+    Args:
+        n_isbns (int): number of ISBNs looked up by the scheduler
+        server_rate (float): rate limit of the server, in requests per second
+        latency (float): response time of the server, in seconds
+        fixed_delay (float): seconds waited after each request with a fixed
+            delay
+        n_fixed (int): number of ISBNs looked up with a fixed delay, fewer
+            than `n_isbns` as it is slow
+
+    Returns:
+        The ISBNs per second, 429 responses and failed ISBNs of each mode.
+    """
+    from modules.goodreads_api_functions import (
+        acquire_goodreads_id,
+        make_goodreads_scheduler,
+    )
+    from modules.goodreads_cache import GoodreadsCache
+    from tests.stub_servers import stub_goodreads_server
+
+    isbns = [f"978{i:010d}" for i in range(1, n_isbns + 1)]
+    expected = [int(isbn[-5:]) for isbn in isbns]
+    results = {}
+    with stub_goodreads_server(
+        latency=latency, requests_per_second=server_rate
+    ) as server:
+        url = f"{server['base_url']}/book/isbn_to_id"
+        start = time.perf_counter()
+        fixed_ids = []
+        for isbn in isbns[:n_fixed]:
+            resp = requests.get(url, params={"isbn": isbn})
+            fixed_ids.append(resp.json() if resp.status_code == 200 else None)
+            time.sleep(fixed_delay)
+        results["fixed_isbns_per_second"] = n_fixed / (time.perf_counter() - start)
+        results["fixed_throttled"] = server["throttled"]
+        results["fixed_failed"] = sum(
+            id_ != e for id_, e in zip(fixed_ids, expected[:n_fixed])
+        )
+
+        server["throttled"] = 0
+        scheduler = make_goodreads_scheduler(None, max_concurrency=16, seed=1)
+        with GoodreadsCache(":memory:") as cache:
+            start = time.perf_counter()
+            ids = acquire_goodreads_id(
+                isbns, cache=cache, base_url=server["base_url"], scheduler=scheduler
+            )
+            elapsed = time.perf_counter() - start
+        results["adaptive_isbns_per_second"] = n_isbns / elapsed
+        results["adaptive_throttled"] = server["throttled"]
+        results["adaptive_failed"] = sum(id_ != e for id_, e in zip(ids, expected))
+        results["adaptive_final_concurrency"] = scheduler.concurrency
+
+    for mode in ["fixed", "adaptive"]:
+        print(
+            f"{mode}: {results[f'{mode}_isbns_per_second']:.1f} ISBNs/s, "
+            f"{results[f'{mode}_throttled']} throttled, "
+            f"{results[f'{mode}_failed']} failed"
+        )
+    print(f"Server limit: {server_rate:.0f} requests/s")
+    return results
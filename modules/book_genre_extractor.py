@@ -1,3 +1,8 @@
+import ast
+import re
+from typing import List, Union
+
+import numpy as np
 import pandas as pd
 
 
@@ -15,10 +20,9 @@ def extract_book_genre_info(entry: pd.Series) -> pd.Series:
     Returns:
         Up to three genres for each book.
     """
-    genre_info = pd.DataFrame(eval(entry))
+    genre_info = pd.DataFrame(parse_shelves(entry))
     genre_info = genre_info.rename(columns={"@count": "counts", "@name": "genre"})
-    search_pattern = "|".join(genre_filter)
-    m_bad_genres = genre_info.genre.str.contains(search_pattern)
+    m_bad_genres = genre_info.genre.str.contains(genre_filter_pattern)
     clean_genre = genre_info[~m_bad_genres].copy()
 
     clean_genre = clean_genre.reset_index(drop=True)
@@ -33,6 +37,78 @@ def extract_book_genre_info(entry: pd.Series) -> pd.Series:
     return book_genre
 
 
+def parse_shelves(entry: Union[str, List[dict]]) -> List[dict]:
+    """Safely read Goodreads shelves saved as text (e.g. after a round
+    trip through a csv file). Shelves that are already lists are
+    returned unchanged.
+
+    Args:
+        entry (Union[str, List[dict]]): Goodreads shelves and counts for a book.
+
+    Returns:
+        A list of shelves, each a dictionary with "@name" and "@count" keys.
+    """
+    if isinstance(entry, str):
+        return ast.literal_eval(entry)
+    return entry
+
+
+def assign_book_genres(shelves: pd.Series, threshold: float = 0.25) -> pd.Series:
+    """Vectorised version of `extract_book_genre_info` for many books at once.
+
+    Shelves of every book are parsed once and stacked into a single long
+    dataframe. The genre filter is evaluated once per distinct shelf name
+    rather than once per shelf, shelves are mapped to broader genres with
+    `genre_dict`, and shares are computed with one groupby over all books.
+    Books without shelves (None or NaN, e.g. books the Goodreads API
+    doesn't know, or whose request failed) are skipped.
+
+    Args:
+        shelves (pd.Series): Goodreads shelves and corresponding counts
+            for a series of books.
+        threshold (float): minimum share of shelf counts a genre needs
+            to be assigned to a book.
+
+    Returns:
+        Up to three genres for each book, ordered by increasing share, or
+        NaN for books without shelves.
+    """
+    book_pos, names, counts = [], [], []
+    missing = set()
+    for pos, entry in enumerate(shelves):
+        if not isinstance(entry, (str, list)):
+            missing.add(pos)
+            continue
+        for shelf in parse_shelves(entry):
+            book_pos.append(pos)
+            names.append(shelf["@name"])
+            counts.append(shelf["@count"])
+    genre_info = pd.DataFrame({"book": book_pos, "genre": names, "counts": counts})
+
+    genre_map = {
+        name: genre_dict.get(name)
+        for name in genre_info.genre.unique()
+        if not genre_filter_pattern.search(name)
+    }
+    genre_info["filt_genre"] = genre_info.genre.map(genre_map)
+    genre_info = genre_info.dropna(subset=["filt_genre"])
+    genre_info["counts"] = genre_info.counts.astype(int)
+
+    genre_counts = genre_info.groupby(["book", "filt_genre"]).counts.sum()
+    genre_shares = genre_counts / genre_counts.groupby(level="book").transform("sum")
+    genre_shares = genre_shares[genre_shares > threshold].reset_index()
+    genre_shares = genre_shares.sort_values(["book", "counts"], kind="mergesort")
+    book_genres = genre_shares.groupby("book").filt_genre.apply(list)
+
+    return pd.Series(
+        [
+            np.nan if pos in missing else book_genres.get(pos, [])
+            for pos in range(len(shelves))
+        ],
+        index=shelves.index,
+    )
+
+
 # generating a filter for goodreads shelves
 # (i.e. categories that don't correspond to book genres)
 genre_filter = [
@@ -151,6 +227,8 @@ genre_filter = [
     "could-not-finish",
     "best-ever",
 ]
+# shelves are filtered out if their name contains any of the words above
+genre_filter_pattern = re.compile("|".join(genre_filter))
 
 
 # generating a white list for book genres
@@ -1,8 +1,26 @@
-from typing import List, Tuple
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from typing import Dict, Iterable, List, Tuple, Union
 
 import bs4
 import pandas as pd
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+from modules.html_store import HtmlStore
+
+# ISBNs corrected by hand in the notebook, by book title
+ISBN_FIXES_BY_TITLE = {
+    "The Glass Castle": "1844081826",
+    "Atonement (2001)": "9780099429791",
+    "The Handmaid's Tale (1985)": "9780385490818",
+    "Thirteen Reasons Why": "0141328290",
+}
+
+# only the divs holding book details are parsed by the fast extraction path
+BOOK_DETAILS_STRAINER = SoupStrainer(
+    "div", attrs={"class": re.compile(r"(^|\s)(headsummary|description)($|\s)")}
+)
 
 
 def extract_book_title(entry: bs4.BeautifulSoup) -> str:
@@ -72,6 +90,86 @@ def extract_book_details(entry: str) -> pd.Series:
     return pd.Series(data=[title, author, isbn], index=["book_title", "author", "isbn"])
 
 
+def extract_book_details_fast(
+    entry: str, parser: str = "html.parser"
+) -> Tuple[str, str, str]:
+    """Same as `extract_book_details`, but only the "headsummary" and
+    "description" divs are parsed (the rest of the page is skipped by a
+    SoupStrainer) and a plain tuple is returned instead of a Series.
+
+    Args:
+        entry (str): text from HTML
+        parser (str): parser used by BeautifulSoup, e.g. "html.parser"
+            or "lxml" if it is installed
+
+    Returns:
+        A tuple containing a book's title, author and ISBN
+    """
+    if not isinstance(entry, str):
+        return "", "", ""
+    soup = BeautifulSoup(entry, parser, parse_only=BOOK_DETAILS_STRAINER)
+    return extract_book_title(soup), extract_book_author(soup), extract_book_isbn(soup)
+
+
+def extract_book_details_batch(
+    entries: Iterable[str],
+    n_jobs: int = 1,
+    chunksize: int = 64,
+    parser: str = "html.parser",
+) -> pd.DataFrame:
+    """Extract book titles, authors and ISBNs from many HTMLs at once,
+    optionally spread across a pool of `n_jobs` processes. This replaces
+    `raw_data.raw_html.apply(extract_book_details)`, which creates one
+    Series per page, with a single dataframe built from three columns.
+
+    Args:
+        entries (Iterable[str]): texts from HTML
+        n_jobs (int): number of processes used to parse pages
+        chunksize (int): number of pages sent to a process at a time
+        parser (str): parser used by BeautifulSoup
+
+    Returns:
+        A dataframe containing book titles, authors and ISBNs
+    """
+    extract = partial(extract_book_details_fast, parser=parser)
+    if n_jobs == 1:
+        details = list(map(extract, entries))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            details = list(executor.map(extract, entries, chunksize=chunksize))
+
+    titles, authors, isbns = zip(*details) if details else ((), (), ())
+    return pd.DataFrame(
+        {"book_title": list(titles), "author": list(authors), "isbn": list(isbns)},
+        columns=["book_title", "author", "isbn"],
+    )
+
+
+def extract_book_details_from_store(
+    store_path: str, books_list: Union[List[int], None] = None, n_jobs: int = 1
+) -> pd.DataFrame:
+    """Stream pages out of an `HtmlStore` and extract book titles,
+    authors and ISBNs.
+
+    Args:
+        store_path (str): location of the store containing raw HTMLs.
+        books_list (List[int]): book IDs to extract, in order. Books missing
+            from the store get empty details. Defaults to every stored book,
+            in book ID order.
+        n_jobs (int): number of processes used to parse pages. With a single
+            process, pages are read from the store one batch at a time.
+
+    Returns:
+        A dataframe containing book IDs, titles, authors and ISBNs
+    """
+    with HtmlStore(store_path) as store:
+        book_ids = books_list if books_list is not None else sorted(store.book_ids())
+        pages = (raw_html for _, raw_html in store.iter_pages(book_ids))
+        details = extract_book_details_batch(pages, n_jobs=n_jobs)
+    details.insert(0, "book_id", list(book_ids))
+    return details
+
+
 def clean_up_dataframe(df: pd.DataFrame, books_list: List[int]) -> pd.DataFrame:
     """Extract ISBNs using a regular expression, change
     data type to avoid losing leading zeroes, add book IDs
@@ -107,10 +205,8 @@ def generate_clean_isbn_and_id_lists(df: pd.DataFrame) -> Tuple[List[str], List[
         A list of valid ISBNs and a list of LibraryThing
             book identifiers.
     """
-    df.loc[df.book_title == "The Glass Castle", "isbn"] = "1844081826"
-    df.loc[df.book_title == "Atonement (2001)", "isbn"] = "9780099429791"
-    df.loc[df.book_title == "The Handmaid's Tale (1985)", "isbn"] = "9780385490818"
-    df.loc[df.book_title == "Thirteen Reasons Why", "isbn"] = "0141328290"
+    for title, isbn in ISBN_FIXES_BY_TITLE.items():
+        df.loc[df.book_title == title, "isbn"] = isbn
 
     good_isbns = df[df.isbn.str.contains(r"^[\d]{10,13}$")].copy()
     good_isbns.isbn.iloc[284] = "9780060590284"
@@ -122,3 +218,79 @@ def generate_clean_isbn_and_id_lists(df: pd.DataFrame) -> Tuple[List[str], List[
     good_isbn_list = list(good_isbns.isbn)
     good_lbthing_id_list = list(good_isbns.id)
     return good_isbn_list, good_lbthing_id_list
+
+
+def apply_book_fixes(
+    df: pd.DataFrame, fixes: Union[Dict[str, Dict[str, str]], None] = None
+) -> pd.DataFrame:
+    """Correct book information by LibraryThing ID, e.g.
+    {"123": {"author": "Jeremy Harmer", "isbn": "9780521656139"}}. Unlike
+    corrections by row position, they stay on the right book whatever the
+    number and order of the books.
+
+    Args:
+        df (pd.DataFrame): dataframe containing book IDs
+        fixes (Dict[str, Dict[str, str]]): new values of some columns, by
+            book ID
+
+    Returns:
+        The corrected dataframe.
+    """
+    df = df.copy()
+    ids = df.id.astype(str)
+    for book_id, values in (fixes or {}).items():
+        for column, value in values.items():
+            df.loc[ids == str(book_id), column] = value
+    return df
+
+
+def clean_book_info(
+    df: pd.DataFrame,
+    books_list: List[int],
+    fixes: Union[Dict[str, Dict[str, str]], None] = None,
+) -> pd.DataFrame:
+    """Same as `clean_up_dataframe`, for any list of books: corrections
+    are given by book ID (see `apply_book_fixes`) instead of being made at
+    the row positions of the notebook's 5000 books.
+
+    Args:
+        df (pd.DataFrame): dataframe containing book titles, authors
+            and text containg IBSNs.
+        books_list: list of book IDs
+        fixes (Dict[str, Dict[str, str]]): corrections, by book ID
+
+    Returns:
+        A dataframe containg book IDs, titles, authors and ISBNs
+    """
+    df = df.copy()
+    df["isbn"] = df.isbn.str.extract(r"ISBN (\d+)\D", expand=False)
+    df["id"] = books_list
+    df = apply_book_fixes(df[["id", "book_title", "author", "isbn"]], fixes)
+    df = df.dropna().reset_index(drop=True)
+    df["isbn"] = df.isbn.astype(str)
+    return df
+
+
+def clean_isbn_and_id_lists(
+    df: pd.DataFrame, isbn_fixes: Union[Dict[str, str], None] = None
+) -> Tuple[List[str], List[int]]:
+    """Same as `generate_clean_isbn_and_id_lists`, for any list of books:
+    ISBNs are corrected by title (as in the notebook) and by book ID,
+    instead of at the row positions of the notebook's books.
+
+    Args:
+        df (pd.DataFrame): dataframe containing book information
+        isbn_fixes (Dict[str, str]): correct ISBNs, by book ID
+
+    Returns:
+        A list of valid ISBNs and a list of LibraryThing
+            book identifiers.
+    """
+    df = df.copy()
+    for title, isbn in ISBN_FIXES_BY_TITLE.items():
+        df.loc[df.book_title == title, "isbn"] = isbn
+    df = apply_book_fixes(
+        df, {book_id: {"isbn": isbn} for book_id, isbn in (isbn_fixes or {}).items()}
+    )
+    good_isbns = df[df.isbn.str.contains(r"^[\d]{10,13}$")]
+    return list(good_isbns.isbn), list(good_isbns.id)
@@ -0,0 +1,97 @@
+import sqlite3
+import time
+from typing import List, Set, Union
+
+
+class ScrapeCheckpoint:
+    """Persistent record of scraping progress, stored in a SQLite database.
+
+    For every book ID the checkpoint keeps its status ("done" or "failed")
+    and the number of attempts made so far. It also remembers which output
+    file the scrape writes to and how many bytes of that file hold complete,
+    committed rows, so that an interrupted scrape can be resumed exactly
+    where it stopped.
+
+    Args:
+        path (str): location of the SQLite database. It is created if it
+            doesn't exist yet.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages ("
+                "book_id INTEGER PRIMARY KEY, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, updated_at REAL NOT NULL)"
+            )
+
+    def get_meta(self, key: str) -> Union[str, None]:
+        row = self._conn.execute(
+            "SELECT value FROM meta WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row is not None else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value)
+            )
+
+    def completed_ids(self) -> Set[int]:
+        """Book IDs whose pages have already been saved, or failed for
+        good.
+        """
+        rows = self._conn.execute("SELECT book_id FROM pages WHERE status = 'done'")
+        return {row[0] for row in rows}
+
+    def failed_ids(self) -> List[int]:
+        """Book IDs whose pages could not be scraped so far."""
+        rows = self._conn.execute(
+            "SELECT book_id FROM pages WHERE status = 'failed' ORDER BY book_id"
+        )
+        return [row[0] for row in rows]
+
+    def attempts(self, book_id: int) -> int:
+        row = self._conn.execute(
+            "SELECT attempts FROM pages WHERE book_id = ?", (book_id,)
+        ).fetchone()
+        return row[0] if row is not None else 0
+
+    def mark_done(self, book_id: int, output_offset: Union[int, None] = None) -> None:
+        """Record a saved page (or one not worth retrying) and, if given,
+        the new size of the output file in the same transaction.
+        """
+        with self._conn:
+            self._record(book_id, "done")
+            if output_offset is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                    ("output_offset", str(output_offset)),
+                )
+
+    def mark_failed(self, book_id: int) -> None:
+        with self._conn:
+            self._record(book_id, "failed")
+
+    def _record(self, book_id: int, status: str) -> None:
+        self._conn.execute(
+            "INSERT INTO pages (book_id, status, attempts, updated_at) "
+            "VALUES (?, ?, 1, ?) ON CONFLICT(book_id) DO UPDATE SET "
+            "status = excluded.status, attempts = attempts + 1, "
+            "updated_at = excluded.updated_at",
+            (int(book_id), status, time.time()),
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "ScrapeCheckpoint":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,322 @@
+import hashlib
+import json
+import os
+import pickle
+import random
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
+
+import numpy as np
+import pandas as pd
+from gensim import corpora, matutils
+from gensim.models import LdaModel
+from gensim.models.coherencemodel import COHERENCE_MEASURES, SLIDING_WINDOW_SIZES
+from gensim.topic_coherence.text_analysis import WordOccurrenceAccumulator
+
+C_V = COHERENCE_MEASURES["c_v"]
+C_V_WINDOW_SIZE = SLIDING_WINDOW_SIZES["c_v"]
+
+# statistics loaded once by each worker process of `score_models`
+_worker_statistics = None
+
+
+def statistics_key(
+    texts: List[List[str]],
+    dictionary: corpora.Dictionary,
+    window_size: int = C_V_WINDOW_SIZE,
+    sample_fraction: float = 1.0,
+    random_state: Union[int, None] = None,
+) -> str:
+    """Hash of the texts, the dictionary and the counting parameters, used
+    to tell whether saved statistics can be reused.
+
+    Args:
+        texts (List[List[str]]): lemmatized reviews
+        dictionary (corpora.Dictionary): dictionary the topics refer to
+        window_size (int): size of the sliding window
+        sample_fraction (float): fraction of the texts counted
+        random_state (int): seed of the sample
+
+    Returns:
+        A short hexadecimal key.
+    """
+    digest = hashlib.sha256()
+    header = {
+        "window_size": window_size,
+        "sample_fraction": sample_fraction,
+        "random_state": random_state if sample_fraction < 1 else None,
+        "token2id": sorted(dictionary.token2id.items()),
+    }
+    digest.update(json.dumps(header, sort_keys=True).encode())
+    for text in texts:
+        digest.update(" ".join(text).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def get_topic_ids(model: LdaModel, topn: int = 20) -> List[np.ndarray]:
+    """IDs of the `topn` most likely words of each topic, as used by
+    gensim's CoherenceModel.
+    """
+    return [
+        matutils.argsort(topic, topn=topn, reverse=True) for topic in model.get_topics()
+    ]
+
+
+class CoherenceStatistics:
+    """Word occurrence and co-occurrence counts needed to compute the c_v
+    coherence of topics, as done by gensim's CoherenceModel.
+
+    CoherenceModel counts co-occurrences over the whole corpus with a
+    sliding window every time a model is scored, although the counts only
+    depend on the texts and on the words being scored. Here they are
+    counted once, for the union of the top words of all the models to be
+    compared, and can be saved and reused: scoring a model then only takes
+    the (fast) confirmation and aggregation steps. The scores are the same
+    as CoherenceModel's.
+
+    Counts can be estimated on a random sample of the texts. The sampling
+    error of a coherence score shrinks roughly as one over the square root
+    of the number of sampled texts; `subsampling_variance` measures it for
+    given models and sample size.
+
+    Args:
+        accumulator (WordOccurrenceAccumulator): counts computed by gensim
+        relevant_ids (set): IDs of the words whose counts were accumulated
+        n_documents (int): number of texts counted
+        key (str): `statistics_key` of the texts, dictionary and counting
+            parameters
+    """
+
+    def __init__(
+        self,
+        accumulator: WordOccurrenceAccumulator,
+        relevant_ids: set,
+        n_documents: int,
+        key: Union[str, None] = None,
+    ) -> None:
+        self.accumulator = accumulator
+        self.relevant_ids = relevant_ids
+        self.n_documents = n_documents
+        self.key = key
+
+    @classmethod
+    def build(
+        cls,
+        texts: List[List[str]],
+        dictionary: corpora.Dictionary,
+        topics: List[np.ndarray],
+        window_size: int = C_V_WINDOW_SIZE,
+        processes: int = 1,
+        sample_fraction: float = 1.0,
+        random_state: Union[int, None] = None,
+    ) -> "CoherenceStatistics":
+        """Count word occurrences and co-occurrences in `texts`.
+
+        Args:
+            texts (List[List[str]]): lemmatized reviews
+            dictionary (corpora.Dictionary): dictionary the topics refer to
+            topics (List[np.ndarray]): word IDs of all the topics that will
+                be scored, e.g. from `get_topic_ids`
+            window_size (int): size of the sliding window, 110 for c_v
+            processes (int): number of processes counting co-occurrences
+            sample_fraction (float): fraction of the texts to count
+            random_state (int): seed of the sample
+
+        Returns:
+            The statistics.
+        """
+        key = statistics_key(
+            texts, dictionary, window_size, sample_fraction, random_state
+        )
+        if sample_fraction < 1:
+            rng = random.Random(random_state)
+            sample = rng.sample(range(len(texts)), int(len(texts) * sample_fraction))
+            texts = [texts[i] for i in sorted(sample)]
+
+        segmented_topics = C_V.seg(topics)
+        accumulator = C_V.prob(
+            texts=texts,
+            segmented_topics=segmented_topics,
+            dictionary=dictionary,
+            window_size=window_size,
+            processes=processes,
+        )
+        relevant_ids = {int(word_id) for topic in topics for word_id in topic}
+        return cls(accumulator, relevant_ids, len(texts), key)
+
+    def covers(self, topics: List[np.ndarray]) -> bool:
+        """Whether the counts needed to score `topics` were accumulated."""
+        return all(int(w) in self.relevant_ids for topic in topics for w in topic)
+
+    def score_topics(self, topics: List[np.ndarray]) -> List[float]:
+        """c_v coherence of each topic."""
+        if not self.covers(topics):
+            raise ValueError("Topics contain words that were not counted")
+        return C_V.conf(
+            C_V.seg(topics), self.accumulator, topics=topics, measure="nlr", gamma=1
+        )
+
+    def score(self, topics: List[np.ndarray]) -> float:
+        """c_v coherence of a model, i.e. the mean coherence of its topics."""
+        return C_V.aggr(self.score_topics(topics))
+
+    def save(self, path: str) -> None:
+        with open(path + ".tmp", "wb") as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(path + ".tmp", path)
+
+    @staticmethod
+    def load(path: str) -> "CoherenceStatistics":
+        with open(path, "rb") as f:
+            return pickle.load(f)
+
+
+def _load_worker_statistics(path: str) -> None:
+    global _worker_statistics
+    _worker_statistics = CoherenceStatistics.load(path)
+
+
+def _score_in_worker(topics: List[np.ndarray]) -> float:
+    return _worker_statistics.score(topics)
+
+
+def score_models(
+    statistics_path: str, model_topics: Dict[str, List[np.ndarray]], n_jobs: int = 1
+) -> pd.Series:
+    """Compute the c_v coherence of several models from saved statistics.
+    With `n_jobs` > 1, models are scored in parallel and each worker
+    process loads the statistics once.
+
+    Args:
+        statistics_path (str): location of the saved CoherenceStatistics
+        model_topics (Dict[str, List[np.ndarray]]): topics of each model
+        n_jobs (int): number of processes
+
+    Returns:
+        The coherence of each model, indexed by model name.
+    """
+    names = list(model_topics)
+    if n_jobs == 1:
+        statistics = CoherenceStatistics.load(statistics_path)
+        scores = [statistics.score(model_topics[name]) for name in names]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=n_jobs,
+            initializer=_load_worker_statistics,
+            initargs=(statistics_path,),
+        ) as executor:
+            scores = list(
+                executor.map(_score_in_worker, [model_topics[name] for name in names])
+            )
+    return pd.Series(scores, index=names, name="coherence")
+
+
+def evaluate_lda_models(
+    model_paths: List[str],
+    texts: List[List[str]],
+    dictionary: corpora.Dictionary,
+    statistics_path: str,
+    topn: int = 20,
+    n_jobs: int = 1,
+    sample_fraction: float = 1.0,
+    random_state: Union[int, None] = 1,
+) -> pd.Series:
+    """Compute the c_v coherence of saved LDA models trained on the same
+    texts and dictionary. Co-occurrence statistics are loaded from
+    `statistics_path` when they were counted on the same texts, dictionary
+    and sample and cover the topics of every model; otherwise they are
+    counted once for all models and saved there.
+
+    Args:
+        model_paths (List[str]): locations of the models
+        texts (List[List[str]]): lemmatized reviews the models were trained on
+        dictionary (corpora.Dictionary): dictionary of the models
+        statistics_path (str): location of the saved statistics
+        topn (int): number of words per topic
+        n_jobs (int): number of processes
+        sample_fraction (float): fraction of the texts counted
+        random_state (int): seed of the sample
+
+    Returns:
+        The coherence of each model, indexed by model path.
+    """
+    model_topics = {
+        path: get_topic_ids(LdaModel.load(path), topn=topn) for path in model_paths
+    }
+    all_topics = [topic for topics in model_topics.values() for topic in topics]
+
+    key = statistics_key(
+        texts, dictionary, sample_fraction=sample_fraction, random_state=random_state
+    )
+    statistics = None
+    if os.path.exists(statistics_path):
+        statistics = CoherenceStatistics.load(statistics_path)
+    if (
+        statistics is None
+        or getattr(statistics, "key", None) != key
+        or not statistics.covers(all_topics)
+    ):
+        statistics = CoherenceStatistics.build(
+            texts,
+            dictionary,
+            all_topics,
+            processes=n_jobs,
+            sample_fraction=sample_fraction,
+            random_state=random_state,
+        )
+        statistics.save(statistics_path)
+    return score_models(statistics_path, model_topics, n_jobs=n_jobs)
+
+
+def subsampling_variance(
+    texts: List[List[str]],
+    dictionary: corpora.Dictionary,
+    model_topics: Dict[str, List[np.ndarray]],
+    sample_fraction: float,
+    n_repeats: int = 5,
+    processes: int = 1,
+    random_state: int = 0,
+) -> pd.DataFrame:
+    """Measure how much coherence scores vary when co-occurrences are
+    counted on random samples of the texts rather than on all of them.
+
+    Args:
+        texts (List[List[str]]): lemmatized reviews
+        dictionary (corpora.Dictionary): dictionary the topics refer to
+        model_topics (Dict[str, List[np.ndarray]]): topics of each model
+        sample_fraction (float): fraction of the texts in each sample
+        n_repeats (int): number of samples drawn
+        processes (int): number of processes counting co-occurrences
+        random_state (int): seed of the first sample
+
+    Returns:
+        The mean and standard deviation of each model's coherence across
+        samples, and the coherence computed on all the texts.
+    """
+    all_topics = [topic for topics in model_topics.values() for topic in topics]
+    full = CoherenceStatistics.build(texts, dictionary, all_topics, processes=processes)
+    samples = [
+        CoherenceStatistics.build(
+            texts,
+            dictionary,
+            all_topics,
+            processes=processes,
+            sample_fraction=sample_fraction,
+            random_state=random_state + i,
+        )
+        for i in range(n_repeats)
+    ]
+
+    rows = []
+    for name, topics in model_topics.items():
+        scores = [sample.score(topics) for sample in samples]
+        rows.append(
+            {
+                "model": name,
+                "coherence": full.score(topics),
+                "sample_mean": np.mean(scores),
+                "sample_std": np.std(scores, ddof=1),
+            }
+        )
+    return pd.DataFrame(rows).set_index("model")
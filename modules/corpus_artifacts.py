@@ -0,0 +1,227 @@
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple, Union
+
+from gensim import corpora
+from gensim.models.phrases import Phraser
+
+from modules.phrases import (
+    load_phrasers,
+    phrase_and_lemmatize,
+    save_phrasers,
+    train_phrasers,
+)
+from modules.preprocessing import MORE_STOPWORDS, ReviewCleaner
+
+# bump when the way artifacts are built or stored changes, so that
+# artifacts written by older code are not reused
+ARTIFACT_VERSION = 2
+
+DEFAULT_PARAMS = {
+    "extra_stop_words": MORE_STOPWORDS,
+    "min_word_length": 3,
+    "tags": ["NOUN", "ADJ"],
+    "ngram": "unigram",
+    "phrase_min_count": 5,
+    "phrase_threshold": 100,
+    "phrase_chunksize": 50000,
+}
+
+
+class CorpusArtifacts(NamedTuple):
+    """Processed reviews, the bag-of-words corpus built from them and the
+    phrase models used to process them.
+    """
+
+    key: str
+    texts: List[List[str]]
+    dictionary: corpora.Dictionary
+    corpus: corpora.MmCorpus
+    phrasers: List[Phraser]
+
+
+def fingerprint(reviews: Iterable[str], params: Dict) -> str:
+    """Hash of the input reviews and the preprocessing parameters, used to
+    tell whether stored artifacts can be reused.
+
+    Args:
+        reviews (Iterable[str]): raw book reviews
+        params (Dict): preprocessing parameters
+
+    Returns:
+        A short hexadecimal key.
+    """
+    digest = hashlib.sha256()
+    header = {"version": ARTIFACT_VERSION, "params": params}
+    digest.update(json.dumps(header, sort_keys=True).encode())
+    for review in reviews:
+        digest.update(str(review).encode("utf-8", "surrogatepass"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def save_corpus_artifacts(
+    directory: str,
+    key: str,
+    texts: List[List[str]],
+    dictionary: corpora.Dictionary,
+    params: Union[Dict, None] = None,
+    phrasers: Sequence[Phraser] = (),
+) -> str:
+    """Write processed reviews, their dictionary and their document-term
+    matrix to `directory/key`. The document-term matrix is stored in Matrix
+    Market format with an index, so it can be streamed from disk or
+    accessed by document number. Files are written to a temporary
+    directory first, so a crash never leaves half-written artifacts.
+
+    Args:
+        directory (str): folder holding all artifacts
+        key (str): fingerprint of the inputs
+        texts (List[List[str]]): processed (lemmatized) reviews
+        dictionary (corpora.Dictionary): dictionary built from `texts`
+        params (Dict): preprocessing parameters, saved for reference
+        phrasers (Sequence[Phraser]): phrase models used on the reviews
+
+    Returns:
+        The folder containing the artifacts.
+    """
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, key)
+    tmp_dir = tempfile.mkdtemp(dir=directory, prefix=f".{key}-")
+
+    with gzip.open(os.path.join(tmp_dir, "texts.jsonl.gz"), "wt") as f:
+        for text in texts:
+            f.write(json.dumps(text))
+            f.write("\n")
+    dictionary.save(os.path.join(tmp_dir, "dictionary.dict"))
+    save_phrasers(os.path.join(tmp_dir, "phrasers"), phrasers)
+    corpora.MmCorpus.serialize(
+        os.path.join(tmp_dir, "corpus.mm"),
+        (dictionary.doc2bow(text) for text in texts),
+        id2word=dictionary,
+    )
+    with open(os.path.join(tmp_dir, "manifest.json"), "w") as f:
+        json.dump(
+            {
+                "version": ARTIFACT_VERSION,
+                "key": key,
+                "params": params,
+                "n_documents": len(texts),
+            },
+            f,
+            indent=2,
+        )
+
+    if os.path.exists(target):
+        shutil.rmtree(target)
+    os.rename(tmp_dir, target)
+    return target
+
+
+def load_corpus_artifacts(directory: str, key: str) -> Union[CorpusArtifacts, None]:
+    """Load artifacts saved by `save_corpus_artifacts`.
+
+    Args:
+        directory (str): folder holding all artifacts
+        key (str): fingerprint of the inputs
+
+    Returns:
+        The artifacts, or None if none were saved for `key`.
+    """
+    folder = os.path.join(directory, key)
+    try:
+        with open(os.path.join(folder, "manifest.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != ARTIFACT_VERSION:
+        return None
+
+    with gzip.open(os.path.join(folder, "texts.jsonl.gz"), "rt") as f:
+        texts = [json.loads(line) for line in f]
+    dictionary = corpora.Dictionary.load(os.path.join(folder, "dictionary.dict"))
+    corpus = corpora.MmCorpus(os.path.join(folder, "corpus.mm"))
+    phrasers = load_phrasers(os.path.join(folder, "phrasers"))
+    return CorpusArtifacts(key, texts, dictionary, corpus, phrasers)
+
+
+def preprocess_reviews(
+    reviews: Iterable[str], params: Dict, n_process: int = 1
+) -> Tuple[List[List[str]], List[Phraser]]:
+    """Clean, tokenize, optionally join bigrams/trigrams, then lemmatize
+    reviews, as done in the notebooks. Phrase models are trained on chunks
+    of reviews counted in parallel, then phrases are joined and reviews
+    lemmatized in a single pass.
+
+    Args:
+        reviews (Iterable[str]): raw book reviews
+        params (Dict): preprocessing parameters (see DEFAULT_PARAMS)
+        n_process (int): number of processes used by spaCy and to count
+            phrases
+
+    Returns:
+        The lemmas of each review, and the phrase models used.
+    """
+    cleaner = ReviewCleaner(
+        extra_stop_words=params["extra_stop_words"],
+        min_word_length=params["min_word_length"],
+    )
+    tokenized_reviews = list(cleaner.stream(reviews))
+    chunksize = params["phrase_chunksize"]
+    chunks = [
+        tokenized_reviews[start : start + chunksize]
+        for start in range(0, len(tokenized_reviews), chunksize)
+    ]
+    phrasers = train_phrasers(
+        chunks,
+        ngram=params["ngram"],
+        min_count=params["phrase_min_count"],
+        threshold=params["phrase_threshold"],
+        n_jobs=n_process,
+    )
+    texts = list(
+        phrase_and_lemmatize(
+            tokenized_reviews, phrasers, tags=params["tags"], n_process=n_process
+        )
+    )
+    return texts, phrasers
+
+
+def build_corpus_artifacts(
+    reviews: Iterable[str],
+    directory: str,
+    params: Union[Dict, None] = None,
+    n_process: int = 1,
+) -> CorpusArtifacts:
+    """Preprocessing stage producing the lemmatized reviews, the gensim
+    Dictionary and the document-term matrix used to train LDA models.
+    Results are stored under a fingerprint of the reviews and parameters,
+    so when neither has changed they are loaded from disk instead of
+    being recomputed.
+
+    Args:
+        reviews (Iterable[str]): raw book reviews
+        directory (str): folder holding all artifacts
+        params (Dict): preprocessing parameters overriding DEFAULT_PARAMS
+        n_process (int): number of processes used by spaCy
+
+    Returns:
+        The processed reviews, dictionary, corpus and phrase models.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    reviews = list(reviews)
+    key = fingerprint(reviews, params)
+    artifacts = load_corpus_artifacts(directory, key)
+    if artifacts is not None:
+        return artifacts
+
+    texts, phrasers = preprocess_reviews(reviews, params, n_process=n_process)
+    dictionary = corpora.Dictionary(texts)
+    save_corpus_artifacts(
+        directory, key, texts, dictionary, params=params, phrasers=phrasers
+    )
+    return load_corpus_artifacts(directory, key)
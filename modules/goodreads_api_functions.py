@@ -1,70 +1,263 @@
+import json
 import os
-import time
-from typing import List
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Set, Tuple, Union
 
-from betterreads import client
-from requests import get
+import xmltodict
 from tqdm import tqdm_notebook
 
-goodreads_api_key = os.environ.get("GOODREADS_API_KEY")
-goodreads_api_secret = os.environ.get("GOODREADS_API_SECRET")
+from modules.goodreads_cache import NOT_FOUND, GoodreadsCache
+from modules.http_client import FetchedPage, cached_get, cached_response
+from modules.rate_limiter import AdaptiveScheduler
 
-gc = client.GoodreadsClient(goodreads_api_key, goodreads_api_secret)
+GOODREADS_API_URL = "https://www.goodreads.com"
 
+# ceiling on the request rate, to avoid getting my IP address blocked
+GOODREADS_REQUESTS_PER_SECOND = 1.0
 
-def acquire_goodreads_id(isbn_numbers: List[str]) -> List[int]:
-    """Collect Goodreads IDs using ISBNs and the Goodreads API. A 1 second delay
-    is included in the function to avoid getting my IP address blocked.
+
+def get_goodreads_api_key() -> str:
+    """Read the Goodreads API key when a request is made rather than at
+    import, so that importing this module needs no credentials.
+    """
+    return os.environ.get("GOODREADS_API_KEY")
+
+
+@lru_cache(maxsize=None)
+def get_goodreads_cache() -> GoodreadsCache:
+    """Cache of Goodreads results shared by the functions of this module.
+    It is kept in the SQLite database named by the CAPSTONE_GOODREADS_CACHE
+    environment variable, or in memory for the current session if it
+    isn't set.
+    """
+    return GoodreadsCache(os.environ.get("CAPSTONE_GOODREADS_CACHE", ":memory:"))
+
+
+def make_goodreads_scheduler(
+    requests_per_second: Union[float, None] = GOODREADS_REQUESTS_PER_SECOND, **kwargs,
+) -> AdaptiveScheduler:
+    """Scheduler used by default for Goodreads requests: at most 4 requests
+    in flight and `requests_per_second` requests per second, slowing down
+    when the API throttles them.
+
+    Args:
+        requests_per_second (float): maximum request rate, None for none
+        kwargs: passed to `AdaptiveScheduler`
+
+    Returns:
+        A new scheduler.
+    """
+    kwargs.setdefault("max_concurrency", 4)
+    return AdaptiveScheduler(requests_per_second=requests_per_second, **kwargs)
+
+
+def _book_request(book_id: int, base_url: str) -> Tuple[str, Dict]:
+    return f"{base_url}/book/show/{book_id}.xml", {"key": get_goodreads_api_key()}
+
+
+def _isbn_request(isbn: str, base_url: str) -> Tuple[str, Dict]:
+    return f"{base_url}/book/isbn_to_id", {"key": get_goodreads_api_key(), "isbn": isbn}
+
+
+def request_goodreads_book(
+    book_id: int, base_url: str = GOODREADS_API_URL
+) -> FetchedPage:
+    """Request the XML details of a book from the Goodreads API, through
+    the shared session and disk cache of `modules.http_client`.
+    """
+    return cached_get(*_book_request(book_id, base_url))
+
+
+def parse_goodreads_book(content: bytes) -> Dict:
+    """Parse the XML details of a book returned by the Goodreads API."""
+    return xmltodict.parse(content)["GoodreadsResponse"]["book"]
+
+
+def fetch_goodreads_book(book_id: int, base_url: str = GOODREADS_API_URL) -> Dict:
+    """Request the details of a book from the Goodreads API and parse
+    the XML response, as the `betterreads` client does, but through the
+    shared session and disk cache of `modules.http_client`.
+
+    Args:
+        book_id (int): goodreads book ID
+        base_url (str): address of the API
+
+    Returns:
+        A dictionary with the book details returned by the API.
+    """
+    return parse_goodreads_book(request_goodreads_book(book_id, base_url).content)
+
+
+def extract_book_metadata(book: Dict) -> Dict:
+    """Keep the fields of a Goodreads book used in the project, as plain
+    dicts and lists: xmltodict parses into OrderedDicts, whose repr written
+    to CSV can't be read back by `ast.literal_eval`, while books read from
+    the cache are plain dicts.
+    """
+    return json.loads(
+        json.dumps(
+            {
+                "id": book["id"],
+                "title": book["title"],
+                "shelves": book["popular_shelves"]["shelf"],
+            }
+        )
+    )
+
+
+def _record_not_found(
+    request: Callable[[Any], FetchedPage], not_found: Set
+) -> Callable[[Any], FetchedPage]:
+    """Wrap a request function to add the keys answered with a 404 to
+    `not_found`, so they can be cached as `NOT_FOUND`.
+    """
+
+    def recording_request(key):
+        resp = request(key)
+        if resp.status_code == 404:
+            not_found.add(key)
+        return resp
+
+    return recording_request
+
+
+def acquire_goodreads_id(
+    isbn_numbers: List[str],
+    cache: Union[GoodreadsCache, None] = None,
+    base_url: str = GOODREADS_API_URL,
+    scheduler: Union[AdaptiveScheduler, None] = None,
+) -> List[Union[int, None]]:
+    """Collect Goodreads IDs using ISBNs and the Goodreads API.
+    Each ISBN is only sent to the API once: IDs, and ISBNs the API doesn't
+    know, are kept in the Goodreads cache, so repeated ISBNs and ISBNs
+    looked up in earlier runs cost no request. The other ISBNs are
+    requested through an `AdaptiveScheduler`, which keeps the request rate
+    low enough to avoid getting my IP address blocked, waits when the API
+    asks it to and retries failed requests. Responses found in the disk
+    cache of `modules.http_client` skip the scheduler's wait.
 
     Args:
         isbn_numbers (List[str]): list of ISBNs for which we want to collect
             goodreads IDs.
+        cache (GoodreadsCache): cache to use, the shared one by default
+        base_url (str): address of the API
+        scheduler (AdaptiveScheduler): scheduler sending the requests, one
+            made by `make_goodreads_scheduler` by default. The ISBNs that
+            failed are left in its `failed` attribute.
 
     Returns:
-        A list of goodreads IDs
+        A list of goodreads IDs, None for ISBNs without a Goodreads ID or
+        whose request failed.
+
+    """
+    cache = cache or get_goodreads_cache()
+    scheduler = scheduler or make_goodreads_scheduler()
+    goodreads_id = {number: cache.get_id(number) for number in isbn_numbers}
+    missing = [number for number, id_ in goodreads_id.items() if id_ is None]
+
+    not_found = set()
+    responses = scheduler.map(
+        _record_not_found(
+            lambda number: cached_get(*_isbn_request(number, base_url)), not_found
+        ),
+        missing,
+        lookup=lambda number: cached_response(*_isbn_request(number, base_url)),
+    )
+    for number, resp in tqdm_notebook(responses, total=len(missing)):
+        if resp is not None:
+            goodreads_id[number] = resp.json()
+            cache.put_id(number, goodreads_id[number])
+        elif number in not_found:
+            cache.put_id(number, NOT_FOUND)
+
+    if scheduler.failed:
+        print(f"ISBNs that failed: {list(scheduler.failed)}")
+    return [
+        None if goodreads_id[number] is NOT_FOUND else goodreads_id[number]
+        for number in isbn_numbers
+    ]
+
 
+def get_books_metadata(
+    book_id: List[int],
+    cache: Union[GoodreadsCache, None] = None,
+    base_url: str = GOODREADS_API_URL,
+    scheduler: Union[AdaptiveScheduler, None] = None,
+) -> List[Union[Dict, None]]:
+    """Use the Goodreads API to collect the ID, title and shelves of books.
+    Each book is requested once, all its fields are extracted from the same
+    response, and they are kept in the Goodreads cache, as are the books
+    the API doesn't know: books repeated in `book_id`, or fetched earlier
+    (e.g. by `get_book_titles` before `get_book_shelves`), cost no request.
+    Responses found in the disk cache of `modules.http_client` skip the
+    scheduler's wait.
+
+    Args:
+        book_id (List[int]): a list of goodreads book IDs
+        cache (GoodreadsCache): cache to use, the shared one by default
+        base_url (str): address of the API
+        scheduler (AdaptiveScheduler): scheduler sending the requests, one
+            made by `make_goodreads_scheduler` by default. The books that
+            failed are left in its `failed` attribute.
+
+    Returns:
+        The metadata of each book, in the order of `book_id`, None for
+        books the API doesn't know or whose request failed.
     """
-    goodreads_id = []
-    for number in tqdm_notebook(isbn_numbers):
-        base_url = "https://www.goodreads.com/book/isbn_to_id"
-        params = {"key": goodreads_api_key, "isbn": number}
+    cache = cache or get_goodreads_cache()
+    scheduler = scheduler or make_goodreads_scheduler()
+    metadata = {number: cache.get_book(number) for number in book_id}
+    missing = [number for number, book in metadata.items() if book is None]
+
+    not_found = set()
+    responses = scheduler.map(
+        _record_not_found(
+            lambda number: request_goodreads_book(number, base_url), not_found
+        ),
+        missing,
+        lookup=lambda number: cached_response(*_book_request(number, base_url)),
+    )
+    for number, resp in tqdm_notebook(responses, total=len(missing)):
+        if resp is not None:
+            book = parse_goodreads_book(resp.content)
+            metadata[number] = extract_book_metadata(book)
+            cache.put_book(number, metadata[number])
+        elif number in not_found:
+            cache.put_book(number, NOT_FOUND)
 
-        req_ = get(base_url, params=params)
-        json_ = req_.json()
-        goodreads_id.append(json_)
-        time.sleep(1)
-    return goodreads_id
+    if scheduler.failed:
+        print(f"Books that failed: {list(scheduler.failed)}")
+    return [
+        None if metadata[number] is NOT_FOUND else metadata[number]
+        for number in book_id
+    ]
 
 
-def get_book_titles(book_id: List[int]) -> List[str]:
-    """ Use Goodreads Python connector to collect book titles
+def get_book_titles(book_id: List[int], **kwargs) -> List[str]:
+    """Use the Goodreads API to collect book titles
     corresponding to goodreads IDs.
 
     Args:
         book_id (List[int]): a list of goodreads book IDs
+        kwargs: passed to `get_books_metadata`
 
     Returns
         A list of book titles
     """
-    book_titles = []
-    for number in tqdm_notebook(book_id):
-        book_titles.append((gc.book(number)).title)
-        time.sleep(1)
-    return book_titles
+    books = get_books_metadata(book_id, **kwargs)
+    return [book["title"] if book else None for book in books]
 
 
-def get_book_shelves(book_id: List[int]) -> List[str]:
-    """ Use Goodreads Python connector to collect goodreads book shelves
+def get_book_shelves(book_id: List[int], **kwargs) -> List[str]:
+    """Use the Goodreads API to collect goodreads book shelves
     corresponding to goodreads IDs.
 
     Args:
         book_id (List[int]): a list of goodreads book IDs
+        kwargs: passed to `get_books_metadata`
 
     Returns
         A list of goodreads book shelves
     """
-    book_shelves = []
-    for number in tqdm_notebook(book_id):
-        book_shelves.append((gc.book(number)).popular_shelves)
-        time.sleep(1)
-    return book_shelves
+    books = get_books_metadata(book_id, **kwargs)
+    return [book["shelves"] if book else None for book in books]
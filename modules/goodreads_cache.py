@@ -0,0 +1,114 @@
+import json
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Union
+
+# entries older than this are fetched again
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+
+
+class _NotFound:
+    def __repr__(self) -> str:
+        return "NOT_FOUND"
+
+
+# cached answer for ISBNs and books the API doesn't know (a 404), as
+# opposed to None for entries that aren't cached
+NOT_FOUND = _NotFound()
+
+
+class GoodreadsCache:
+    """Persistent cache of Goodreads API results, stored in a SQLite
+    database: the Goodreads ID of each ISBN, and the metadata (title and
+    shelves) of each book.
+
+    Entries older than `max_age` seconds are treated as missing, so they
+    are fetched again and refreshed; with `max_age` set to None entries
+    never expire. ISBNs without a Goodreads ID, and book IDs the API
+    doesn't know, are cached too, as `NOT_FOUND`, so they aren't requested
+    again on every run.
+
+    Args:
+        path (str): location of the SQLite database, or ":memory:" for a
+            cache that only lasts as long as the process.
+        max_age (float): number of seconds an entry is considered fresh.
+    """
+
+    def __init__(
+        self, path: str, max_age: Union[float, None] = DEFAULT_MAX_AGE
+    ) -> None:
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS isbn_to_id ("
+                "isbn TEXT PRIMARY KEY, goodreads_id TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL)"
+            )
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS books ("
+                "book_id INTEGER PRIMARY KEY, metadata TEXT NOT NULL, "
+                "fetched_at REAL NOT NULL)"
+            )
+
+    def _is_fresh(self, fetched_at: float) -> bool:
+        return self.max_age is None or time.time() - fetched_at < self.max_age
+
+    def _get(self, query: str, key: Any) -> Union[Any, None]:
+        with self._lock:
+            row = self._conn.execute(query, (key,)).fetchone()
+        if row is None or not self._is_fresh(row[1]):
+            return None
+        value = json.loads(row[0])
+        # NOT_FOUND is stored as null
+        return NOT_FOUND if value is None else value
+
+    def _put(self, query: str, key: Any, value: Any) -> None:
+        value = None if value is NOT_FOUND else value
+        with self._lock, self._conn:
+            self._conn.execute(query, (key, json.dumps(value), time.time()))
+
+    def get_id(self, isbn: str) -> Union[Any, None]:
+        """Goodreads ID of an ISBN, as returned by the API, `NOT_FOUND` if
+        the ISBN has no Goodreads ID, or None if it isn't cached (or is
+        stale).
+        """
+        return self._get(
+            "SELECT goodreads_id, fetched_at FROM isbn_to_id WHERE isbn = ?", str(isbn)
+        )
+
+    def put_id(self, isbn: str, goodreads_id: Any) -> None:
+        self._put(
+            "INSERT OR REPLACE INTO isbn_to_id (isbn, goodreads_id, fetched_at) "
+            "VALUES (?, ?, ?)",
+            str(isbn),
+            goodreads_id,
+        )
+
+    def get_book(self, book_id: int) -> Union[Dict, None]:
+        """Metadata of a book, `NOT_FOUND` if the API doesn't know the book,
+        or None if it isn't cached (or is stale).
+        """
+        return self._get(
+            "SELECT metadata, fetched_at FROM books WHERE book_id = ?", int(book_id)
+        )
+
+    def put_book(self, book_id: int, metadata: Dict) -> None:
+        self._put(
+            "INSERT OR REPLACE INTO books (book_id, metadata, fetched_at) "
+            "VALUES (?, ?, ?)",
+            int(book_id),
+            metadata,
+        )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "GoodreadsCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
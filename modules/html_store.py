@@ -0,0 +1,143 @@
+import sqlite3
+import zlib
+from typing import Iterable, Iterator, List, Tuple, Union
+
+import pandas as pd
+
+
+class HtmlStore:
+    """Key-value store for raw HTML pages, keyed by book ID.
+
+    Pages are compressed with zlib and kept in a single SQLite file, so
+    they can be written one at a time while scraping, read back one at
+    a time (random access) or streamed in batches without ever loading
+    the whole collection into memory.
+
+    Args:
+        path (str): location of the store. It is created if it doesn't
+            exist yet.
+        compression_level (int): zlib compression level, from 1 (fastest)
+            to 9 (smallest).
+    """
+
+    def __init__(self, path: str, compression_level: int = 6) -> None:
+        self.path = path
+        self.compression_level = compression_level
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS pages "
+                "(book_id INTEGER PRIMARY KEY, raw_html BLOB NOT NULL)"
+            )
+
+    def put(self, book_id: int, raw_html: str) -> None:
+        """Compress a page and save it, replacing any previous version."""
+        self.put_many([(book_id, raw_html)])
+
+    def put_many(self, pages: Iterable[Tuple[int, str]]) -> None:
+        rows = (
+            (int(book_id), zlib.compress(raw_html.encode(), self.compression_level))
+            for book_id, raw_html in pages
+        )
+        with self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO pages (book_id, raw_html) VALUES (?, ?)", rows
+            )
+
+    def get(self, book_id: int) -> Union[str, None]:
+        """Return the page of a book, or None if it isn't in the store."""
+        row = self._conn.execute(
+            "SELECT raw_html FROM pages WHERE book_id = ?", (int(book_id),)
+        ).fetchone()
+        return zlib.decompress(row[0]).decode() if row is not None else None
+
+    def book_ids(self) -> List[int]:
+        return [row[0] for row in self._conn.execute("SELECT book_id FROM pages")]
+
+    def iter_pages(
+        self, book_ids: Union[List[int], None] = None, batch_size: int = 500
+    ) -> Iterator[Tuple[int, Union[str, None]]]:
+        """Stream pages out of the store.
+
+        Args:
+            book_ids (List[int]): IDs of the pages to read, in the order they
+                should be returned. Missing pages are returned as None.
+                Defaults to every page, in book ID order.
+            batch_size (int): number of pages fetched per query.
+
+        Yields:
+            Book IDs and their pages.
+        """
+        if book_ids is None:
+            cursor = self._conn.execute(
+                "SELECT book_id, raw_html FROM pages ORDER BY book_id"
+            )
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    return
+                for book_id, raw_html in rows:
+                    yield book_id, zlib.decompress(raw_html).decode()
+
+        for start in range(0, len(book_ids), batch_size):
+            batch = [int(book_id) for book_id in book_ids[start : start + batch_size]]
+            placeholders = ", ".join("?" * len(batch))
+            found = dict(
+                self._conn.execute(
+                    "SELECT book_id, raw_html FROM pages "
+                    f"WHERE book_id IN ({placeholders})",
+                    batch,
+                )
+            )
+            for book_id in batch:
+                raw_html = found.get(book_id)
+                yield book_id, (
+                    zlib.decompress(raw_html).decode() if raw_html is not None else None
+                )
+
+    def to_dataframe(self, book_ids: Union[List[int], None] = None) -> pd.DataFrame:
+        """Load pages into a dataframe with the same columns as the csv
+        written by `write_htmls_to_csv`.
+        """
+        return pd.DataFrame(
+            list(self.iter_pages(book_ids)), columns=["book_id", "raw_html"]
+        )
+
+    def __contains__(self, book_id: int) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM pages WHERE book_id = ?", (int(book_id),)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "HtmlStore":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+def convert_csv_to_store(csv_path: str, store_path: str, chunksize: int = 500) -> str:
+    """Copy the pages of a csv written by `write_htmls_to_csv` into an
+    `HtmlStore`, reading the csv in chunks.
+
+    Args:
+        csv_path (str): location of the csv containing raw HTMLs.
+        store_path (str): location of the store.
+        chunksize (int): number of rows read at a time.
+
+    Returns:
+        The path of the store.
+    """
+    with HtmlStore(store_path) as store:
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize):
+            chunk = chunk.dropna(subset=["raw_html"])
+            store.put_many(zip(chunk.book_id, chunk.raw_html))
+    return store_path
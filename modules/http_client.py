@@ -0,0 +1,323 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, NamedTuple, Union
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+DEFAULT_TTL = 7 * 24 * 60 * 60
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+# query parameters holding credentials, left out of cache keys so that
+# API keys aren't hashed into file names and a new key reuses the cache
+CREDENTIAL_PARAMS = frozenset(["key", "api_key", "access_token"])
+
+
+class FetchedPage(NamedTuple):
+    """Minimal stand-in for `requests.Response`, returned by `cached_get`
+    whether the page came from the network or from the disk cache.
+    """
+
+    status_code: int
+    headers: CaseInsensitiveDict
+    content: bytes
+    from_cache: bool = False
+
+    @property
+    def text(self) -> str:
+        encoding = get_encoding_from_headers(self.headers) or "utf-8"
+        return self.content.decode(encoding, errors="replace")
+
+    def json(self):
+        return json.loads(self.text)
+
+
+@lru_cache(maxsize=None)
+def get_session(pool_maxsize: int = 32) -> requests.Session:
+    """Return a process-wide `requests.Session`. The session keeps
+    connections alive, so consecutive requests to the same host reuse
+    one TCP/TLS connection instead of performing a new handshake.
+
+    Args:
+        pool_maxsize (int): number of connections kept open per host.
+
+    Returns:
+        A shared session.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+class ResponseCache:
+    """Content-addressed disk cache for HTTP responses.
+
+    Bodies are stored once under the SHA-256 of their content, and each
+    request (URL plus query parameters) has a small JSON index entry that
+    points to its body and keeps the validators sent by the server
+    (ETag and Last-Modified). Entries younger than `ttl` seconds are
+    served without touching the network; older entries are revalidated
+    with a conditional GET. When the bodies take up more than `max_bytes`,
+    the least recently used entries are evicted.
+
+    Args:
+        cache_dir (str): directory where responses are stored.
+        ttl (float): number of seconds a response is considered fresh.
+        max_bytes (int): maximum total size of the stored bodies.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str,
+        ttl: float = DEFAULT_TTL,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+    ) -> None:
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._index_dir = os.path.join(self.cache_dir, "index")
+        self._objects_dir = os.path.join(self.cache_dir, "objects")
+        os.makedirs(self._index_dir, exist_ok=True)
+        os.makedirs(self._objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._size = sum(
+            entry.stat().st_size for entry in os.scandir(self._objects_dir)
+        )
+
+    @staticmethod
+    def request_key(url: str, params: Union[Dict, None] = None) -> str:
+        """Hash of a request's URL and query parameters, ignoring the
+        CREDENTIAL_PARAMS.
+        """
+        params = [
+            (name, value)
+            for name, value in sorted((params or {}).items())
+            if name not in CREDENTIAL_PARAMS
+        ]
+        request = json.dumps([url, params], default=str)
+        return hashlib.sha256(request.encode()).hexdigest()
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self._index_dir, f"{key}.json")
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self._objects_dir, digest)
+
+    def lookup(self, key: str) -> Union[Dict, None]:
+        """Return the index entry of a request, or None if it isn't cached."""
+        try:
+            with open(self._index_path(key)) as f:
+                entry = json.load(f)
+            with open(self._object_path(entry["digest"]), "rb") as f:
+                entry["content"] = f.read()
+        except (OSError, ValueError, KeyError):
+            return None
+        os.utime(self._index_path(key))
+        return entry
+
+    def is_fresh(self, entry: Dict) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def store(
+        self, key: str, url: str, headers: CaseInsensitiveDict, content: bytes
+    ) -> None:
+        """Save a response body and its validators."""
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        entry = {
+            "url": url,
+            "digest": digest,
+            "fetched_at": time.time(),
+            "headers": {
+                name: headers[name]
+                for name in ("Content-Type", "ETag", "Last-Modified")
+                if name in headers
+            },
+        }
+        with self._lock:
+            if not os.path.exists(object_path):
+                _atomic_write(object_path, content)
+                self._size += len(content)
+            _atomic_write(self._index_path(key), json.dumps(entry).encode())
+        if self._size > self.max_bytes:
+            self.evict()
+
+    def touch(self, key: str, entry: Dict) -> None:
+        """Mark a cached response as fresh again (after a 304 Not Modified)."""
+        entry = {k: v for k, v in entry.items() if k != "content"}
+        entry["fetched_at"] = time.time()
+        _atomic_write(self._index_path(key), json.dumps(entry).encode())
+
+    def evict(self) -> None:
+        """Remove least recently used entries until the cache fits in
+        `max_bytes`, then delete bodies that no entry refers to any more.
+        """
+        with self._lock:
+            entries = []
+            for index_file in os.scandir(self._index_dir):
+                if not index_file.name.endswith(".json"):
+                    continue
+                try:
+                    with open(index_file.path) as f:
+                        digest = json.load(f)["digest"]
+                    entries.append(
+                        (index_file.stat().st_mtime, index_file.path, digest)
+                    )
+                except (OSError, ValueError, KeyError):
+                    _remove(index_file.path)
+            entries.sort()
+
+            sizes = {
+                entry.name: entry.stat().st_size
+                for entry in os.scandir(self._objects_dir)
+                if not entry.name.endswith(".tmp")
+            }
+            references = Counter(digest for _, _, digest in entries)
+            total = sum(sizes.get(digest, 0) for digest in references)
+            for _, index_path, digest in entries:
+                if total <= 0.9 * self.max_bytes:
+                    break
+                _remove(index_path)
+                references[digest] -= 1
+                if references[digest] == 0:
+                    total -= sizes.get(digest, 0)
+
+            for digest in sizes:
+                if references[digest] <= 0:
+                    _remove(self._object_path(digest))
+            self._size = total
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+_default_cache = None
+
+
+def enable_cache(
+    cache_dir: str, ttl: float = DEFAULT_TTL, max_bytes: int = DEFAULT_MAX_BYTES
+) -> ResponseCache:
+    """Use a disk cache for every request made through `cached_get`.
+
+    Args:
+        cache_dir (str): directory where responses are stored.
+        ttl (float): number of seconds a response is considered fresh.
+        max_bytes (int): maximum total size of the cache.
+
+    Returns:
+        The cache now used by default.
+    """
+    global _default_cache
+    _default_cache = ResponseCache(cache_dir, ttl=ttl, max_bytes=max_bytes)
+    return _default_cache
+
+
+def disable_cache() -> None:
+    global _default_cache
+    _default_cache = None
+
+
+def get_default_cache() -> Union[ResponseCache, None]:
+    """Return the cache enabled with `enable_cache`. If none was enabled
+    and the CAPSTONE_HTTP_CACHE_DIR environment variable is set, a cache
+    is created in that directory.
+    """
+    if _default_cache is None and os.environ.get("CAPSTONE_HTTP_CACHE_DIR"):
+        enable_cache(os.environ["CAPSTONE_HTTP_CACHE_DIR"])
+    return _default_cache
+
+
+def cached_response(
+    url: str, params: Union[Dict, None] = None, cache: Union[ResponseCache, None] = None
+) -> Union[FetchedPage, None]:
+    """Response to a GET request from the disk cache, without touching the
+    network: None if no cache is enabled, or if the response isn't cached
+    or is stale (and would be revalidated by `cached_get`).
+
+    Args:
+        url (str): URL to request.
+        params (Dict): query parameters.
+        cache (ResponseCache): cache to use instead of the default one.
+
+    Returns:
+        The cached response, or None.
+    """
+    cache = cache or get_default_cache()
+    if cache is None:
+        return None
+    entry = cache.lookup(cache.request_key(url, params))
+    if entry is None or not cache.is_fresh(entry):
+        return None
+    return FetchedPage(
+        200, CaseInsensitiveDict(entry["headers"]), entry["content"], True
+    )
+
+
+def cached_get(
+    url: str,
+    params: Union[Dict, None] = None,
+    cache: Union[ResponseCache, None] = None,
+    timeout: float = 60,
+) -> FetchedPage:
+    """Make an HTTP GET request through the shared session, using the
+    disk cache when one is enabled.
+
+    Fresh cached responses are returned straight away. Stale ones are
+    revalidated with If-None-Match/If-Modified-Since, so the body is only
+    downloaded again if the page has changed. Only successful (200)
+    responses are cached.
+
+    Args:
+        url (str): URL to request.
+        params (Dict): query parameters.
+        cache (ResponseCache): cache to use instead of the default one.
+        timeout (float): number of seconds to wait for the server.
+
+    Returns:
+        The status, headers and body of the response.
+
+    Raises:
+        requests.exceptions.RequestException: if the request fails.
+    """
+    cache = cache or get_default_cache()
+    key = entry = None
+    headers = {}
+    if cache is not None:
+        key = cache.request_key(url, params)
+        entry = cache.lookup(key)
+        if entry is not None:
+            cached_headers = CaseInsensitiveDict(entry["headers"])
+            if cache.is_fresh(entry):
+                return FetchedPage(200, cached_headers, entry["content"], True)
+            if "ETag" in cached_headers:
+                headers["If-None-Match"] = cached_headers["ETag"]
+            if "Last-Modified" in cached_headers:
+                headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+
+    resp = get_session().get(url, params=params, headers=headers, timeout=timeout)
+    with resp:
+        if resp.status_code == 304 and entry is not None:
+            cache.touch(key, entry)
+            return FetchedPage(200, cached_headers, entry["content"], True)
+        if resp.status_code == 200 and cache is not None:
+            cache.store(key, url, resp.headers, resp.content)
+        return FetchedPage(resp.status_code, resp.headers, resp.content)
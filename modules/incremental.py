@@ -0,0 +1,150 @@
+import os
+from typing import Callable, NamedTuple, Tuple
+
+import numpy as np
+import pandas as pd
+from gensim import corpora
+
+from modules.preprocessing import process_reviews
+from modules.text_cache import text_key
+
+# columns identifying a review. A book and user don't identify a review on
+# their own: missing users are all "unknown", so the text is part of the key,
+# and identical reviews are numbered in order of appearance
+KEY_COLUMNS = ["id", "user", "review_hash", "review_occurrence"]
+
+
+class ProcessedReviews(NamedTuple):
+    """Processed reviews and the dictionary built from their lemmas."""
+
+    reviews: pd.DataFrame
+    dictionary: corpora.Dictionary
+
+
+def add_review_hashes(df: pd.DataFrame) -> pd.DataFrame:
+    """Add a `review_hash` column fingerprinting the text of each review, so
+    changed reviews can be told apart from unchanged ones, and a
+    `review_occurrence` column numbering identical reviews of the same book
+    by the same user, so every row has a unique key.
+    """
+    df = df.copy()
+    df["review_hash"] = [text_key(review) for review in df.reviews]
+    # missing values are grouped as text rather than dropped
+    df["review_occurrence"] = (
+        df[["id", "user", "review_hash"]]
+        .astype(str)
+        .groupby(["id", "user", "review_hash"], sort=False)
+        .cumcount()
+    )
+    return df
+
+
+def find_changed_reviews(df: pd.DataFrame, processed: pd.DataFrame) -> pd.Series:
+    """Flag the reviews that are not in `processed` yet, or whose text
+    changed since they were processed.
+
+    Args:
+        df (pd.DataFrame): reviews with the columns added by
+            `add_review_hashes`
+        processed (pd.DataFrame): reviews processed earlier
+
+    Returns:
+        A boolean series aligned with `df`.
+    """
+    merged = df[KEY_COLUMNS].merge(
+        processed[KEY_COLUMNS],
+        on=KEY_COLUMNS,
+        how="left",
+        indicator=True,
+        validate="one_to_one",
+    )
+    return pd.Series((merged["_merge"] == "left_only").values, index=df.index)
+
+
+def load_processed_reviews(directory: str) -> ProcessedReviews:
+    """Load the output of `update_processed_reviews`. If nothing was saved
+    yet, an empty dataframe and dictionary are returned.
+    """
+    reviews_path = os.path.join(directory, "processed_reviews.pkl")
+    dictionary_path = os.path.join(directory, "dictionary.dict")
+    if not (os.path.exists(reviews_path) and os.path.exists(dictionary_path)):
+        return ProcessedReviews(pd.DataFrame(columns=KEY_COLUMNS), corpora.Dictionary())
+    reviews = pd.read_pickle(reviews_path)
+    if "review_occurrence" not in reviews:
+        # saved before identical reviews were numbered
+        reviews = add_review_hashes(reviews)
+    return ProcessedReviews(reviews, corpora.Dictionary.load(dictionary_path))
+
+
+def save_processed_reviews(directory: str, processed: ProcessedReviews) -> None:
+    """Save processed reviews and their dictionary. Files are written under
+    a temporary name first, so a crash never leaves them half-written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    for name, obj in [
+        ("processed_reviews.pkl", processed.reviews),
+        ("dictionary.dict", processed.dictionary),
+    ]:
+        path = os.path.join(directory, name)
+        if isinstance(obj, pd.DataFrame):
+            obj.to_pickle(path + ".tmp")
+        else:
+            obj.save(path + ".tmp")
+        os.replace(path + ".tmp", path)
+
+
+def update_processed_reviews(
+    df: pd.DataFrame,
+    directory: str,
+    process: Callable[[pd.DataFrame], pd.DataFrame] = process_reviews,
+) -> Tuple[ProcessedReviews, int]:
+    """Bring the processed reviews saved in `directory` up to date with
+    `df`. Only reviews that are new, or whose text changed, go through
+    the (slow) preprocessing chain; the others are taken from the saved
+    results. Reviews no longer in `df` are dropped.
+
+    The dictionary is updated in place with the lemmas of the processed
+    reviews. gensim can't remove the counts of the old version of a changed
+    review, so document frequencies of their words are slightly
+    overestimated until the dictionary is rebuilt from scratch.
+
+    Args:
+        df (pd.DataFrame): reviews, with `id`, `user` and `reviews` columns
+        directory (str): folder holding the processed reviews
+        process (Callable): preprocessing chain, adding the processed
+            columns (including `lemmatized_reviews`) to a dataframe
+
+    Returns:
+        The up-to-date processed reviews and dictionary, in the order of
+        `df`, and the number of reviews that were processed.
+    """
+    df = add_review_hashes(df)
+    stored = load_processed_reviews(directory)
+    changed = find_changed_reviews(df, stored.reviews).values
+    n_changed = int(changed.sum())
+
+    # rows are put back in the order of `df` by position, as its index may
+    # have duplicates
+    positions = np.arange(len(df))
+    new_reviews = df[changed]
+    if n_changed:
+        new_reviews = process(new_reviews)
+        stored.dictionary.add_documents(new_reviews.lemmatized_reviews)
+    new_reviews.index = positions[changed]
+
+    # unchanged reviews keep their processed columns
+    processed_columns = [c for c in stored.reviews.columns if c not in df.columns]
+    unchanged = df[~changed].merge(
+        stored.reviews[KEY_COLUMNS + processed_columns],
+        on=KEY_COLUMNS,
+        how="left",
+        validate="one_to_one",
+    )
+    unchanged.index = positions[~changed]
+    reviews = pd.concat([unchanged, new_reviews], sort=False).sort_index()
+    reviews.index = df.index
+
+    processed = ProcessedReviews(reviews, stored.dictionary)
+    if n_changed or len(stored.reviews) != len(df):
+        save_processed_reviews(directory, processed)
+    return processed, n_changed
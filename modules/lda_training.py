@@ -0,0 +1,272 @@
+import argparse
+import itertools
+import os
+import time
+from multiprocessing import cpu_count
+from typing import Dict, Iterable, List, NamedTuple, Tuple, Union
+
+import pandas as pd
+from gensim import corpora
+from gensim.models import LdaMulticore
+
+from modules.coherence import evaluate_lda_models
+from modules.corpus_artifacts import build_corpus_artifacts
+
+RESULTS_COLUMNS = [
+    "model",
+    "num_topics",
+    "passes",
+    "ngram",
+    "min_review_length",
+    "n_documents",
+    "perplexity",
+    "coherence",
+    "training_time",
+    "evaluation_time",
+]
+
+
+class SweepConfig(NamedTuple):
+    """Hyperparameters of one LDA model of the sweep."""
+
+    num_topics: int
+    passes: int
+    ngram: str
+    min_review_length: int
+
+    @property
+    def name(self) -> str:
+        return (
+            f"lda_{self.ngram}_t{self.num_topics}"
+            f"_p{self.passes}_m{self.min_review_length}"
+        )
+
+
+def build_grid(
+    topics: Iterable[int],
+    passes: Iterable[int],
+    ngrams: Iterable[str] = ("unigram",),
+    min_review_lengths: Iterable[int] = (0,),
+) -> List[SweepConfig]:
+    """Every combination of the given hyperparameters."""
+    return [
+        SweepConfig(num_topics, n_passes, ngram, min_review_length)
+        for ngram, min_review_length, num_topics, n_passes in itertools.product(
+            ngrams, min_review_lengths, topics, passes
+        )
+    ]
+
+
+def default_workers() -> int:
+    """Number of LdaMulticore workers using all cores but one, which is
+    left to the master process dispatching chunks.
+    """
+    return max(1, cpu_count() - 1)
+
+
+def train_lda_model(
+    corpus: Iterable,
+    texts: List[List[str]],
+    dictionary: corpora.Dictionary,
+    config: SweepConfig,
+    workers: int,
+    random_state: int = 1,
+) -> Tuple[LdaMulticore, Dict]:
+    """Train an LDA model on all cores and compute its perplexity. Its
+    c_v coherence is computed afterwards, together with the other models
+    trained on the same texts, by `run_sweep`.
+
+    Args:
+        corpus (Iterable): document-term matrix
+        texts (List[List[str]]): lemmatized reviews the corpus was built from
+        dictionary (corpora.Dictionary): dictionary of the corpus
+        config (SweepConfig): hyperparameters of the model
+        workers (int): number of worker processes
+        random_state (int): seed, 1 as in the notebooks
+
+    Returns:
+        The trained model and a row of the results table, without its
+        coherence.
+    """
+    start = time.perf_counter()
+    model = LdaMulticore(
+        corpus=corpus,
+        id2word=dictionary,
+        num_topics=config.num_topics,
+        passes=config.passes,
+        random_state=random_state,
+        workers=workers,
+    )
+    training_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    perplexity = model.log_perplexity(corpus)
+    evaluation_time = time.perf_counter() - start
+
+    return (
+        model,
+        {
+            "model": config.name,
+            **config._asdict(),
+            "n_documents": len(texts),
+            "perplexity": perplexity,
+            "coherence": None,
+            "training_time": training_time,
+            "evaluation_time": evaluation_time,
+        },
+    )
+
+
+def load_results(path: str) -> pd.DataFrame:
+    """Load the results table of a sweep, or an empty one if the sweep
+    hasn't started yet.
+    """
+    if os.path.exists(path):
+        return pd.read_csv(path)
+    return pd.DataFrame(columns=RESULTS_COLUMNS)
+
+
+def append_results(path: str, rows: List[Dict]) -> None:
+    """Append rows to a results table, creating it if needed."""
+    pd.DataFrame(rows, columns=RESULTS_COLUMNS).to_csv(
+        path, mode="a", header=not os.path.exists(path), index=False
+    )
+
+
+def run_sweep(
+    reviews: Iterable[str],
+    output_dir: str,
+    grid: List[SweepConfig],
+    artifacts_dir: Union[str, None] = None,
+    workers: Union[int, None] = None,
+    n_process: int = 1,
+) -> pd.DataFrame:
+    """Train and evaluate an LDA model for every configuration of the grid.
+
+    Each model is saved in `output_dir` as soon as it has been trained,
+    with its row in `output_dir/trained.csv`. Once every model sharing a
+    corpus is trained, their c_v coherences are computed together: word
+    co-occurrences are counted once for all of them with
+    `evaluate_lda_models`, instead of once per model, and the statistics
+    are kept in `output_dir`. Their rows are then appended to
+    `output_dir/results.csv`, and the time spent on coherence is split
+    evenly between their evaluation times. Models whose results are already
+    in the table are skipped, and trained models waiting for their
+    coherence aren't trained again, so an interrupted sweep can be rerun
+    to finish it. The corpus of each n-gram mode is built once (and cached
+    in `artifacts_dir`), then shared by all the models using it. As in the
+    notebooks, reviews shorter than `min_review_length` lemmas are removed
+    and a separate dictionary is built for them.
+
+    Args:
+        reviews (Iterable[str]): raw book reviews
+        output_dir (str): folder where models and results are saved
+        grid (List[SweepConfig]): configurations to train
+        artifacts_dir (str): folder caching the corpora. Defaults to
+            `output_dir/artifacts`.
+        workers (int): number of LdaMulticore workers, also used to score
+            the models
+        n_process (int): number of processes used by spaCy
+
+    Returns:
+        The results table.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    artifacts_dir = artifacts_dir or os.path.join(output_dir, "artifacts")
+    workers = workers or default_workers()
+    results_path = os.path.join(output_dir, "results.csv")
+    trained_path = os.path.join(output_dir, "trained.csv")
+    done = set(load_results(results_path).model)
+    trained = {
+        row["model"]: row
+        for row in load_results(trained_path).to_dict("records")
+        if os.path.exists(os.path.join(output_dir, row["model"]))
+    }
+    reviews = list(reviews)
+
+    todo = [config for config in grid if config.name not in done]
+    groups = itertools.groupby(
+        sorted(todo, key=lambda c: (c.ngram, c.min_review_length)),
+        key=lambda c: (c.ngram, c.min_review_length),
+    )
+    for (ngram, min_review_length), configs in groups:
+        artifacts = build_corpus_artifacts(
+            reviews, artifacts_dir, params={"ngram": ngram}, n_process=n_process
+        )
+        texts = artifacts.texts
+        dictionary = artifacts.dictionary
+        corpus = artifacts.corpus
+        if min_review_length:
+            texts = [text for text in texts if len(text) >= min_review_length]
+            dictionary = corpora.Dictionary(texts)
+            corpus = [dictionary.doc2bow(text) for text in texts]
+
+        rows = []
+        for config in configs:
+            if config.name in trained:
+                rows.append(trained[config.name])
+                continue
+            print(f"Training {config.name}")
+            model, row = train_lda_model(corpus, texts, dictionary, config, workers)
+            model.save(os.path.join(output_dir, config.name))
+            append_results(trained_path, [row])
+            rows.append(row)
+            print(
+                f"Perplexity: {row['perplexity']:.3f}, "
+                f"time: {row['training_time']:.0f}s"
+            )
+
+        print(f"Computing the coherence of {len(rows)} models")
+        start = time.perf_counter()
+        coherences = evaluate_lda_models(
+            [os.path.join(output_dir, row["model"]) for row in rows],
+            texts,
+            dictionary,
+            os.path.join(output_dir, f"coherence_{ngram}_m{min_review_length}.pkl"),
+            n_jobs=workers,
+        )
+        coherence_time = (time.perf_counter() - start) / len(rows)
+        for row, coherence in zip(rows, coherences):
+            row["coherence"] = coherence
+            row["evaluation_time"] += coherence_time
+            print(f"{row['model']}: coherence {coherence:.3f}")
+        append_results(results_path, rows)
+
+    return load_results(results_path)
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Train and evaluate a grid of LDA models on book reviews."
+    )
+    parser.add_argument("reviews_path", help="csv with a `reviews` column")
+    parser.add_argument("output_dir", help="folder where models are saved")
+    parser.add_argument("--topics", type=int, nargs="+", default=[20])
+    parser.add_argument("--passes", type=int, nargs="+", default=[10])
+    parser.add_argument(
+        "--ngrams",
+        nargs="+",
+        default=["unigram"],
+        choices=["unigram", "bigram", "trigram"],
+    )
+    parser.add_argument("--min-review-lengths", type=int, nargs="+", default=[0])
+    parser.add_argument("--artifacts-dir", default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--n-process", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    reviews = pd.read_csv(args.reviews_path, usecols=["reviews"], dtype=object)
+    grid = build_grid(args.topics, args.passes, args.ngrams, args.min_review_lengths)
+    results = run_sweep(
+        reviews.reviews.fillna(""),
+        args.output_dir,
+        grid,
+        artifacts_dir=args.artifacts_dir,
+        workers=args.workers,
+        n_process=args.n_process,
+    )
+    print(results.sort_values("coherence", ascending=False).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
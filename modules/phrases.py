@@ -0,0 +1,156 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Sequence, Tuple
+
+from gensim.models.phrases import Phraser, Phrases
+
+from modules.utils import lemmatize_text_stream
+
+# number of Phrasers applied one after the other for each n-gram mode
+PHRASE_LEVELS = {"unigram": 0, "bigram": 1, "trigram": 2}
+
+
+def _count_chunk(
+    chunk: List[List[str]], min_count: int, threshold: float
+) -> Tuple[Dict, int]:
+    phrases = Phrases(chunk, min_count=min_count, threshold=threshold)
+    return dict(phrases.vocab), phrases.corpus_word_count
+
+
+def count_phrases(
+    chunks: Iterable[List[List[str]]],
+    min_count: int = 5,
+    threshold: float = 100,
+    n_jobs: int = 1,
+) -> Phrases:
+    """Train a Phrases model on tokenized reviews streamed in chunks.
+
+    Word and bigram counts of each chunk are computed separately (in a pool
+    of `n_jobs` processes, at most `2 * n_jobs` chunks at a time) and then
+    added up, which gives the same counts, hence the same phrases, as
+    training on all the reviews at once.
+
+    Args:
+        chunks (Iterable[List[List[str]]]): chunks of tokenized reviews
+        min_count (int): minimum count of a bigram to become a phrase
+        threshold (float): score threshold, higher means fewer phrases
+        n_jobs (int): number of processes counting chunks
+
+    Returns:
+        The trained model.
+    """
+    phrases = Phrases(min_count=min_count, threshold=threshold)
+    count = partial(_count_chunk, min_count=min_count, threshold=threshold)
+    if n_jobs == 1:
+        results = map(count, chunks)
+    else:
+        results = _count_in_pool(count, iter(chunks), n_jobs)
+
+    for vocab, word_count in results:
+        for word, n in vocab.items():
+            phrases.vocab[word] = phrases.vocab.get(word, 0) + n
+        phrases.corpus_word_count += word_count
+    return phrases
+
+
+def _count_in_pool(count, chunks: Iterator, n_jobs: int) -> Iterator[Tuple[Dict, int]]:
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        pending = [
+            executor.submit(count, chunk) for chunk in islice(chunks, 2 * n_jobs)
+        ]
+        while pending:
+            result = pending.pop(0).result()
+            for chunk in islice(chunks, 1):
+                pending.append(executor.submit(count, chunk))
+            yield result
+
+
+def apply_phrases(tokens: List[str], phrasers: Sequence[Phraser]) -> List[str]:
+    """Join the phrases of a tokenized review, e.g. trigrams are found by
+    applying the bigram then the trigram Phraser.
+    """
+    for phraser in phrasers:
+        tokens = phraser[tokens]
+    return tokens
+
+
+def train_phrasers(
+    chunks: Iterable[List[List[str]]],
+    ngram: str = "bigram",
+    min_count: int = 5,
+    threshold: float = 100,
+    n_jobs: int = 1,
+) -> List[Phraser]:
+    """Train the frozen phrase models of an n-gram mode, as done in the
+    notebooks: a bigram model, then for trigrams a second model trained on
+    reviews whose bigrams have been joined.
+
+    Args:
+        chunks (Iterable[List[List[str]]]): chunks of tokenized reviews.
+            It is read once per level, so for trigrams it must be possible
+            to iterate over it twice (e.g. a list or a StreamingCorpus-like
+            object, not a generator).
+        ngram (str): "unigram", "bigram" or "trigram"
+        min_count (int): minimum count of a phrase
+        threshold (float): score threshold, higher means fewer phrases
+        n_jobs (int): number of processes counting chunks
+
+    Returns:
+        The Phrasers to apply in order (none for unigrams).
+    """
+    phrasers = []
+    for _ in range(PHRASE_LEVELS[ngram]):
+        level_chunks = (
+            [apply_phrases(tokens, phrasers) for tokens in chunk] for chunk in chunks
+        )
+        phrases = count_phrases(level_chunks, min_count, threshold, n_jobs)
+        phrasers.append(Phraser(phrases))
+    return phrasers
+
+
+def save_phrasers(directory: str, phrasers: Sequence[Phraser]) -> None:
+    """Save frozen phrase models, to be loaded with `load_phrasers`."""
+    os.makedirs(directory, exist_ok=True)
+    for level, phraser in enumerate(phrasers):
+        phraser.save(os.path.join(directory, f"phraser_{level + 2}gram"))
+
+
+def load_phrasers(directory: str) -> List[Phraser]:
+    phrasers = []
+    for level in range(2, 2 + max(PHRASE_LEVELS.values())):
+        path = os.path.join(directory, f"phraser_{level}gram")
+        if not os.path.exists(path):
+            break
+        phrasers.append(Phraser.load(path))
+    return phrasers
+
+
+def phrase_and_lemmatize(
+    tokenized_reviews: Iterable[List[str]],
+    phrasers: Sequence[Phraser],
+    tags: Sequence[str] = ("NOUN", "ADJ"),
+    batch_size: int = 1000,
+    n_process: int = 1,
+) -> Iterator[List[str]]:
+    """Join phrases and lemmatize reviews in a single streaming pass: each
+    review goes through the Phrasers just before spaCy reads it, so no
+    intermediate list of phrased reviews is built.
+
+    Args:
+        tokenized_reviews (Iterable[List[str]]): tokenized reviews
+        phrasers (Sequence[Phraser]): frozen phrase models, in order
+        tags (Sequence[str]): parts of speech kept by the lemmatizer
+        batch_size (int): number of reviews spaCy processes at a time
+        n_process (int): number of processes running the spaCy pipeline
+
+    Yields:
+        The lemmas of each review, in input order.
+    """
+    return lemmatize_text_stream(
+        (apply_phrases(tokens, phrasers) for tokens in tokenized_reviews),
+        tags=tags,
+        batch_size=batch_size,
+        n_process=n_process,
+    )
@@ -0,0 +1,725 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+import pandas as pd
+
+from extra_info.helper_functions.dataset_loader import (
+    assess_problematic_entries,
+    format_dataframe,
+    iter_dataset_chunks,
+)
+from modules.book_genre_extractor import assign_book_genres
+from modules.book_info_extractor import (
+    clean_book_info,
+    clean_isbn_and_id_lists,
+    extract_book_details_from_store,
+)
+from modules.corpus_artifacts import build_corpus_artifacts
+from modules.goodreads_api_functions import (
+    GOODREADS_API_URL,
+    GOODREADS_REQUESTS_PER_SECOND,
+    acquire_goodreads_id,
+    get_books_metadata,
+    make_goodreads_scheduler,
+)
+from modules.goodreads_cache import NOT_FOUND, GoodreadsCache
+from modules.html_store import HtmlStore
+from modules.lda_training import build_grid, default_workers, run_sweep
+from modules.scraper import LIBRARYTHING_WORK_URL, write_htmls_to_store
+from modules.utils import create_final_dataset, detect_languages
+
+# bump when stages change in a way that makes their cached outputs invalid
+PIPELINE_VERSION = 1
+
+# stage parameters that change how fast a stage runs, not what it produces,
+# so they are left out of cache keys. LdaMulticore `workers` are not among
+# them: the trained models depend on how the chunks are split between them.
+RUNTIME_PARAMS = {
+    "n_jobs",
+    "n_process",
+    "max_workers",
+    "requests_per_second",
+}
+
+DEFAULT_CONFIG = {
+    "cache_dir": "pipeline_cache",
+    "inputs": {"reviews_dump": "reviews.json"},
+    "stages": {
+        "load_reviews": {"chunksize": 100000, "n_jobs": 1},
+        "top_books": {"n_books": 5000},
+        "scrape": {
+            "url_template": LIBRARYTHING_WORK_URL,
+            "max_workers": 1,
+            "requests_per_second": 1.0,
+            "max_retries": 3,
+            "max_failures": 0,
+        },
+        "book_details": {"n_jobs": 1, "fixes": {}},
+        "goodreads_ids": {
+            "api_url": GOODREADS_API_URL,
+            "requests_per_second": GOODREADS_REQUESTS_PER_SECOND,
+            "isbn_fixes": {},
+            "max_failures": 0,
+        },
+        "shelves": {
+            "api_url": GOODREADS_API_URL,
+            "requests_per_second": GOODREADS_REQUESTS_PER_SECOND,
+            "excluded_books": [],
+            "max_failures": 0,
+        },
+        "genres": {"threshold": 0.25},
+        "language": {"chunksize": 100000, "n_jobs": 1},
+        "final_dataset": {"compact": True},
+        "preprocessing": {"ngram": "bigram", "n_process": 1},
+        "lda": {
+            "topics": [20],
+            "passes": [10],
+            "min_review_lengths": [0],
+            "workers": None,
+        },
+    },
+}
+
+
+def _path(inputs: Dict[str, str], stage: str, filename: str) -> str:
+    return os.path.join(inputs[stage], filename)
+
+
+def _read_csv(path: str, **kwargs) -> pd.DataFrame:
+    return pd.read_csv(path, dtype=object, **kwargs)
+
+
+def load_reviews(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Parse the LibraryThing review dump into reviews.csv, as the
+    data_preprocessing notebook does, one chunk at a time.
+    """
+    counts = Counter()
+    with open(os.path.join(output_dir, "reviews.csv"), "w") as f:
+        chunks = iter_dataset_chunks(
+            inputs["reviews_dump"],
+            chunksize=params["chunksize"],
+            n_jobs=params["n_jobs"],
+            counts=counts,
+        )
+        for i, chunk in enumerate(chunks):
+            chunk = format_dataframe(df=chunk, column1="flags", column2="unixtime")
+            chunk.to_csv(f, header=i == 0, index=False)
+    assess_problematic_entries(n_problems=counts["problems"], data=counts["entries"])
+
+
+def select_top_books(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Write the IDs of the most reviewed books to top_books.csv."""
+    reviews = _read_csv(_path(inputs, "load_reviews", "reviews.csv"), usecols=["id"])
+    top_books = (
+        reviews.id.value_counts()
+        .head(params["n_books"])
+        .rename("n_comments")
+        .rename_axis("book_id")
+        .reset_index()
+    )
+    top_books.to_csv(os.path.join(output_dir, "top_books.csv"), index=False)
+
+
+def _books_list(inputs: Dict[str, str]) -> List[int]:
+    return list(pd.read_csv(_path(inputs, "top_books", "top_books.csv")).book_id)
+
+
+def _check_failures(
+    what: str, failed: Collection, n_not_found: int, max_failures: int
+) -> None:
+    """Report the requests of a stage that failed, and fail the stage if
+    there are more than `max_failures` of them. Otherwise the stage would
+    be cached without their results, and later runs wouldn't retry them.
+    What was fetched is kept in the stores of the pipeline cache
+    directory, so running the stage again only retries the failures.
+    """
+    print(f"{what}: {len(failed)} failed, {n_not_found} not found")
+    if len(failed) > max_failures:
+        raise RuntimeError(
+            f"{len(failed)} {what} failed (max_failures={max_failures}), run the "
+            f"stage again to retry them: {sorted(failed)[:10]}"
+        )
+
+
+def scrape_book_pages(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Scrape the LibraryThing page of every top book into pages.db.
+
+    Pages are scraped into a store kept in the pipeline cache directory,
+    which skips books already scraped by an earlier run, so a changed list
+    of books only costs requests for the new books (or those whose scrape
+    failed). The pages of the top books are then copied to the output.
+    The stage fails if more than `max_failures` pages could not be scraped
+    for reasons that may go away (see `modules.scraper.is_retryable`).
+    """
+    books_list = _books_list(inputs)
+    shared_path = os.path.join(inputs["cache_dir"], "pages.db")
+    not_retried = set()
+    write_htmls_to_store(
+        books_list,
+        shared_path,
+        max_workers=params["max_workers"],
+        requests_per_second=params["requests_per_second"],
+        url_template=params["url_template"],
+        max_retries=params["max_retries"],
+        not_retried=not_retried,
+    )
+    with HtmlStore(shared_path) as shared:
+        failed = [
+            book_id
+            for book_id in books_list
+            if book_id not in shared and book_id not in not_retried
+        ]
+    _check_failures("pages", failed, len(not_retried), params["max_failures"])
+    with HtmlStore(shared_path) as shared, HtmlStore(
+        os.path.join(output_dir, "pages.db")
+    ) as store:
+        store.put_many(
+            (book_id, raw_html)
+            for book_id, raw_html in shared.iter_pages(books_list)
+            if raw_html is not None
+        )
+
+
+def extract_book_info(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Extract the title, author and ISBN of every scraped book into
+    book_info.csv. `fixes` corrects the details of some books, by
+    LibraryThing ID (see `modules.book_info_extractor.apply_book_fixes`).
+    """
+    books_list = _books_list(inputs)
+    book_info = extract_book_details_from_store(
+        _path(inputs, "scrape", "pages.db"), books_list, n_jobs=params["n_jobs"]
+    )
+    book_info = clean_book_info(book_info, books_list, fixes=params["fixes"])
+    book_info.to_csv(os.path.join(output_dir, "book_info.csv"), index=False)
+
+
+def _goodreads_cache(inputs: Dict[str, str]) -> GoodreadsCache:
+    return GoodreadsCache(os.path.join(inputs["cache_dir"], "goodreads.db"))
+
+
+def collect_goodreads_ids(
+    inputs: Dict[str, str], output_dir: str, params: Dict
+) -> None:
+    """Look up the Goodreads ID of every book with a valid ISBN, writing
+    goodreads_ids.csv. `isbn_fixes` corrects the ISBNs of some books, by
+    LibraryThing ID. The stage fails if the requests of more than
+    `max_failures` ISBNs failed.
+    """
+    book_info = _read_csv(_path(inputs, "book_details", "book_info.csv"))
+    isbns_list, id_list = clean_isbn_and_id_lists(
+        book_info, isbn_fixes=params["isbn_fixes"]
+    )
+    with _goodreads_cache(inputs) as cache:
+        goodreads_ids = acquire_goodreads_id(
+            isbns_list,
+            cache=cache,
+            base_url=params["api_url"],
+            scheduler=make_goodreads_scheduler(params["requests_per_second"]),
+        )
+        not_found = {isbn for isbn in isbns_list if cache.get_id(isbn) is NOT_FOUND}
+    failed = {
+        isbn
+        for isbn, goodreads_id in zip(isbns_list, goodreads_ids)
+        if goodreads_id is None and isbn not in not_found
+    }
+    _check_failures("ISBNs", failed, len(not_found), params["max_failures"])
+    # IDs are written as strings, as a column of ints with gaps would be
+    # written as floats
+    goodreads_ids = [None if id_ is None else str(id_) for id_ in goodreads_ids]
+    pd.DataFrame(
+        {"id": id_list, "isbn": isbns_list, "goodreads_id": goodreads_ids}
+    ).to_csv(os.path.join(output_dir, "goodreads_ids.csv"), index=False)
+
+
+def collect_shelves(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Collect the Goodreads title and shelves of every book, writing
+    goodreads_books.csv. Books listed in `excluded_books` (LibraryThing
+    IDs, e.g. academic textbooks) and books without a Goodreads ID are
+    left out. The stage fails if the requests of more than `max_failures`
+    books failed.
+    """
+    books = _read_csv(_path(inputs, "goodreads_ids", "goodreads_ids.csv"))
+    excluded = {str(book_id) for book_id in params["excluded_books"]}
+    books = books[books.goodreads_id.notna() & ~books.id.isin(excluded)]
+    books = books.reset_index(drop=True)
+    with _goodreads_cache(inputs) as cache:
+        metadata = get_books_metadata(
+            list(books.goodreads_id),
+            cache=cache,
+            base_url=params["api_url"],
+            scheduler=make_goodreads_scheduler(params["requests_per_second"]),
+        )
+        not_found = {
+            book_id
+            for book_id in books.goodreads_id
+            if cache.get_book(book_id) is NOT_FOUND
+        }
+    failed = {
+        book_id
+        for book_id, book in zip(books.goodreads_id, metadata)
+        if book is None and book_id not in not_found
+    }
+    _check_failures("books", failed, len(not_found), params["max_failures"])
+    books["goodreads_book_titles"] = [m["title"] if m else None for m in metadata]
+    books["goodreads_shelves"] = [m["shelves"] if m else None for m in metadata]
+    books = books.dropna(subset=["goodreads_shelves"])
+    books.to_csv(os.path.join(output_dir, "goodreads_books.csv"), index=False)
+
+
+def extract_genres(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Derive the genres of every book from its shelves, writing
+    clean_book_genres.csv.
+    """
+    books = _read_csv(_path(inputs, "shelves", "goodreads_books.csv"))
+    books["book_genres"] = assign_book_genres(
+        books.goodreads_shelves, threshold=params["threshold"]
+    )
+    books.to_csv(os.path.join(output_dir, "clean_book_genres.csv"), index=False)
+
+
+def filter_languages(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Keep English reviews, writing english_reviews.csv. Detected
+    languages are cached in the pipeline cache directory, so reviews are
+    only detected once across runs.
+    """
+    chunks = _read_csv(
+        _path(inputs, "load_reviews", "reviews.csv"), chunksize=params["chunksize"]
+    )
+    with open(os.path.join(output_dir, "english_reviews.csv"), "w") as f:
+        for i, chunk in enumerate(chunks):
+            chunk["language"] = detect_languages(
+                chunk.reviews.fillna(""),
+                n_jobs=params["n_jobs"],
+                cache_path=os.path.join(inputs["cache_dir"], "text_cache.db"),
+            )
+            chunk[chunk.language == "en"].to_csv(f, header=i == 0, index=False)
+
+
+def build_final_dataset(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Join English reviews, book details and genres into
+    final_clean_data.csv.
+    """
+    reviews = _read_csv(_path(inputs, "language", "english_reviews.csv"))
+    book_info = _read_csv(_path(inputs, "book_details", "book_info.csv"))
+    book_genres = _read_csv(_path(inputs, "genres", "clean_book_genres.csv"))
+    final_dataset = create_final_dataset(
+        df1=reviews.drop(columns="language"),
+        df2=book_info,
+        df3=book_genres,
+        compact=params["compact"],
+    )
+    final_dataset["language"] = "en"
+    final_dataset.to_csv(os.path.join(output_dir, "final_clean_data.csv"), index=False)
+
+
+def _final_reviews(inputs: Dict[str, str]) -> pd.Series:
+    path = _path(inputs, "final_dataset", "final_clean_data.csv")
+    return _read_csv(path, usecols=["reviews"]).reviews.fillna("")
+
+
+def preprocess_corpus(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Build the processed reviews, Dictionary and corpus of the final
+    dataset in artifacts/, recording their key in corpus.json.
+    """
+    artifacts = build_corpus_artifacts(
+        _final_reviews(inputs),
+        os.path.join(output_dir, "artifacts"),
+        params={"ngram": params["ngram"]},
+        n_process=params["n_process"],
+    )
+    with open(os.path.join(output_dir, "corpus.json"), "w") as f:
+        json.dump({"key": artifacts.key, "ngram": params["ngram"]}, f)
+
+
+def train_lda_models(inputs: Dict[str, str], output_dir: str, params: Dict) -> None:
+    """Train and evaluate LDA models on the preprocessed corpus, saving
+    them with their results.csv.
+    """
+    with open(_path(inputs, "preprocessing", "corpus.json")) as f:
+        corpus = json.load(f)
+    grid = build_grid(
+        params["topics"],
+        params["passes"],
+        [corpus["ngram"]],
+        params["min_review_lengths"],
+    )
+    run_sweep(
+        _final_reviews(inputs),
+        output_dir,
+        grid,
+        artifacts_dir=_path(inputs, "preprocessing", "artifacts"),
+        workers=params["workers"],
+    )
+
+
+def stage_params(config: Dict, name: str) -> Dict:
+    """Parameters of a stage, with defaults that depend on the machine
+    resolved, so that they are part of its cache key.
+    """
+    params = dict(config["stages"][name])
+    if name == "lda" and params["workers"] is None:
+        params["workers"] = default_workers()
+    return params
+
+
+class Stage(NamedTuple):
+    """A step of the pipeline: a function writing its outputs to a folder,
+    given the output folders of the stages it depends on and the paths of
+    the raw inputs it reads.
+    """
+
+    name: str
+    function: Callable[[Dict[str, str], str, Dict], None]
+    dependencies: Tuple[str, ...] = ()
+    sources: Tuple[str, ...] = ()
+
+
+STAGES = [
+    Stage("load_reviews", load_reviews, sources=("reviews_dump",)),
+    Stage("top_books", select_top_books, ("load_reviews",)),
+    Stage("scrape", scrape_book_pages, ("top_books",)),
+    Stage("book_details", extract_book_info, ("top_books", "scrape")),
+    Stage("goodreads_ids", collect_goodreads_ids, ("book_details",)),
+    Stage("shelves", collect_shelves, ("goodreads_ids",)),
+    Stage("genres", extract_genres, ("shelves",)),
+    Stage("language", filter_languages, ("load_reviews",)),
+    Stage("final_dataset", build_final_dataset, ("language", "book_details", "genres")),
+    Stage("preprocessing", preprocess_corpus, ("final_dataset",)),
+    Stage("lda", train_lda_models, ("final_dataset", "preprocessing")),
+]
+
+
+class StageResult(NamedTuple):
+    """Cached outputs of a stage."""
+
+    key: str
+    output_dir: str
+    output_hash: str
+    cached: bool
+
+
+def load_config(path: Union[str, None] = None) -> Dict:
+    """Read a JSON pipeline config and merge it over DEFAULT_CONFIG, stage
+    by stage. Relative paths in `cache_dir` and `inputs` are resolved from
+    the folder of the config file.
+    """
+    user_config = {}
+    base_dir = os.getcwd()
+    if path is not None:
+        with open(path) as f:
+            user_config = json.load(f)
+        base_dir = os.path.dirname(os.path.abspath(path))
+
+    config = {
+        "cache_dir": user_config.get("cache_dir", DEFAULT_CONFIG["cache_dir"]),
+        "inputs": {**DEFAULT_CONFIG["inputs"], **user_config.get("inputs", {})},
+        "stages": {
+            name: {**params, **user_config.get("stages", {}).get(name, {})}
+            for name, params in DEFAULT_CONFIG["stages"].items()
+        },
+    }
+
+    def resolve(path: str) -> str:
+        return os.path.join(base_dir, os.path.expanduser(path))
+
+    config["cache_dir"] = resolve(config["cache_dir"])
+    config["inputs"] = {name: resolve(p) for name, p in config["inputs"].items()}
+    return config
+
+
+def hash_directory(directory: str) -> str:
+    """Hash of the names and contents of every file in a folder."""
+    digest = hashlib.sha256()
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            digest.update(os.path.relpath(path, directory).encode())
+            digest.update(b"\0")
+            _update_with_file(digest, path)
+    return digest.hexdigest()
+
+
+def _update_with_file(digest, path: str) -> None:
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+
+
+class PipelineCache:
+    """Folder holding the outputs of every stage run, each under a key
+    hashing the stage's parameters and the contents of its inputs:
+    cache_dir/stages/<stage>/<key>/. A manifest.json written last marks a
+    complete output and records the hash of its contents, which downstream
+    stages use in their own keys. A stage whose inputs changed but produced
+    the same output therefore doesn't invalidate the stages after it.
+
+    Args:
+        cache_dir (str): location of the cache
+    """
+
+    def __init__(self, cache_dir: str) -> None:
+        self.cache_dir = cache_dir
+        self._hashes_path = os.path.join(cache_dir, "file_hashes.json")
+        os.makedirs(os.path.join(cache_dir, "stages"), exist_ok=True)
+        os.makedirs(os.path.join(cache_dir, "work"), exist_ok=True)
+
+    def file_hash(self, path: str) -> str:
+        """Hash of the contents of an input file. Hashes are remembered
+        with the size and modification time of the file, so large inputs
+        are only read again when they change.
+        """
+        stat = os.stat(path)
+        signature = [stat.st_size, stat.st_mtime_ns]
+        try:
+            with open(self._hashes_path) as f:
+                hashes = json.load(f)
+        except (OSError, ValueError):
+            hashes = {}
+        entry = hashes.get(path)
+        if entry is not None and entry["signature"] == signature:
+            return entry["hash"]
+
+        digest = hashlib.sha256()
+        _update_with_file(digest, path)
+        hashes[path] = {"signature": signature, "hash": digest.hexdigest()}
+        tmp_path = f"{self._hashes_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(hashes, f, indent=2)
+        os.replace(tmp_path, self._hashes_path)
+        return hashes[path]["hash"]
+
+    def output_dir(self, stage: str, key: str) -> str:
+        return os.path.join(self.cache_dir, "stages", stage, key)
+
+    def lookup(self, stage: str, key: str) -> Union[StageResult, None]:
+        """Outputs of a stage for a key, or None if it hasn't been run."""
+        output_dir = self.output_dir(stage, key)
+        try:
+            with open(os.path.join(output_dir, "manifest.json")) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return StageResult(key, output_dir, manifest["output_hash"], True)
+
+    def work_dir(self, stage: str, key: str) -> str:
+        """Empty folder where a stage writes its outputs before they are
+        committed, cleared of anything a failed run left behind.
+        """
+        work_dir = os.path.join(self.cache_dir, "work", f"{stage}-{key}")
+        if os.path.exists(work_dir):
+            shutil.rmtree(work_dir)
+        os.makedirs(work_dir, exist_ok=True)
+        return work_dir
+
+    def commit(
+        self, stage: str, key: str, work_dir: str, elapsed: float
+    ) -> StageResult:
+        """Move the outputs of a finished stage into the cache."""
+        output_hash = hash_directory(work_dir)
+        with open(os.path.join(work_dir, "manifest.json"), "w") as f:
+            json.dump(
+                {
+                    "stage": stage,
+                    "key": key,
+                    "output_hash": output_hash,
+                    "seconds": elapsed,
+                },
+                f,
+                indent=2,
+            )
+        output_dir = self.output_dir(stage, key)
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.makedirs(os.path.dirname(output_dir), exist_ok=True)
+        os.rename(work_dir, output_dir)
+        return StageResult(key, output_dir, output_hash, False)
+
+
+def stage_key(
+    stage: Stage,
+    params: Dict,
+    input_hashes: Dict[str, str],
+    version: int = PIPELINE_VERSION,
+) -> str:
+    """Cache key of a stage: a hash of its name, its parameters (except
+    RUNTIME_PARAMS) and the hashes of its inputs.
+    """
+    header = {
+        "version": version,
+        "stage": stage.name,
+        "params": {k: v for k, v in params.items() if k not in RUNTIME_PARAMS},
+        "inputs": input_hashes,
+    }
+    return hashlib.sha256(json.dumps(header, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def select_stages(
+    targets: Union[Iterable[str], None] = None, stages: Sequence[Stage] = STAGES
+) -> List[Stage]:
+    """The stages of `stages` needed to produce `targets` (every stage by
+    default), in dependency order.
+    """
+    by_name = {stage.name: stage for stage in stages}
+    if targets is None:
+        return list(stages)
+    needed = set()
+    todo = list(targets)
+    while todo:
+        name = todo.pop()
+        if name not in by_name:
+            raise ValueError(f"Unknown stage: {name}")
+        if name not in needed:
+            needed.add(name)
+            todo.extend(by_name[name].dependencies)
+    return [stage for stage in stages if stage.name in needed]
+
+
+def run_pipeline(
+    config: Dict,
+    targets: Union[Sequence[str], None] = None,
+    n_jobs: int = 2,
+    force: Iterable[str] = (),
+    stages: Sequence[Stage] = STAGES,
+) -> Dict[str, StageResult]:
+    """Run the stages needed to produce `targets`, reusing cached outputs.
+
+    A stage is run as soon as all the stages it depends on are done, in a
+    pool of `n_jobs` processes, so independent stages (e.g. language
+    detection and the scrape/Goodreads branch) run at the same time.
+    Stages whose key is already in the cache are skipped. If a stage fails,
+    no new stage is started, the running ones are finished and cached, and
+    the error is raised.
+
+    Args:
+        config (Dict): pipeline config, as returned by `load_config`
+        targets (Sequence[str]): stages to produce, all by default
+        n_jobs (int): number of stages run at once
+        force (Iterable[str]): stages to run even if they are cached
+        stages (Sequence[Stage]): stages of the pipeline, STAGES by default
+
+    Returns:
+        The result of every selected stage.
+    """
+    stages = select_stages(targets, stages)
+    force = set(force)
+    cache = PipelineCache(config["cache_dir"])
+    results = {}
+    pending = list(stages)
+    running = {}
+    error = None
+
+    with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+        while pending or running:
+            ready = [
+                stage
+                for stage in pending
+                if error is None and all(d in results for d in stage.dependencies)
+            ]
+            for stage in ready:
+                pending.remove(stage)
+                params = stage_params(config, stage.name)
+                input_hashes = {d: results[d].output_hash for d in stage.dependencies}
+                for source in stage.sources:
+                    input_hashes[source] = cache.file_hash(config["inputs"][source])
+                key = stage_key(stage, params, input_hashes)
+
+                result = cache.lookup(stage.name, key)
+                if result is not None and stage.name not in force:
+                    print(f"[{stage.name}] cached")
+                    results[stage.name] = result
+                    continue
+
+                inputs = {d: results[d].output_dir for d in stage.dependencies}
+                inputs.update({s: config["inputs"][s] for s in stage.sources})
+                inputs["cache_dir"] = config["cache_dir"]
+                work_dir = cache.work_dir(stage.name, key)
+                print(f"[{stage.name}] running")
+                future = executor.submit(stage.function, inputs, work_dir, params)
+                running[future] = (stage, key, work_dir, time.perf_counter())
+
+            if not running:
+                if ready:
+                    # cached stages may have unblocked others
+                    continue
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key, work_dir, start = running.pop(future)
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"[{stage.name}] failed: {e!r}")
+                    error = error or (stage.name, e)
+                    continue
+                elapsed = time.perf_counter() - start
+                results[stage.name] = cache.commit(stage.name, key, work_dir, elapsed)
+                print(f"[{stage.name}] done in {elapsed:.1f}s")
+
+    if error is not None:
+        raise RuntimeError(f"Stage {error[0]} failed") from error[1]
+
+    # record where the latest outputs of each stage are, for notebooks
+    latest_path = os.path.join(config["cache_dir"], "latest_outputs.json")
+    try:
+        with open(latest_path) as f:
+            latest = json.load(f)
+    except (OSError, ValueError):
+        latest = {}
+    latest.update({name: result.output_dir for name, result in results.items()})
+    with open(latest_path, "w") as f:
+        json.dump(latest, f, indent=2)
+    return results
+
+
+def main(argv: Union[List[str], None] = None) -> None:
+    parser = argparse.ArgumentParser(
+        description="Run the pipeline from the raw reviews to trained LDA models."
+    )
+    parser.add_argument("config", nargs="?", default=None, help="JSON config file")
+    parser.add_argument(
+        "--targets",
+        nargs="+",
+        default=None,
+        choices=[stage.name for stage in STAGES],
+        help="stages to produce, with the stages they depend on",
+    )
+    parser.add_argument("--n-jobs", type=int, default=2)
+    parser.add_argument(
+        "--force",
+        nargs="+",
+        default=[],
+        choices=[stage.name for stage in STAGES],
+        help="stages to run even if cached",
+    )
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config)
+    results = run_pipeline(
+        config, targets=args.targets, n_jobs=args.n_jobs, force=args.force
+    )
+    for name, result in results.items():
+        status = "cached" if result.cached else "ran"
+        print(f"{name:>15} {status:>6}  {result.output_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Iterable, Iterator, List, Union
+
+import numpy as np
+import pandas as pd
+
+from modules.text_cache import TextCache, text_key
+from modules.utils import detect_languages, get_stop_words, lemmatize_text_stream
+
+# characters that are not letters (or #) are replaced with spaces
+NON_LETTERS = re.compile(r"[^a-zA-Z#]")
+
+# extra stopwords used in the notebooks to better differentiate topics
+MORE_STOPWORDS = [
+    "http",
+    "www",
+    "com",
+    "html",
+    "amp",
+    "book",
+    "bit",
+    "little",
+    "lot",
+    "thing",
+    "something",
+    "way",
+    "many",
+    "much",
+    "page",
+    "reader",
+    "first",
+]
+
+# columns created from VADER's polarity scores, in the order of the
+# notebooks (the sorted feature names of DictVectorizer)
+VADER_COLUMNS = ["vader_compound", "vader_neg", "vader_neu", "vader_pos"]
+
+
+class ReviewCleaner:
+    """Clean and tokenize book reviews in a single pass per review.
+
+    The steps are those applied in the notebooks: "n't" is replaced with
+    " not", characters other than letters and # are removed, words shorter
+    than `min_word_length` and stopwords are dropped, then the remaining
+    words are lowercased. As in the notebooks, stopwords are matched before
+    lowercasing. Stopwords are kept in a frozenset, so each lookup is O(1).
+
+    Args:
+        stop_words (Iterable[str]): words to remove. Defaults to the NLTK
+            English stopwords.
+        extra_stop_words (Iterable[str]): words to remove on top of
+            `stop_words`, e.g. MORE_STOPWORDS.
+        min_word_length (int): shortest word that is kept.
+    """
+
+    def __init__(
+        self,
+        stop_words: Union[Iterable[str], None] = None,
+        extra_stop_words: Iterable[str] = (),
+        min_word_length: int = 3,
+    ) -> None:
+        if stop_words is None:
+            stop_words = get_stop_words()
+        self.stop_words = frozenset(stop_words) | frozenset(extra_stop_words)
+        self.min_word_length = min_word_length
+
+    def _filter(self, words: List[str]) -> List[str]:
+        stop_words = self.stop_words
+        min_word_length = self.min_word_length
+        return [
+            w.lower()
+            for w in words
+            if len(w) >= min_word_length and w not in stop_words
+        ]
+
+    def tokenize(self, review: str) -> List[str]:
+        """Clean a single review and split it into words."""
+        if not isinstance(review, str):
+            return []
+        return self._filter(NON_LETTERS.sub(" ", review.replace("n't", " not")).split())
+
+    def clean(self, review: str) -> str:
+        """Clean a single review, returning the words joined by spaces."""
+        return " ".join(self.tokenize(review))
+
+    def stream(self, reviews: Iterable[str]) -> Iterator[List[str]]:
+        """Lazily clean and tokenize reviews, one at a time."""
+        for review in reviews:
+            yield self.tokenize(review)
+
+    def tokenize_series(self, reviews: pd.Series) -> pd.Series:
+        """Clean and tokenize a series of reviews. The substitutions run as
+        vectorised pandas string operations over the whole series, then
+        every review is filtered in one pass.
+
+        Args:
+            reviews (pd.Series): book reviews
+
+        Returns:
+            A series holding the list of words of each review.
+        """
+        text = reviews.fillna("").str.replace("n't", " not", regex=False)
+        text = text.str.replace(NON_LETTERS, " ", regex=True)
+        return pd.Series(
+            [self._filter(words) for words in text.str.split()], index=reviews.index
+        )
+
+    def clean_series(self, reviews: pd.Series) -> pd.Series:
+        """Same as `tokenize_series`, but words are joined by spaces."""
+        return self.tokenize_series(reviews).str.join(" ")
+
+
+@lru_cache(maxsize=None)
+def get_sentiment_analyzer():
+    """Load the VADER sentiment analyzer the first time it is needed, then
+    reuse it.
+    """
+    from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+    return SentimentIntensityAnalyzer()
+
+
+def _score_sentiment_chunk(texts: List[str]) -> np.ndarray:
+    analyzer = get_sentiment_analyzer()
+    scores = np.empty((len(texts), len(VADER_COLUMNS)), dtype=np.float32)
+    for i, text in enumerate(texts):
+        polarity = analyzer.polarity_scores(text)
+        scores[i] = [polarity[col[len("vader_") :]] for col in VADER_COLUMNS]
+    return scores
+
+
+def score_sentiment(
+    texts: Iterable[str],
+    n_jobs: int = 1,
+    cache_path: Union[str, None] = None,
+    chunksize: int = 2000,
+) -> pd.DataFrame:
+    """Compute the VADER polarity scores of many reviews at once.
+
+    Scores are written straight into a preallocated float32 array rather
+    than going through a dict per review and DictVectorizer. Results are
+    stored in a `TextCache` keyed by the hash of each review, so reviews
+    already scored in a previous run, or repeated within this one, are only
+    scored once. The remaining reviews are split into chunks scored by a
+    pool of `n_jobs` processes.
+
+    Args:
+        texts (Iterable[str]): processed reviews
+        n_jobs (int): number of processes scoring reviews
+        cache_path (str): location of the cache database, if any
+        chunksize (int): number of reviews sent to a process at a time
+
+    Returns:
+        A dataframe with the VADER_COLUMNS of each review, in input order.
+    """
+    texts = [text if isinstance(text, str) else "" for text in texts]
+    keys = [text_key(text) for text in texts]
+    cache = TextCache(cache_path, "sentiment") if cache_path else None
+    cached = cache.get_many(set(keys)) if cache else {}
+
+    to_score = {}
+    for key, text in zip(keys, texts):
+        if key not in cached:
+            to_score.setdefault(key, text)
+    to_score_texts = list(to_score.values())
+    chunks = [
+        to_score_texts[start : start + chunksize]
+        for start in range(0, len(to_score_texts), chunksize)
+    ]
+    if n_jobs == 1:
+        results = list(map(_score_sentiment_chunk, chunks))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            results = list(executor.map(_score_sentiment_chunk, chunks))
+    scored = (
+        np.concatenate(results)
+        if results
+        else np.empty((0, len(VADER_COLUMNS)), dtype=np.float32)
+    )
+    new_scores = dict(zip(to_score, scored))
+    if cache:
+        cache.put_many((key, row.tolist()) for key, row in new_scores.items())
+        cache.close()
+
+    scores = np.empty((len(texts), len(VADER_COLUMNS)), dtype=np.float32)
+    for i, key in enumerate(keys):
+        scores[i] = new_scores[key] if key in new_scores else cached[key]
+    return pd.DataFrame(scores, columns=VADER_COLUMNS)
+
+
+def process_reviews(
+    df: pd.DataFrame,
+    cleaner: Union[ReviewCleaner, None] = None,
+    n_process: int = 1,
+    cache_path: Union[str, None] = None,
+) -> pd.DataFrame:
+    """Run the preprocessing chain of the notebooks over a dataframe of
+    reviews: language detection, cleaning, lemmatization, word counts and
+    VADER sentiment scores.
+
+    Args:
+        df (pd.DataFrame): dataframe with a `reviews` column
+        cleaner (ReviewCleaner): cleaner to use. Defaults to one removing
+            the NLTK stopwords and MORE_STOPWORDS.
+        n_process (int): number of processes used by each stage
+        cache_path (str): location of the database caching detected
+            languages and sentiment scores, if any
+
+    Returns:
+        A copy of `df` with the processed columns added.
+    """
+    cleaner = cleaner or ReviewCleaner(extra_stop_words=MORE_STOPWORDS)
+    df = df.copy()
+    df["language"] = detect_languages(
+        df.reviews, n_jobs=n_process, cache_path=cache_path
+    )
+    df["tokenized_reviews"] = cleaner.tokenize_series(df.reviews)
+    df["lemmatized_reviews"] = list(
+        lemmatize_text_stream(df.tokenized_reviews, n_process=n_process)
+    )
+    df["processed_reviews"] = df.lemmatized_reviews.str.join(" ")
+    df["word_counts"] = df.processed_reviews.str.count(" ") + 1
+
+    sentiment = score_sentiment(
+        df.processed_reviews, n_jobs=n_process, cache_path=cache_path
+    )
+    for col in VADER_COLUMNS:
+        df[col] = sentiment[col].values
+    return df
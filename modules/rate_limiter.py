@@ -0,0 +1,276 @@
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Any, Callable, Iterable, Iterator, Tuple, Union
+
+from requests.exceptions import RequestException
+
+
+class TokenBucket:
+    """Thread-safe token bucket used to cap the rate of outgoing requests.
+
+    Tokens are added continuously at `rate` tokens per second, up to
+    `capacity`. Every request consumes one token and blocks until a
+    token is available, so bursts never exceed `capacity` and the
+    long-run request rate never exceeds `rate`.
+
+    Args:
+        rate (float): number of tokens added per second.
+        capacity (float): maximum number of tokens the bucket can hold.
+            Defaults to 1, i.e. no bursts.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0) -> None:
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = max(capacity, 1.0)
+        self._tokens = self.capacity
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+        self._last_refill = now
+
+    def acquire(self) -> None:
+        """Block until a token is available, then consume it."""
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+# statuses worth retrying: rate limiting and transient server errors
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value: Union[str, None]) -> Union[float, None]:
+    """Number of seconds to wait given by a Retry-After header, which holds
+    either a number of seconds or an HTTP date. Returns None if the header
+    is missing or malformed.
+    """
+    if value is None:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if date is None:
+        return None
+    return max(date.timestamp() - time.time(), 0.0)
+
+
+class AdaptiveScheduler:
+    """Send requests to an API with a concurrency limit that adapts to the
+    errors the server returns, retrying requests that fail.
+
+    The number of requests in flight is controlled like TCP congestion
+    control (additive increase, multiplicative decrease): every successful
+    request raises the limit by 1 / limit, i.e. by about one per round of
+    requests, and a throttled request (429, 5xx or connection error)
+    multiplies it by `decrease_factor`. Only one decrease is applied per
+    round, so a burst of errors caused by the same limit halves it once.
+    Other errors (e.g. 404) say nothing about the load of the server, so
+    they leave the limit unchanged.
+
+    A `lookup` function can be given to find responses that are already
+    available (e.g. in the disk cache of `modules.http_client`): they are
+    returned without waiting for a slot or for the request rate.
+
+    When the server sends a Retry-After header, no request is sent to it
+    until that time has passed. Failed requests are retried up to
+    `max_retries` times, after a random wait of up to
+    `backoff_base * 2 ** attempt` seconds (full jitter), so retries don't
+    all hit the server at the same time. Requests that still fail, or get
+    a status that isn't worth retrying (e.g. 404), are recorded in
+    `failed` with the reason.
+
+    Args:
+        max_concurrency (int): largest number of requests in flight.
+        initial_concurrency (int): number of requests in flight at first.
+        min_concurrency (int): smallest number of requests in flight.
+        max_retries (int): number of times a failed request is retried.
+        backoff_base (float): base of the exponential backoff, in seconds.
+        max_backoff (float): longest backoff, in seconds.
+        decrease_factor (float): factor applied to the limit on errors.
+        requests_per_second (float): maximum request rate, whatever the
+            concurrency. Defaults to no maximum.
+        seed (int): seed of the jitter, for reproducible waits.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        initial_concurrency: int = 1,
+        min_concurrency: int = 1,
+        max_retries: int = 5,
+        backoff_base: float = 0.5,
+        max_backoff: float = 60.0,
+        decrease_factor: float = 0.5,
+        requests_per_second: Union[float, None] = None,
+        seed: Union[int, None] = None,
+    ) -> None:
+        if not 1 <= min_concurrency <= max_concurrency:
+            raise ValueError("concurrency limits must satisfy 1 <= min <= max")
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.max_backoff = max_backoff
+        self.decrease_factor = decrease_factor
+        self.failed = {}
+        self.stats = Counter()
+        self._concurrency = float(
+            min(max(initial_concurrency, min_concurrency), max_concurrency)
+        )
+        self._in_flight = 0
+        self._round = 0
+        self._paused_until = 0.0
+        self._cond = threading.Condition()
+        self._random = random.Random(seed)
+        self._bucket = TokenBucket(requests_per_second) if requests_per_second else None
+
+    @property
+    def concurrency(self) -> int:
+        """Current number of requests allowed in flight."""
+        return int(self._concurrency)
+
+    def _acquire(self) -> int:
+        with self._cond:
+            while True:
+                wait = self._paused_until - time.monotonic()
+                if wait <= 0 and self._in_flight < int(self._concurrency):
+                    self._in_flight += 1
+                    request_round = self._round
+                    break
+                self._cond.wait(wait if wait > 0 else None)
+        if self._bucket is not None:
+            self._bucket.acquire()
+        return request_round
+
+    def _release(
+        self,
+        request_round: int,
+        throttled: bool,
+        retry_after: Union[float, None] = None,
+        succeeded: bool = False,
+    ) -> None:
+        with self._cond:
+            self._in_flight -= 1
+            if succeeded:
+                self._concurrency = min(
+                    self.max_concurrency, self._concurrency + 1 / self._concurrency
+                )
+            elif throttled and request_round == self._round:
+                # requests sent before the last decrease don't decrease again
+                self._concurrency = max(
+                    self.min_concurrency, self._concurrency * self.decrease_factor
+                )
+                self._round += 1
+            if retry_after:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + retry_after
+                )
+            self._cond.notify_all()
+
+    def _count(self, name: str) -> None:
+        with self._cond:
+            self.stats[name] += 1
+
+    def _backoff(self, attempt: int) -> float:
+        return self._random.uniform(
+            0, min(self.max_backoff, self.backoff_base * 2 ** attempt)
+        )
+
+    def fetch(
+        self,
+        request: Callable[[Any], Any],
+        key: Any,
+        lookup: Union[Callable[[Any], Any], None] = None,
+    ) -> Union[Any, None]:
+        """Send a request, retrying it if it fails.
+
+        Args:
+            request (Callable): function sending the request for a key and
+                returning a response with `status_code` and `headers`,
+                e.g. a call to `cached_get`.
+            key (Any): ID the request is about, recorded if it fails.
+            lookup (Callable): function returning the response of a key
+                if it is already available, e.g. a call to
+                `cached_response`, or None.
+
+        Returns:
+            The response, or None if the request failed.
+        """
+        if lookup is not None:
+            resp = lookup(key)
+            if resp is not None:
+                self._count("cached")
+                return resp
+
+        for attempt in range(self.max_retries + 1):
+            request_round = self._acquire()
+            retry_after = None
+            try:
+                resp = request(key)
+            except RequestException as e:
+                self._release(request_round, throttled=True)
+                reason = f"{type(e).__name__}: {e}"
+                self._count("errors")
+            else:
+                throttled = resp.status_code in RETRY_STATUSES
+                if throttled:
+                    retry_after = parse_retry_after(resp.headers.get("Retry-After"))
+                self._release(
+                    request_round,
+                    throttled,
+                    retry_after,
+                    succeeded=resp.status_code < 400,
+                )
+                if resp.status_code < 400:
+                    self._count("succeeded")
+                    return resp
+                reason = f"HTTP {resp.status_code}"
+                if not throttled:
+                    break
+                self._count("throttled")
+            if attempt < self.max_retries:
+                self._count("retries")
+                time.sleep((retry_after or 0) + self._backoff(attempt))
+
+        with self._cond:
+            self.failed[key] = reason
+        return None
+
+    def map(
+        self,
+        request: Callable[[Any], Any],
+        keys: Iterable[Any],
+        lookup: Union[Callable[[Any], Any], None] = None,
+    ) -> Iterator[Tuple[Any, Union[Any, None]]]:
+        """Send the requests of several keys from a pool of
+        `max_concurrency` threads, the scheduler deciding how many run at
+        once. Keys whose response is found by `lookup` are not sent.
+
+        Yields:
+            Each key with its response (None if it failed), in order.
+        """
+        keys = list(keys)
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as executor:
+            yield from zip(
+                keys, executor.map(lambda k: self.fetch(request, k, lookup), keys)
+            )
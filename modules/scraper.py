@@ -1,16 +1,23 @@
 import csv
 import datetime
+import os
 import time
-from contextlib import closing
-from typing import List, Union
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Set, Tuple, Union
 
 import requests
-from requests import get
 from requests.exceptions import RequestException
 from tqdm import tqdm_notebook
 
+from modules.checkpoint import ScrapeCheckpoint
+from modules.html_store import HtmlStore
+from modules.http_client import FetchedPage, cached_get
+from modules.rate_limiter import TokenBucket
 
-def check_response_is_valid(resp: requests.models.Response) -> bool:
+LIBRARYTHING_WORK_URL = "https://www.librarything.com/work/{}"
+
+
+def check_response_is_valid(resp: Union[requests.models.Response, FetchedPage]) -> bool:
     """Assesses whether the response is valid or not.
     Returns True if the response seems to be HTML,
     False otherwise.
@@ -36,7 +43,8 @@ def simple_get(url: str) -> Union[str, None]:
     """Attempts to get the content at `url` by making
     an HTTP GET request. If the content type of response
     is some kind of HTML/XML, return the text; otherwise
-    return None.
+    return None. Requests go through the shared session and,
+    when it is enabled, the disk cache in `modules.http_client`.
 
     Args:
         url (str): website URL to be scraped
@@ -44,48 +52,267 @@ def simple_get(url: str) -> Union[str, None]:
     Returns:
         Text from HTML/XML, None otherwise.
     """
-    try:
-        with closing(get(url)) as resp:
-            if check_response_is_valid(resp):
-                return resp.text
-            else:
-                return None
+    return get_page(url)[0]
+
+
+def get_page(url: str) -> Tuple[Union[str, None], Union[int, None]]:
+    """Same as `simple_get`, but also return the status code of the
+    response, so that callers can tell which failures are worth retrying.
 
+    Args:
+        url (str): website URL to be scraped
+
+    Returns:
+        Text from HTML/XML (None otherwise) and the status code (None if
+        no response was received).
+    """
+    try:
+        resp = cached_get(url)
     except RequestException as e:
         print("Error during requests to {0} : {1}".format(url, str(e)))
-        return None
+        return None, None
+    return (resp.text if check_response_is_valid(resp) else None), resp.status_code
+
+
+def is_retryable(status_code: Union[int, None]) -> bool:
+    """Whether a failed request may succeed if it is sent again: when no
+    response was received, the server was overloaded (429) or it failed
+    (5xx). Other failures, e.g. a 404 for a book removed from
+    LibraryThing, would fail again.
+    """
+    return status_code is None or status_code == 429 or status_code >= 500
+
+
+def fetch_book_page(
+    book_id: int, rate_limiter: TokenBucket, url_template: str = LIBRARYTHING_WORK_URL
+) -> Tuple[int, Union[str, None], Union[int, None]]:
+    """Wait for the rate limiter, then scrape the page of a single book.
+
+    Args:
+        book_id (int): LibraryThing book ID
+        rate_limiter (TokenBucket): rate limiter shared by all workers
+        url_template (str): URL of a book page, with a placeholder for the ID
+
+    Returns:
+        The book ID, the text of its page (None if scraping failed) and the
+        status code of the response (None if there was none).
+    """
+    rate_limiter.acquire()
+    return (book_id, *get_page(url_template.format(book_id)))
+
 
+def scrape_pages(
+    books_list: List[int],
+    max_workers: int = 1,
+    requests_per_second: float = 1.0,
+    url_template: str = LIBRARYTHING_WORK_URL,
+    max_retries: int = 0,
+    backoff_base: float = 2.0,
+    not_retried: Union[Set[int], None] = None,
+) -> Iterator[Tuple[int, Union[str, None]]]:
+    """Scrape the pages of a list of books with a pool of threads.
 
-def write_htmls_to_csv(books_list: List[int], path: str) -> str:
+    Pages are fetched by `max_workers` threads. A token bucket shared by
+    the threads keeps the overall request rate at or below
+    `requests_per_second`, which avoids getting my IP address blocked.
+    Pages that fail are retried up to `max_retries` times; before retry
+    number n the function waits `backoff_base ** n` seconds. Only failures
+    that may go away are retried (see `is_retryable`): the IDs of the
+    other failed pages are added to `not_retried`.
+
+    Args:
+        books_list (List[int]): list of LibraryThing book IDs.
+        max_workers (int): number of concurrent requests.
+        requests_per_second (float): maximum number of requests per second.
+        url_template (str): URL of a book page, with a placeholder for the ID.
+        max_retries (int): number of times failed pages are retried.
+        backoff_base (float): base of the exponential backoff, in seconds.
+        not_retried (Set[int]): set receiving the IDs of pages that failed
+            for good, e.g. with a 404.
+
+    Yields:
+        The book ID and the text of its page (None if scraping failed) for
+        every attempt, in the order of `books_list` within each attempt.
+    """
+    not_retried = set() if not_retried is None else not_retried
+    rate_limiter = TokenBucket(rate=requests_per_second, capacity=max_workers)
+    pending = list(books_list)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for attempt in range(max_retries + 1):
+            if not pending:
+                break
+            if attempt > 0:
+                time.sleep(backoff_base ** attempt)
+            pages = executor.map(
+                lambda book_id: fetch_book_page(book_id, rate_limiter, url_template),
+                pending,
+            )
+            failed = []
+            for book_id, scraped_raw_html, status_code in tqdm_notebook(
+                pages, total=len(pending)
+            ):
+                if scraped_raw_html is None:
+                    if is_retryable(status_code):
+                        failed.append(book_id)
+                    else:
+                        not_retried.add(book_id)
+                yield book_id, scraped_raw_html
+            pending = failed
+
+
+def write_htmls_to_csv(
+    books_list: List[int],
+    path: str,
+    max_workers: int = 1,
+    requests_per_second: float = 1.0,
+    url_template: str = LIBRARYTHING_WORK_URL,
+    checkpoint_path: Union[str, None] = None,
+    max_retries: int = 3,
+    backoff_base: float = 2.0,
+    max_attempts: Union[int, None] = None,
+) -> str:
     """Attempt to get the content at the specified URL and write
     it to a csv file. Record pages that are scraped incorrectly.
 
+    If `checkpoint_path` is given, the progress of the scrape is saved
+    to a SQLite checkpoint after every page. Running the function again
+    with the same checkpoint appends to the same csv file, skips pages
+    that were already saved and only retries pages that failed. Any
+    partially written row left by a crash is removed before resuming.
+    The checkpoint counts the attempts made for every page across runs;
+    with `max_attempts`, pages that already failed that many times are
+    given up on rather than retried again. Pages that failed for good
+    (see `is_retryable`), e.g. books removed from LibraryThing, are marked
+    as done in the checkpoint, so they aren't requested again.
+
     Args:
         book_list (List[int]): list of book IDs from the LibraryThing.
             These are used to find the right pages to scrape.
         path (str): location where the csv file is saved.
+        max_workers (int): number of concurrent requests.
+        requests_per_second (float): maximum number of requests per second.
+        url_template (str): URL of a book page, with a placeholder for the ID.
+        checkpoint_path (str): location of the checkpoint database, if any.
+        max_retries (int): number of times failed pages are retried.
+        backoff_base (float): base of the exponential backoff, in seconds.
+        max_attempts (int): number of attempts, over all runs sharing the
+            checkpoint, after which a page is given up on. Defaults to no
+            limit.
 
     Returns:
         The path where the raw scraped data is saved.
     """
-    failed_book_ids = []
-    timestamp = datetime.datetime.now().strftime("%y-%m-%dT%H:%M:%S")
-    raw_htmls_path = f"{path}/scraped_raw_html_librarything_{timestamp}.csv"
-
-    with open(raw_htmls_path, "w") as csv_file:
-        fieldnames = ["book_id", "raw_html"]
-        writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
-        writer.writeheader()
-
-        # scrape book info!
-        for book_id in tqdm_notebook(books_list):
-            url = "https://www.librarything.com/work/{}".format(book_id)
-            scraped_raw_html = simple_get(url)
+    checkpoint = ScrapeCheckpoint(checkpoint_path) if checkpoint_path else None
+    try:
+        raw_htmls_path = checkpoint.get_meta("output_path") if checkpoint else None
+        if raw_htmls_path is None:
+            timestamp = datetime.datetime.now().strftime("%y-%m-%dT%H:%M:%S")
+            raw_htmls_path = f"{path}/scraped_raw_html_librarything_{timestamp}.csv"
+            if checkpoint:
+                checkpoint.set_meta("output_path", raw_htmls_path)
+
+        given_up = []
+        if checkpoint and os.path.exists(raw_htmls_path):
+            # drop rows written after the last committed page
+            os.truncate(raw_htmls_path, int(checkpoint.get_meta("output_offset") or 0))
+            completed_ids = checkpoint.completed_ids()
+            books_list = [i for i in books_list if i not in completed_ids]
+        if checkpoint and max_attempts is not None:
+            given_up = [i for i in books_list if checkpoint.attempts(i) >= max_attempts]
+            given_up_ids = set(given_up)
+            books_list = [i for i in books_list if i not in given_up_ids]
+
+        failed_book_ids = set()
+        not_retried = set()
+        with open(raw_htmls_path, "a") as csv_file:
+            fieldnames = ["book_id", "raw_html"]
+            writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            if csv_file.tell() == 0:
+                writer.writeheader()
+
+            # scrape book info!
+            pages = scrape_pages(
+                books_list,
+                max_workers=max_workers,
+                requests_per_second=requests_per_second,
+                url_template=url_template,
+                max_retries=max_retries,
+                backoff_base=backoff_base,
+                not_retried=not_retried,
+            )
+            for book_id, scraped_raw_html in pages:
+                if scraped_raw_html is not None:
+                    writer.writerow({"book_id": book_id, "raw_html": scraped_raw_html})
+                    failed_book_ids.discard(book_id)
+                    if checkpoint:
+                        csv_file.flush()
+                        checkpoint.mark_done(book_id, output_offset=csv_file.tell())
+                else:
+                    failed_book_ids.add(book_id)
+                    if checkpoint and book_id in not_retried:
+                        checkpoint.mark_done(book_id)
+                    elif checkpoint:
+                        checkpoint.mark_failed(book_id)
+
+            failed_book_ids = [i for i in books_list if i in failed_book_ids]
+            print(f"Pages scraped incorrectly: {failed_book_ids}")
+            if given_up:
+                print(f"Pages given up on after {max_attempts} attempts: {given_up}")
+    finally:
+        if checkpoint:
+            checkpoint.close()
+    return raw_htmls_path
+
+
+def write_htmls_to_store(
+    books_list: List[int],
+    store_path: str,
+    max_workers: int = 1,
+    requests_per_second: float = 1.0,
+    url_template: str = LIBRARYTHING_WORK_URL,
+    max_retries: int = 3,
+    backoff_base: float = 2.0,
+    not_retried: Union[Set[int], None] = None,
+) -> str:
+    """Scrape book pages into a compressed `HtmlStore` instead of a csv.
+    Each page is saved as soon as it is scraped, so an interrupted scrape
+    can be resumed by calling the function again: pages already in the
+    store are skipped. Record pages that are scraped incorrectly.
+
+    Args:
+        book_list (List[int]): list of book IDs from the LibraryThing.
+        store_path (str): location of the store.
+        max_workers (int): number of concurrent requests.
+        requests_per_second (float): maximum number of requests per second.
+        url_template (str): URL of a book page, with a placeholder for the ID.
+        max_retries (int): number of times failed pages are retried.
+        backoff_base (float): base of the exponential backoff, in seconds.
+        not_retried (Set[int]): set receiving the IDs of pages that failed
+            for good (see `scrape_pages`).
+
+    Returns:
+        The path of the store.
+    """
+    failed_book_ids = set()
+    with HtmlStore(store_path) as store:
+        stored_ids = set(store.book_ids())
+        books_list = [book_id for book_id in books_list if book_id not in stored_ids]
+        pages = scrape_pages(
+            books_list,
+            max_workers=max_workers,
+            requests_per_second=requests_per_second,
+            url_template=url_template,
+            max_retries=max_retries,
+            backoff_base=backoff_base,
+            not_retried=not_retried,
+        )
+        for book_id, scraped_raw_html in pages:
             if scraped_raw_html is not None:
-                writer.writerow({"book_id": book_id, "raw_html": scraped_raw_html})
+                store.put(book_id, scraped_raw_html)
+                failed_book_ids.discard(book_id)
             else:
-                failed_book_ids.append(book_id)
-            time.sleep(1)
+                failed_book_ids.add(book_id)
 
-        print(f"Pages scraped incorrectly: {failed_book_ids}")
-    return raw_htmls_path
+    failed_book_ids = [i for i in books_list if i in failed_book_ids]
+    print(f"Pages scraped incorrectly: {failed_book_ids}")
+    return store_path
@@ -0,0 +1,192 @@
+import os
+import tempfile
+from typing import Iterator, List, Sequence, Union
+
+import pandas as pd
+from gensim import corpora
+from gensim.models import LdaModel
+
+from extra_info.helper_functions.dataset_loader import iter_dataset_chunks
+from modules.preprocessing import MORE_STOPWORDS, ReviewCleaner
+from modules.utils import lemmatize_text_stream
+
+
+def iter_review_chunks(
+    path: str, column: str = "reviews", chunksize: int = 10000
+) -> Iterator[pd.Series]:
+    """Read reviews from disk one chunk at a time.
+
+    Args:
+        path (str): a csv, or a dataset in the pseudo-JSON format read by
+            `dataset_loader.load_dataset` (any file not ending in .csv)
+        column (str): column holding the reviews, e.g. "comment" for the
+            raw pseudo-JSON dataset
+        chunksize (int): number of reviews per chunk
+
+    Yields:
+        Series of up to `chunksize` reviews.
+    """
+    if path.endswith(".csv"):
+        chunks = pd.read_csv(path, usecols=[column], dtype=object, chunksize=chunksize)
+    else:
+        chunks = iter_dataset_chunks(path, chunksize=chunksize)
+    for chunk in chunks:
+        if column in chunk:
+            yield chunk[column].fillna("")
+
+
+class StreamingCorpus:
+    """Bag-of-words corpus read from disk, cleaned and lemmatized on the fly.
+
+    Only one chunk of reviews is held in memory at a time, so it can be
+    passed to gensim (to build a Dictionary, or to train or update an LDA
+    model) however large the dataset is. Every iteration reads and
+    processes the reviews again: to train with several passes, write the
+    corpus to disk once with `serialize` and train on the MmCorpus. The
+    number of documents is counted during the first complete pass and
+    reused by `len`, which raises TypeError until then rather than
+    processing every review just to count them.
+
+    Args:
+        path (str): location of the reviews (see `iter_review_chunks`)
+        dictionary (corpora.Dictionary): dictionary mapping lemmas to IDs.
+            Without one, only `iter_texts` can be used.
+        column (str): column holding the reviews
+        chunksize (int): number of reviews processed at a time
+        min_review_length (int): reviews with fewer lemmas are skipped
+        tags (Sequence[str]): parts of speech kept by the lemmatizer
+        cleaner (ReviewCleaner): cleaner to use. Defaults to one removing
+            the NLTK stopwords and MORE_STOPWORDS.
+        n_process (int): number of processes used by spaCy
+    """
+
+    def __init__(
+        self,
+        path: str,
+        dictionary: Union[corpora.Dictionary, None] = None,
+        column: str = "reviews",
+        chunksize: int = 10000,
+        min_review_length: int = 0,
+        tags: Sequence[str] = ("NOUN", "ADJ"),
+        cleaner: Union[ReviewCleaner, None] = None,
+        n_process: int = 1,
+    ) -> None:
+        self.path = path
+        self.dictionary = dictionary
+        self.column = column
+        self.chunksize = chunksize
+        self.min_review_length = min_review_length
+        self.tags = tags
+        self.cleaner = cleaner or ReviewCleaner(extra_stop_words=MORE_STOPWORDS)
+        self.n_process = n_process
+        self._n_documents = None
+
+    def iter_texts(self) -> Iterator[List[str]]:
+        """Yield the lemmas of each review."""
+        n_documents = 0
+        for reviews in iter_review_chunks(self.path, self.column, self.chunksize):
+            tokenized_reviews = self.cleaner.tokenize_series(reviews)
+            for lemmas in lemmatize_text_stream(
+                tokenized_reviews, tags=self.tags, n_process=self.n_process
+            ):
+                if len(lemmas) >= self.min_review_length:
+                    n_documents += 1
+                    yield lemmas
+        self._n_documents = n_documents
+
+    def __len__(self) -> int:
+        if self._n_documents is None:
+            raise TypeError("The documents are counted during the first pass")
+        return self._n_documents
+
+    def __iter__(self) -> Iterator[List[tuple]]:
+        if self.dictionary is None:
+            raise ValueError("A dictionary is needed to build bags of words")
+        for lemmas in self.iter_texts():
+            yield self.dictionary.doc2bow(lemmas)
+
+    def build_dictionary(self) -> corpora.Dictionary:
+        """Build the dictionary of the corpus in one streaming pass, and
+        use it for the bags of words.
+        """
+        self.dictionary = corpora.Dictionary(self.iter_texts())
+        return self.dictionary
+
+    def serialize(self, path: str) -> corpora.MmCorpus:
+        """Write the bags of words to disk in Matrix Market format, so that
+        later passes stream them without reprocessing the reviews.
+        """
+        corpora.MmCorpus.serialize(path, self, id2word=self.dictionary)
+        return corpora.MmCorpus(path)
+
+
+def train_lda_streaming(
+    corpus: StreamingCorpus,
+    num_topics: int = 20,
+    passes: int = 1,
+    chunksize: int = 2000,
+    serialize_path: Union[str, None] = None,
+    random_state: int = 1,
+) -> LdaModel:
+    """Train an LDA model with online (mini-batch) updates on a corpus
+    streamed from disk, so memory use depends on `chunksize` rather than
+    on the size of the corpus.
+
+    Args:
+        corpus (StreamingCorpus): reviews to train on
+        num_topics (int): number of topics
+        passes (int): number of passes through the corpus
+        chunksize (int): number of documents per mini-batch
+        serialize_path (str): where to write the bags of words before
+            training, to avoid reprocessing the reviews on every pass
+        random_state (int): seed, 1 as in the notebooks
+
+    Returns:
+        The trained model.
+    """
+    if corpus.dictionary is None:
+        corpus.build_dictionary()
+    bows = corpus.serialize(serialize_path) if serialize_path else corpus
+    return LdaModel(
+        corpus=bows,
+        id2word=corpus.dictionary,
+        num_topics=num_topics,
+        passes=passes,
+        chunksize=chunksize,
+        random_state=random_state,
+    )
+
+
+def update_lda_model(
+    model: LdaModel,
+    path: str,
+    chunksize: int = 2000,
+    serialize_path: Union[str, None] = None,
+    **corpus_kwargs
+) -> LdaModel:
+    """Update a trained LDA model with newly arrived reviews, streamed from
+    `path` in mini-batches. Words missing from the model's dictionary are
+    ignored, as the vocabulary of an LDA model is fixed.
+
+    gensim counts the documents before updating, so the bags of words are
+    written to disk first: the reviews are cleaned and lemmatized once.
+
+    Args:
+        model (LdaModel): model to update in place
+        path (str): location of the new reviews
+        chunksize (int): number of documents per mini-batch
+        serialize_path (str): where to write the bags of words, a
+            temporary file by default
+        corpus_kwargs: passed to StreamingCorpus
+
+    Returns:
+        The updated model.
+    """
+    corpus = StreamingCorpus(path, dictionary=model.id2word, **corpus_kwargs)
+    if serialize_path:
+        model.update(corpus.serialize(serialize_path), chunksize=chunksize)
+        return model
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        bows = corpus.serialize(os.path.join(tmp_dir, "corpus.mm"))
+        model.update(bows, chunksize=chunksize)
+    return model
@@ -0,0 +1,223 @@
+import os
+from typing import Iterable, List, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from modules.utils import WORDCLOUD_STOPWORDS
+
+
+def _indicator_matrix(labels: pd.Series) -> sparse.csr_matrix:
+    """Sparse matrix with one row per distinct label and one column per
+    entry of `labels`, holding a 1 where the entry has the label.
+    """
+    codes = labels.cat.codes.values
+    columns = np.flatnonzero(codes >= 0)
+    ones = np.ones(len(columns), dtype=np.int32)
+    return sparse.csr_matrix(
+        (ones, (codes[columns], columns)),
+        shape=(len(labels.cat.categories), len(labels)),
+    )
+
+
+class TermIndex:
+    """Word counts of book reviews, aggregated by genre and by book.
+
+    The reviews are tokenized once into a sparse review x term count matrix,
+    which is then summed into genre x term and book x term matrices by
+    multiplying it with sparse indicator matrices. Word clouds, top-N bar
+    charts and frequency tables are then read from rows of these matrices
+    instead of joining and re-tokenizing all the reviews of a genre.
+
+    Terms are split on whitespace and keep their case, as in the FreqDist
+    of `utils.generate_word_counts_fig`, so phrases joined with
+    underscores (e.g. "harry_potter") are counted as single terms.
+    Stopwords are not removed when the index is built, but when it is
+    queried, so that one index serves every list of stopwords.
+
+    Args:
+        vocabulary (np.ndarray): terms, one per column
+        genres (np.ndarray): genres, one per row of `genre_counts`
+        genre_counts (sparse.csr_matrix): count of each term per genre
+        book_ids (np.ndarray): book IDs, one per row of `book_counts`
+        book_counts (sparse.csr_matrix): count of each term per book
+    """
+
+    def __init__(
+        self,
+        vocabulary: np.ndarray,
+        genres: np.ndarray,
+        genre_counts: sparse.csr_matrix,
+        book_ids: np.ndarray,
+        book_counts: sparse.csr_matrix,
+    ) -> None:
+        self.vocabulary = vocabulary
+        self.genres = genres
+        self.genre_counts = genre_counts
+        self.book_ids = book_ids
+        self.book_counts = book_counts
+        self._genre_rows = {genre: i for i, genre in enumerate(genres)}
+        self._book_rows = {book_id: i for i, book_id in enumerate(book_ids)}
+
+    @classmethod
+    def build(
+        cls,
+        df: pd.DataFrame,
+        text_column: str = "reviews",
+        genre_column: str = "book_genres",
+        book_column: str = "id",
+    ) -> "TermIndex":
+        """Count the words of every review and aggregate them.
+
+        Args:
+            df (pd.DataFrame): reviews with their genre and book ID
+            text_column (str): column holding the text, e.g. "reviews" for
+                word clouds or "processed_reviews" for lemma counts
+            genre_column (str): column holding the genre of each review
+            book_column (str): column holding the book ID of each review
+
+        Returns:
+            The index.
+        """
+        vectorizer = CountVectorizer(
+            tokenizer=str.split, token_pattern=None, lowercase=False, dtype=np.int32
+        )
+        review_counts = vectorizer.fit_transform(df[text_column].fillna(""))
+        vocabulary = np.array(
+            sorted(vectorizer.vocabulary_, key=vectorizer.vocabulary_.get)
+        )
+
+        genres = df[genre_column].astype("category")
+        books = df[book_column].astype("category")
+        book_ids = np.asarray(books.cat.categories)
+        if book_ids.dtype == object:
+            # saved without pickling, so IDs read from csv stay strings
+            book_ids = book_ids.astype(str)
+        return cls(
+            vocabulary,
+            np.asarray(genres.cat.categories).astype(str),
+            (_indicator_matrix(genres) @ review_counts).tocsr(),
+            book_ids,
+            (_indicator_matrix(books) @ review_counts).tocsr(),
+        )
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        sparse.save_npz(os.path.join(directory, "genre_counts.npz"), self.genre_counts)
+        sparse.save_npz(os.path.join(directory, "book_counts.npz"), self.book_counts)
+        np.savez_compressed(
+            os.path.join(directory, "labels.npz"),
+            vocabulary=self.vocabulary,
+            genres=self.genres,
+            book_ids=self.book_ids,
+        )
+
+    @classmethod
+    def load(cls, directory: str) -> "TermIndex":
+        with np.load(os.path.join(directory, "labels.npz")) as labels:
+            vocabulary = labels["vocabulary"]
+            genres = labels["genres"]
+            book_ids = labels["book_ids"]
+        return cls(
+            vocabulary,
+            genres,
+            sparse.load_npz(os.path.join(directory, "genre_counts.npz")),
+            book_ids,
+            sparse.load_npz(os.path.join(directory, "book_counts.npz")),
+        )
+
+    def term_frequencies(
+        self,
+        genre: Union[str, None] = None,
+        book_id: Union[int, None] = None,
+        stop_words: Iterable[str] = (),
+    ) -> pd.Series:
+        """Count of each term, sorted from most to least frequent, with
+        ties in alphabetical order.
+
+        Args:
+            genre (str): genre whose reviews are counted
+            book_id (int): book whose reviews are counted, if no genre is
+                given. Defaults to every review.
+            stop_words (Iterable[str]): words left out, in any case
+
+        Returns:
+            A series of counts indexed by term.
+        """
+        if genre is not None:
+            row = self.genre_counts[self._genre_rows[genre]]
+        elif book_id is not None:
+            row = self.book_counts[self._book_rows[book_id]]
+        else:
+            row = sparse.csr_matrix(self.genre_counts.sum(axis=0))
+        row = row.tocoo()
+        counts = pd.Series(row.data, index=self.vocabulary[row.col])
+        stop_words = {word.lower() for word in stop_words}
+        if stop_words:
+            counts = counts[~counts.index.str.lower().isin(stop_words)]
+        return counts.sort_index().sort_values(ascending=False, kind="mergesort")
+
+    def top_terms(
+        self,
+        genre: Union[str, None] = None,
+        n: int = 30,
+        stop_words: Iterable[str] = (),
+    ) -> pd.Series:
+        """The `n` most frequent terms of a genre (or of every review)."""
+        return self.term_frequencies(genre, stop_words=stop_words).head(n)
+
+    def frequency_table(
+        self,
+        genres: Union[List[str], None] = None,
+        n: int = 20,
+        stop_words: Iterable[str] = (),
+    ) -> pd.DataFrame:
+        """Side-by-side comparison of the most frequent terms of several
+        genres: one column of terms and one of counts per genre, ranked
+        from most to least frequent.
+        """
+        genres = genres if genres is not None else list(self.genres)
+        table = {}
+        for genre in genres:
+            top = self.top_terms(genre, n=n, stop_words=stop_words)
+            table[(genre, "term")] = pd.Series(top.index)
+            table[(genre, "count")] = pd.Series(top.values)
+        return pd.DataFrame(table)
+
+    def plot_wordcloud(self, genre: str, max_words: int = 100) -> None:
+        """Word cloud of a genre, with the same stopwords and layout as
+        `utils.generate_wordcloud`.
+        """
+        import matplotlib.pyplot as plt
+        from wordcloud import STOPWORDS, WordCloud
+
+        frequencies = self.term_frequencies(
+            genre, stop_words=set(STOPWORDS) | set(WORDCLOUD_STOPWORDS)
+        ).head(max_words)
+        wordcloud = WordCloud(
+            background_color="white", width=800, height=400, max_words=max_words
+        ).generate_from_frequencies(frequencies.to_dict())
+        plt.imshow(wordcloud, interpolation="bilinear")
+        plt.title(genre)
+        plt.axis("off")
+
+    def plot_top_terms(
+        self,
+        genre: Union[str, None] = None,
+        n: int = 30,
+        stop_words: Iterable[str] = (),
+    ) -> None:
+        """Bar chart of the most frequent terms, as drawn by
+        `utils.generate_word_counts_fig`.
+        """
+        import matplotlib.pyplot as plt
+        import seaborn as sns
+
+        top = self.top_terms(genre, n=n, stop_words=stop_words)
+        plt.figure(figsize=(20, 5))
+        ax = sns.barplot(x=top.index, y=top.values)
+        ax.set(ylabel="Count")
+        if genre is not None:
+            ax.set(title=genre)
@@ -0,0 +1,67 @@
+import hashlib
+import json
+import re
+import sqlite3
+from typing import Any, Dict, Iterable, Tuple
+
+
+def text_key(text: str) -> str:
+    """Hash of a review text, used as its cache key."""
+    return hashlib.sha1(str(text).encode("utf-8", "surrogatepass")).hexdigest()
+
+
+class TextCache:
+    """Persistent cache of values computed from review texts (detected
+    languages, sentiment scores, ...), stored in a SQLite database and
+    keyed by the hash of the text.
+
+    Each kind of value lives in its own table, so one database can be
+    shared by several pipeline stages.
+
+    Args:
+        path (str): location of the SQLite database.
+        namespace (str): name of the table holding the values.
+    """
+
+    def __init__(self, path: str, namespace: str) -> None:
+        if not re.match(r"^[A-Za-z_][A-Za-z0-9_]*$", namespace):
+            raise ValueError(f"Invalid namespace: {namespace!r}")
+        self.path = path
+        self.namespace = namespace
+        self._conn = sqlite3.connect(path)
+        with self._conn:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {namespace} "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+            )
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        """Return the cached values of the keys that are in the cache."""
+        keys = list(keys)
+        found = {}
+        for start in range(0, len(keys), 500):
+            batch = keys[start : start + 500]
+            placeholders = ", ".join("?" * len(batch))
+            rows = self._conn.execute(
+                f"SELECT key, value FROM {self.namespace} "
+                f"WHERE key IN ({placeholders})",
+                batch,
+            )
+            found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def put_many(self, items: Iterable[Tuple[str, Any]]) -> None:
+        with self._conn:
+            self._conn.executemany(
+                f"INSERT OR REPLACE INTO {self.namespace} (key, value) VALUES (?, ?)",
+                ((key, json.dumps(value)) for key, value in items),
+            )
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def __enter__(self) -> "TextCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
@@ -0,0 +1,238 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Sequence, Union
+
+import numpy as np
+from gensim import corpora
+from gensim.models import LdaModel
+
+from modules.preprocessing import MORE_STOPWORDS, ReviewCleaner
+from modules.phrases import load_phrasers, phrase_and_lemmatize
+from modules.utils import get_nlp
+
+
+def topic_names(num_topics: int) -> List[str]:
+    """Topic names numbered from 1, matching pyLDAvis and the notebooks."""
+    return [f"topic_{i + 1}" for i in range(num_topics)]
+
+
+class TopicInferenceService:
+    """Long-lived service predicting the topics of new book reviews.
+
+    The LDA model, its dictionary, the phrase model and spaCy are loaded
+    once. Reviews submitted concurrently (e.g. by the threads of an HTTP
+    server) are put in a queue; a worker thread takes them in batches of
+    up to `max_batch_size`, waiting at most `max_wait` seconds for a batch
+    to fill, so spaCy and the LDA inference step run once per batch rather
+    than once per review.
+
+    Args:
+        model_path (str): location of the saved LDA model
+        dictionary_path (str): location of the saved Dictionary. Defaults
+            to the dictionary saved with the model.
+        phrasers_dir (str): folder holding the phrase models saved with
+            `save_phrasers`, when the model was trained on bigrams or
+            trigrams
+        tags (Sequence[str]): parts of speech kept by the lemmatizer
+        cleaner (ReviewCleaner): cleaner to use. Defaults to one removing
+            the NLTK stopwords and MORE_STOPWORDS.
+        max_batch_size (int): largest number of reviews processed at once
+        max_wait (float): longest time, in seconds, a review waits for
+            others to join its batch
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        dictionary_path: Union[str, None] = None,
+        phrasers_dir: Union[str, None] = None,
+        tags: Sequence[str] = ("NOUN", "ADJ"),
+        cleaner: Union[ReviewCleaner, None] = None,
+        max_batch_size: int = 64,
+        max_wait: float = 0.005,
+    ) -> None:
+        self.model = LdaModel.load(model_path)
+        self.dictionary = (
+            corpora.Dictionary.load(dictionary_path)
+            if dictionary_path
+            else self.model.id2word
+        )
+        self.phrasers = load_phrasers(phrasers_dir) if phrasers_dir else []
+        self.tags = tags
+        self.cleaner = cleaner or ReviewCleaner(extra_stop_words=MORE_STOPWORDS)
+        self.topic_names = topic_names(self.model.num_topics)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._queue = queue.Queue()
+        self._worker = None
+        # load spaCy now rather than on the first request
+        get_nlp()
+
+    def infer(self, reviews: List[str]) -> np.ndarray:
+        """Topic distributions of a batch of reviews.
+
+        Args:
+            reviews (List[str]): raw book reviews
+
+        Returns:
+            An array with one row per review and one column per topic.
+        """
+        tokenized_reviews = [self.cleaner.tokenize(review) for review in reviews]
+        lemmas = phrase_and_lemmatize(
+            tokenized_reviews, self.phrasers, tags=self.tags, batch_size=len(reviews)
+        )
+        bows = [self.dictionary.doc2bow(review) for review in lemmas]
+        gamma, _ = self.model.inference(bows)
+        return gamma / gamma.sum(axis=1, keepdims=True)
+
+    def to_response(self, topics: np.ndarray) -> Dict:
+        return {
+            "dominant_topic": self.topic_names[int(topics.argmax())],
+            "topics": dict(zip(self.topic_names, topics.tolist())),
+        }
+
+    def submit(self, review: str) -> Future:
+        """Queue a review, returning a future of its response."""
+        if self._worker is None:
+            raise RuntimeError("The service must be started first")
+        future = Future()
+        self._queue.put((review, future))
+        return future
+
+    def predict(self, review: str, timeout: Union[float, None] = 30) -> Dict:
+        """Dominant topic and topic distribution of a review."""
+        return self.submit(review).result(timeout)
+
+    def start(self) -> "TopicInferenceService":
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._run, daemon=True)
+            self._worker.start()
+        return self
+
+    def stop(self) -> None:
+        if self._worker is not None:
+            self._queue.put(None)
+            self._worker.join()
+            self._worker = None
+
+    def _next_batch(self) -> List:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while batch[-1] is not None and len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(remaining, 0)))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            stopping = batch[-1] is None
+            batch = [item for item in batch if item is not None]
+            if batch:
+                reviews, futures = zip(*batch)
+                try:
+                    topics = self.infer(list(reviews))
+                except Exception as e:
+                    for future in futures:
+                        future.set_exception(e)
+                else:
+                    for future, review_topics in zip(futures, topics):
+                        future.set_result(self.to_response(review_topics))
+            if stopping:
+                return
+
+    def __enter__(self) -> "TopicInferenceService":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+def make_topic_server(
+    service: TopicInferenceService,
+    host: str = "127.0.0.1",
+    port: int = 8000,
+    timeout: float = 30,
+) -> ThreadingHTTPServer:
+    """HTTP server answering POST requests to /topics. The body is either
+    {"review": "..."}, answered with the topics of the review, or
+    {"reviews": [...]}, answered with a list. Each request is handled in
+    its own thread, and concurrent requests are batched by the service.
+
+    Errors are answered with {"error": "..."}: status 400 for a malformed
+    request, 503 when the topics aren't ready within `timeout` seconds,
+    and 500 when inference fails.
+
+    Args:
+        service (TopicInferenceService): started inference service
+        host (str): address to listen on
+        port (int): port to listen on, 0 to pick a free one
+        timeout (float): longest time, in seconds, a request waits for
+            its topics
+
+    Returns:
+        The server, to be run with `serve_forever`.
+    """
+
+    class TopicRequestHandler(BaseHTTPRequestHandler):
+        # keep connections open between requests of the same client
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            if self.path != "/topics":
+                self.send_json(404, {"error": f"Unknown path: {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                batch = "reviews" in request
+                reviews = request["reviews"] if batch else [request["review"]]
+                if not isinstance(reviews, list) or not all(
+                    isinstance(review, str) for review in reviews
+                ):
+                    raise TypeError("Reviews must be strings")
+            except (ValueError, KeyError, TypeError) as e:
+                self.send_json(400, {"error": f"Invalid request: {e!r}"})
+                return
+
+            # all the reviews of a request share the same deadline
+            deadline = time.monotonic() + timeout
+            try:
+                futures = [service.submit(review) for review in reviews]
+                response = [
+                    future.result(max(deadline - time.monotonic(), 0))
+                    for future in futures
+                ]
+            except FutureTimeoutError:
+                self.send_json(503, {"error": "Timed out waiting for the topics"})
+                return
+            except Exception as e:
+                self.send_json(500, {"error": f"Inference failed: {e!r}"})
+                return
+            self.send_json(200, response if batch else response[0])
+
+        def send_json(self, status: int, payload: Union[Dict, List]) -> None:
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), TopicRequestHandler, False)
+    # the default backlog of 5 connections drops bursts of clients
+    server.request_queue_size = 128
+    server.server_bind()
+    server.server_activate()
+    return server
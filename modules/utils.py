@@ -1,20 +1,104 @@
-import matplotlib.pyplot as plt
+import re
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import FrozenSet, Iterable, Iterator, List, Sequence, Union
+
 import pandas as pd
-import seaborn as sns
-import spacy
 from langdetect import DetectorFactory, detect
-from nltk import FreqDist
-from nltk.corpus import stopwords
-from wordcloud import STOPWORDS, WordCloud
+from langdetect.lang_detect_exception import LangDetectException
+
+from modules.text_cache import TextCache, text_key
 
-nlp = spacy.load("en", disable=["parser", "ner"])
-stop_words = stopwords.words("english")
+# characters removed from a list of genres saved as text, e.g.
+# "['fiction', 'science fiction']" becomes "fiction,sciencefiction"
+GENRE_NOISE = re.compile(r"[\[\]' ]")
+CATEGORICAL_COLUMNS = ["user", "author", "book_genres", "isbn", "language"]
+# book IDs stay strings, as every other dataset joins on them as text
+NUMERIC_COLUMNS = ["n_helpful"]
+# words removed from word clouds on top of the wordcloud package's stopwords
+WORDCLOUD_STOPWORDS = [
+    "one",
+    "much",
+    "still",
+    "novel",
+    "book",
+    "even",
+    "though",
+    "really",
+    "now",
+    "come",
+    "work",
+    "thing",
+    "way",
+    "rather",
+    "made",
+    "will",
+    "bit",
+    "left",
+    "make",
+    "read",
+    "think",
+    "book",
+    "find",
+    "know",
+    "lot",
+    "found",
+    "another",
+    "page",
+    "first",
+    "part",
+    "take",
+    "thing",
+    "many",
+    "give",
+    "make",
+    "quite",
+    "although",
+    "see",
+    "yet",
+]
 
 DetectorFactory.seed = 42
 
 
+@lru_cache(maxsize=None)
+def get_nlp():
+    """Load the spaCy English model (without the parser and named entity
+    recogniser) the first time it is needed, then reuse it.
+    """
+    import spacy
+
+    return spacy.load("en", disable=["parser", "ner"])
+
+
+@lru_cache(maxsize=None)
+def get_stop_words() -> List[str]:
+    """Load the NLTK English stopwords the first time they are needed,
+    then reuse them.
+    """
+    from nltk.corpus import stopwords
+
+    return stopwords.words("english")
+
+
+@lru_cache(maxsize=None)
+def get_stop_word_set() -> FrozenSet[str]:
+    """NLTK English stopwords as a frozenset, for fast membership tests."""
+    return frozenset(get_stop_words())
+
+
+def __getattr__(name: str):
+    # keep `utils.nlp` and `utils.stop_words` working without loading
+    # them when the module is imported
+    if name == "nlp":
+        return get_nlp()
+    if name == "stop_words":
+        return get_stop_words()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def create_final_dataset(
-    df1: pd.DataFrame, df2: pd.DataFrame, df3: pd.DataFrame
+    df1: pd.DataFrame, df2: pd.DataFrame, df3: pd.DataFrame, compact: bool = False
 ) -> pd.DataFrame:
     """Merge three datasets using outer joins and drop any
     missing values.
@@ -23,10 +107,15 @@ def create_final_dataset(
         df1 (pd.Dataframe): dataframe containing reviews and book IDs
         df2 (pd.Dataframe): dataframe containing book authors, titles and ISBNs
         df3 (pd.Dataframe): dataframe containing book genre information
+        compact (bool): use `create_compact_final_dataset` instead, which
+            uses far less memory
 
     Returns:
         A complete dataset will all relevant book information
     """
+    if compact:
+        return create_compact_final_dataset(df1, df2, df3)
+
     df1.pop("stars")
     df1["user"] = df1.user.fillna("unknown")
     df1 = df1.dropna()
@@ -65,6 +154,98 @@ def create_final_dataset(
     return book_info_reviews_genres.rename(columns={"isbn_x": "isbn"})
 
 
+def create_compact_final_dataset(
+    df1: pd.DataFrame, df2: pd.DataFrame, df3: pd.DataFrame
+) -> pd.DataFrame:
+    """Build the same dataset as `create_final_dataset` with less memory.
+
+    Each dataset is cleaned first (missing values dropped, first genre
+    kept). The joins are still the original's two outer merges on `id`,
+    each followed by `dropna`, rather than inner joins on an indexed `id`:
+    those would give the same rows, but not in the same order. To save
+    memory, the merges only run on the book IDs and the row numbers of
+    each dataset, and the other columns are then gathered by row number,
+    so the original's full intermediate frames are never built. The
+    result goes through `compact_dtypes` and has a fresh index. The input
+    dataframes are left unchanged.
+
+    Args:
+        df1 (pd.Dataframe): dataframe containing reviews and book IDs
+        df2 (pd.Dataframe): dataframe containing book authors, titles and ISBNs
+        df3 (pd.Dataframe): dataframe containing book genre information
+
+    Returns:
+        A complete dataset will all relevant book information
+    """
+    reviews = df1.drop(columns="stars")
+    reviews["user"] = reviews.user.fillna("unknown")
+    reviews = reviews.dropna()
+
+    book_info = df2.dropna()
+
+    genres = df3.drop(columns="goodreads_shelves")
+    genres["book_genres"] = (
+        genres.book_genres.str.replace(GENRE_NOISE, "", regex=True)
+        .str.split(",")
+        .str[0]
+    )
+    genres = genres.dropna()
+
+    rows = pd.merge(
+        _row_numbers(reviews, "review_row"),
+        _row_numbers(book_info, "book_row"),
+        on="id",
+        how="outer",
+    ).dropna()
+    rows = pd.merge(rows, _row_numbers(genres, "genre_row"), on="id", how="outer")
+    rows = rows.dropna().astype({"review_row": int, "book_row": int, "genre_row": int})
+
+    book_info_reviews_genres = pd.concat(
+        [
+            reviews[["reviews", "n_helpful", "time", "user", "id"]]
+            .iloc[rows.review_row]
+            .reset_index(drop=True),
+            book_info[["book_title", "author", "isbn"]]
+            .iloc[rows.book_row]
+            .reset_index(drop=True),
+            genres[["book_genres"]].iloc[rows.genre_row].reset_index(drop=True),
+        ],
+        axis=1,
+    )
+    return compact_dtypes(book_info_reviews_genres)
+
+
+def _row_numbers(df: pd.DataFrame, name: str) -> pd.DataFrame:
+    """Book IDs of a dataset next to the row number of each one."""
+    return pd.DataFrame({"id": df.id.values, name: range(len(df))})
+
+
+def compact_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Store repetitive text columns (users, authors, genres, ISBNs and
+    languages) as categoricals and downcast numeric columns, e.g. after
+    loading a dataset with `dtype=object`.
+
+    Args:
+        df (pd.DataFrame): dataset with some of the columns of the
+            final dataset
+
+    Returns:
+        The same dataset using smaller data types.
+    """
+    df = df.copy()
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype("category")
+    for column in NUMERIC_COLUMNS:
+        if column in df:
+            numbers = pd.to_numeric(df[column], errors="coerce")
+            if numbers.notna().all():
+                df[column] = pd.to_numeric(numbers, downcast="integer")
+            else:
+                df[column] = pd.to_numeric(numbers, downcast="float")
+    return df
+
+
 def detect_language(text: str) -> str:
     """ Use Google Translate API to detect
     the language in a string
@@ -78,62 +259,125 @@ def detect_language(text: str) -> str:
             language the text is in. If a language
             can't be detected, returns None.
     """
+    if not isinstance(text, str):
+        return ""
     try:
         return detect(text)
-    except Exception:
+    except LangDetectException:
         return ""
 
 
+# common English function words, used to spot obviously English reviews
+ENGLISH_FUNCTION_WORDS = frozenset(
+    """a about after all also an and any are as at be because been but by
+    can could did do does for from had has have he her him his how i if in
+    into is it its just me more my no not of on one only or our out she so
+    some than that the their them then there these they this to too up us
+    was we were what when which who will with would you your""".split()
+)
+WORDS = re.compile(r"[a-z']+")
+
+
+def looks_english(
+    text: str,
+    min_words: int = 8,
+    min_ascii_ratio: float = 0.99,
+    min_function_word_ratio: float = 0.3,
+) -> bool:
+    """Cheap check for reviews that are obviously written in English:
+    long enough, (almost) only ASCII characters and a high share of
+    common English function words. Reviews that fail the check aren't
+    necessarily in another language; they are just left to `detect_language`.
+
+    Args:
+        text (str): review to check
+        min_words (int): minimum number of words
+        min_ascii_ratio (float): minimum share of ASCII characters
+        min_function_word_ratio (float): minimum share of words that are
+            English function words
+
+    Returns:
+        True if the review is almost certainly in English.
+    """
+    if not isinstance(text, str) or not text:
+        return False
+    n_ascii = len(text.encode("ascii", errors="ignore"))
+    if n_ascii / len(text) < min_ascii_ratio:
+        return False
+    words = WORDS.findall(text.lower())
+    if len(words) < min_words:
+        return False
+    n_function_words = sum(word in ENGLISH_FUNCTION_WORDS for word in words)
+    return n_function_words / len(words) >= min_function_word_ratio
+
+
+def detect_languages(
+    texts: Iterable[str],
+    n_jobs: int = 1,
+    cache_path: Union[str, None] = None,
+    fast_path: bool = True,
+    chunksize: int = 256,
+) -> List[str]:
+    """Detect the language of many reviews at once.
+
+    Reviews that `looks_english` accepts are labelled "en" without running
+    the probabilistic detector (when `fast_path` is True). Results of the
+    detector are stored in a `TextCache` keyed by the hash of each review,
+    so reviews already seen in a previous run, or repeated within this one,
+    are only detected once. The remaining reviews are spread across a pool
+    of `n_jobs` processes.
+
+    Args:
+        texts (Iterable[str]): reviews whose language needs to be determined
+        n_jobs (int): number of processes running `detect_language`
+        cache_path (str): location of the cache database, if any
+        fast_path (bool): whether to skip the detector for obviously
+            English reviews
+        chunksize (int): number of reviews sent to a process at a time
+
+    Returns:
+        The language code of each review, in input order ("" if no
+            language could be detected).
+    """
+    texts = list(texts)
+    keys = [text_key(text) for text in texts]
+    cache = TextCache(cache_path, "languages") if cache_path else None
+    languages = cache.get_many(set(keys)) if cache else {}
+
+    to_detect = {}
+    for key, text in zip(keys, texts):
+        if key not in languages and key not in to_detect:
+            if fast_path and looks_english(text):
+                continue
+            to_detect[key] = text
+
+    if n_jobs == 1:
+        detected = list(map(detect_language, to_detect.values()))
+    else:
+        with ProcessPoolExecutor(max_workers=n_jobs) as executor:
+            detected = list(
+                executor.map(detect_language, to_detect.values(), chunksize=chunksize)
+            )
+    new_languages = dict(zip(to_detect, detected))
+    languages.update(new_languages)
+    if cache:
+        cache.put_many(new_languages.items())
+        cache.close()
+
+    return [languages.get(key, "en") for key in keys]
+
+
 def generate_wordcloud(df: pd.DataFrame, book_genre: str) -> None:
     """Removes stopwords then creates a wordcloud from book reviews
 
     Args:
         book_genre (str): book genre reviews correspond to
     """
+    import matplotlib.pyplot as plt
+    from wordcloud import STOPWORDS, WordCloud
+
     stopwords = set(STOPWORDS)
-    stopwords.update(
-        [
-            "one",
-            "much",
-            "still",
-            "novel",
-            "book",
-            "even",
-            "though",
-            "really",
-            "now",
-            "come",
-            "work",
-            "thing",
-            "way",
-            "rather",
-            "made",
-            "will",
-            "bit",
-            "left",
-            "make",
-            "read",
-            "think",
-            "book",
-            "find",
-            "know",
-            "lot",
-            "found",
-            "another",
-            "page",
-            "first",
-            "part",
-            "take",
-            "thing",
-            "many",
-            "give",
-            "make",
-            "quite",
-            "although",
-            "see",
-            "yet",
-        ]
-    )
+    stopwords.update(WORDCLOUD_STOPWORDS)
     text = " ".join(review for review in df.reviews[df.book_genres == book_genre])
 
     wordcloud = WordCloud(
@@ -150,6 +394,10 @@ def generate_wordcloud(df: pd.DataFrame, book_genre: str) -> None:
 
 
 def generate_word_counts_fig(x, terms=30):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    from nltk import FreqDist
+
     all_words = " ".join([text for text in x])
     all_words = all_words.split()
 
@@ -164,30 +412,46 @@ def generate_word_counts_fig(x, terms=30):
 
 
 def remove_stopwords(rev):
+    stop_words = get_stop_word_set()
     rev_new = " ".join([i for i in rev if i not in stop_words])
     return rev_new
 
 
 def lemmatize_text(texts, tags=["NOUN", "ADJ"]):
-    output = []
-    for sent in texts:
-        doc = nlp(" ".join(sent))
-        output.append([token.lemma_ for token in doc if token.pos_ in tags])
-    return output
+    return list(lemmatize_text_stream(texts, tags=tags))
+
+
+def lemmatize_text_stream(
+    texts: Iterable[List[str]],
+    tags: Sequence[str] = ("NOUN", "ADJ"),
+    batch_size: int = 1000,
+    n_process: int = 1,
+) -> Iterator[List[str]]:
+    """Lemmatize tokenized reviews in batches with `nlp.pipe`, keeping
+    only the lemmas of tokens whose part of speech is in `tags`. The
+    output is the same as `lemmatize_text`, but reviews are streamed
+    through spaCy instead of being processed one call at a time.
+
+    Args:
+        texts (Iterable[List[str]]): tokenized reviews
+        tags (Sequence[str]): parts of speech to keep
+        batch_size (int): number of reviews spaCy processes at a time
+        n_process (int): number of processes running the spaCy pipeline
+
+    Yields:
+        The list of lemmas of each review, in input order.
+    """
+    docs = get_nlp().pipe(
+        (" ".join(sent) for sent in texts), batch_size=batch_size, n_process=n_process
+    )
+    for doc in docs:
+        yield [token.lemma_ for token in doc if token.pos_ in tags]
 
 
 def plot_word_frequency(reviews):
-    reviews = reviews.str.replace("n't", " not")
-    reviews = reviews.str.replace("[^a-zA-Z#]", " ")
-    reviews = reviews.apply(lambda x: " ".join([w for w in x.split() if len(w) > 2]))
-    reviews = [remove_stopwords(r.split()) for r in reviews]
-    reviews = [r.lower() for r in reviews]
+    from modules.preprocessing import ReviewCleaner
 
-    tokenized_reviews = pd.Series(reviews).apply(lambda x: x.split())
+    tokenized_reviews = ReviewCleaner().tokenize_series(reviews)
     lemma_reviews = lemmatize_text(tokenized_reviews)
-    clean_reviews = []
-    for i in range(len(lemma_reviews)):
-        clean_reviews.append(" ".join(lemma_reviews[i]))
-
-    clean_series = pd.Series(clean_reviews)
+    clean_series = pd.Series([" ".join(lemmas) for lemmas in lemma_reviews])
     return generate_word_counts_fig(clean_series)
@@ -0,0 +1,176 @@
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Collection, Dict, Iterator, Union
+
+STUB_BOOK_PAGE = """<html><body>
+<div class="headsummary"><h1>Book {0}</h1><h2>by Author {0}</h2></div>
+<div class="description"><h4>ISBN 978000000{0:04d} </h4></div>
+</body></html>"""
+
+
+@contextmanager
+def stub_librarything_server(
+    latency: float = 0.05,
+    flaky: Collection[int] = (),
+    requests: Union[Counter, None] = None,
+) -> Iterator[str]:
+    """Serve fake LibraryThing work pages from a local HTTP server.
+
+    Every request to /work/<id> waits `latency` seconds (to imitate
+    network round trips) and returns a small page in the same layout
+    as a LibraryThing work page. IDs ending in 13 return a 404 so that
+    the failed-ID report can be checked, and IDs ending in 50 a 503. IDs
+    in `flaky` get a 503 the first time they are requested only.
+
+    Args:
+        latency (float): seconds the server waits before answering.
+        flaky (Collection[int]): IDs whose first request fails.
+        requests (Counter): counts the requests received for each ID.
+
+    Yields:
+        URL template of a book page, with a placeholder for the ID.
+    """
+
+    requests = Counter() if requests is None else requests
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            book_id = self.path.rstrip("/").split("/")[-1]
+            key = int(book_id) if book_id.isdigit() else book_id
+            with lock:
+                requests[key] += 1
+                first_request = requests[key] == 1
+            if not book_id.isdigit() or book_id.endswith("13"):
+                self.send_response(404)
+                self.send_header("Content-Type", "text/html")
+                self.end_headers()
+                return
+            if book_id.endswith("50") or (key in flaky and first_request):
+                self.send_response(503)
+                self.send_header("Content-Type", "text/html")
+                self.end_headers()
+                return
+            body = STUB_BOOK_PAGE.format(int(book_id)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/work/{{}}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+STUB_GOODREADS_BOOK = """<?xml version="1.0" encoding="UTF-8"?>
+<GoodreadsResponse><book><id>{0}</id><title>Book {0}</title>
+<popular_shelves><shelf name="to-read" count="{1}"/>
+<shelf name="fantasy" count="{0}"/><shelf name="fiction" count="7"/>
+</popular_shelves></book></GoodreadsResponse>"""
+
+
+@contextmanager
+def stub_goodreads_server(
+    latency: float = 0.01,
+    requests_per_second: Union[float, None] = None,
+    retry_after: int = 1,
+    missing: Collection[int] = (),
+) -> Iterator[Dict]:
+    """Serve fake Goodreads API responses from a local HTTP server.
+
+    /book/isbn_to_id?isbn=<isbn> returns the last five digits of the ISBN
+    as the Goodreads ID, and /book/show/<id>.xml returns the XML details of
+    a book, with a title and popular shelves. IDs in `missing`, and the
+    ISBNs mapping to them, get a 404 instead. Every request waits `latency`
+    seconds and is counted. With `requests_per_second`, the server enforces
+    a rate limit (a token bucket holding one second of requests): requests
+    over the limit get a 429 response with a Retry-After header.
+
+    Args:
+        latency (float): seconds the server waits before answering.
+        requests_per_second (float): rate limit, None for no limit.
+        retry_after (int): seconds sent in the Retry-After header.
+        missing (Collection[int]): Goodreads IDs the API doesn't know.
+
+    Yields:
+        A dictionary with the `base_url` of the API, the number of
+        `requests` received so far and how many were `throttled`.
+    """
+    state = {"requests": 0, "throttled": 0}
+    bucket = {"tokens": requests_per_second, "updated": time.monotonic()}
+    lock = threading.Lock()
+
+    def over_limit() -> bool:
+        if not requests_per_second:
+            return False
+        now = time.monotonic()
+        elapsed = now - bucket["updated"]
+        bucket["updated"] = now
+        bucket["tokens"] = min(
+            requests_per_second, bucket["tokens"] + elapsed * requests_per_second
+        )
+        if bucket["tokens"] < 1:
+            return True
+        bucket["tokens"] -= 1
+        return False
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(latency)
+            with lock:
+                state["requests"] += 1
+                throttled = over_limit()
+                state["throttled"] += throttled
+            if throttled:
+                self.send_response(429)
+                self.send_header("Retry-After", str(retry_after))
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            path, _, query = self.path.partition("?")
+            params = dict(p.split("=", 1) for p in query.split("&") if "=" in p)
+            isbn = params.get("isbn", "")
+            book_id = None
+            if path == "/book/isbn_to_id" and isbn.isdigit():
+                book_id = int(isbn[-5:])
+                body = str(book_id).encode()
+                content_type = "text/plain"
+            elif path.startswith("/book/show/") and path.endswith(".xml"):
+                book_id = int(path[len("/book/show/") : -len(".xml")])
+                body = STUB_GOODREADS_BOOK.format(book_id, 10 * book_id).encode()
+                content_type = "application/xml"
+            if book_id is None or book_id in missing:
+                self.send_response(404)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["base_url"] = f"http://127.0.0.1:{server.server_port}"
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
@@ -0,0 +1,149 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from gensim import corpora
+from gensim.models import LdaModel
+from scipy import sparse
+
+import modules.batch_scoring as batch_scoring
+import modules.phrases as phrases
+import modules.preprocessing as preprocessing
+from modules.batch_scoring import MINIMUM_PROBABILITY, score_reviews
+from modules.preprocessing import VADER_COLUMNS, get_sentiment_analyzer
+
+
+def fake_scored_chunks(chunks, *args, **kwargs):
+    # stands in for the LDA model, spaCy and VADER: the topics of a review
+    # depend on its length, its sentiment on its id
+    for chunk in chunks:
+        lengths = chunk.reviews.str.len().values
+        topics = np.zeros((len(chunk), 3), dtype=np.float32)
+        topics[np.arange(len(chunk)), lengths % 3] = 1
+        vader = np.tile(
+            pd.to_numeric(chunk.id).values[:, None] / 10, (1, len(VADER_COLUMNS))
+        )
+        yield chunk, sparse.csr_matrix(topics), vader
+
+
+def test_scores_are_joined_from_shards(tmp_path, monkeypatch):
+    reviews = pd.DataFrame(
+        {
+            "id": [str(i) for i in range(1, 8)],
+            "user": ["ann", None, "bob", "cat", None, "dan", "eve"],
+            "reviews": ["a", "bb", "ccc", "dddd", "eeeee", "ffffff", "g"],
+        }
+    )
+    reviews_path = tmp_path / "reviews.csv"
+    reviews.to_csv(reviews_path, index=False)
+    output_dir = tmp_path / "scores"
+    os.makedirs(output_dir / "shards")
+    (output_dir / "shards" / "000009_topics.npz").write_bytes(b"stale")
+
+    monkeypatch.setattr(batch_scoring, "iter_scored_chunks", fake_scored_chunks)
+    scores = score_reviews(str(reviews_path), "model", str(output_dir), chunksize=3)
+
+    assert not os.path.exists(output_dir / "shards")
+    assert scores.topics.shape == (7, 3)
+    assert scores.reviews.id.tolist() == [str(i) for i in range(1, 8)]
+    assert scores.reviews.user.tolist() == [
+        "ann",
+        "unknown",
+        "bob",
+        "cat",
+        "unknown",
+        "dan",
+        "eve",
+    ]
+    lengths = reviews.reviews.str.len().values
+    assert scores.reviews.dominant_topic.tolist() == list(lengths % 3 + 1)
+    assert np.allclose(scores.reviews[VADER_COLUMNS[0]], np.arange(1, 8) / 10)
+
+
+REVIEWS = [
+    "A wizard casts a spell in the magic castle",
+    "The detective found the murder weapon",
+    "Dragons and wizards fight with magic spells",
+    "A murder case for the police detective",
+    "",
+    "The castle wizard didn't like the police",
+]
+
+
+def fake_lemmatize(texts, tags=None, batch_size=None, n_process=None):
+    # spaCy isn't installed here: the cleaned words stand in for lemmas
+    return iter([list(words) for words in texts])
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    monkeypatch.setattr(preprocessing, "get_stop_words", lambda: ["the", "and"])
+    monkeypatch.setattr(phrases, "lemmatize_text_stream", fake_lemmatize)
+    texts = [
+        "wizard spell magic castle dragons wizards spells".split(),
+        "detective murder weapon case police".split(),
+    ] * 20
+    dictionary = corpora.Dictionary(texts)
+    model = LdaModel(
+        [dictionary.doc2bow(text) for text in texts],
+        id2word=dictionary,
+        num_topics=2,
+        passes=5,
+        random_state=1,
+    )
+    path = str(tmp_path / "lda.model")
+    model.save(path)
+    return path
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_scores_match_the_model(tmp_path, model_path, n_jobs):
+    reviews_path = tmp_path / "reviews.csv"
+    pd.DataFrame(
+        {
+            "id": ["b1", "2", "b1", "3", "4", "5"],
+            "user": ["ann", "bob", None, "cat", "dan", "eve"],
+            "reviews": REVIEWS,
+        }
+    ).to_csv(reviews_path, index=False)
+    scores = score_reviews(
+        str(reviews_path),
+        model_path,
+        str(tmp_path / "scores"),
+        chunksize=2,
+        n_jobs=n_jobs,
+    )
+
+    assert scores.reviews.id.tolist() == ["b1", "2", "b1", "3", "4", "5"]
+    model = LdaModel.load(model_path)
+    cleaner = preprocessing.ReviewCleaner(extra_stop_words=preprocessing.MORE_STOPWORDS)
+    analyzer = get_sentiment_analyzer()
+    for i, review in enumerate(REVIEWS):
+        words = cleaner.tokenize(review)
+        expected = np.zeros(2)
+        for topic, p in model.get_document_topics(
+            model.id2word.doc2bow(words), minimum_probability=MINIMUM_PROBABILITY
+        ):
+            expected[topic] = p
+        # inference starts from a random point, so results differ slightly
+        assert np.allclose(scores.topics[i].toarray().ravel(), expected, atol=0.02)
+        if words:
+            assert scores.reviews.dominant_topic[i] == expected.argmax() + 1
+        polarity = analyzer.polarity_scores(" ".join(words))
+        for col in VADER_COLUMNS:
+            assert scores.reviews[col][i] == pytest.approx(polarity[col[6:]], abs=1e-6)
+    # magic and crime reviews get different topics
+    assert scores.reviews.dominant_topic[0] != scores.reviews.dominant_topic[1]
+
+
+def test_empty_reviews_give_empty_scores(tmp_path, model_path):
+    reviews_path = tmp_path / "reviews.csv"
+    reviews_path.write_text("id,user,reviews\n")
+    scores = score_reviews(str(reviews_path), model_path, str(tmp_path / "scores"))
+
+    assert scores.topics.shape == (0, 2)
+    assert len(scores.reviews) == 0
+    assert list(scores.reviews.columns) == ["id", "user", "dominant_topic"] + list(
+        VADER_COLUMNS
+    )
@@ -0,0 +1,57 @@
+import random
+
+import numpy as np
+import pandas as pd
+
+from modules.book_genre_extractor import (
+    assign_book_genres,
+    extract_book_genre_info,
+    genre_dict,
+    genre_filter,
+    parse_shelves,
+)
+
+
+def random_shelves(n_books, seed=0):
+    rng = random.Random(seed)
+    names = sorted(genre_dict)[:80] + genre_filter[:20]
+    books = []
+    for _ in range(n_books):
+        shelf_names = rng.sample(names, rng.randint(1, 15))
+        # distinct counts, as the notebook's sort isn't stable
+        counts = rng.sample(range(1, 100000), len(shelf_names))
+        books.append(
+            [
+                {"@name": name, "@count": str(count)}
+                for name, count in zip(shelf_names, counts)
+            ]
+        )
+    return books
+
+
+def test_assign_book_genres_matches_extract_book_genre_info():
+    # shelves as read back from a csv
+    shelves = pd.Series([str(books) for books in random_shelves(200)])
+    expected = shelves.map(extract_book_genre_info)
+    assert list(assign_book_genres(shelves)) == list(expected)
+
+
+def test_parse_shelves_reads_shelves_written_to_csv(tmp_path):
+    books = random_shelves(3)
+    path = tmp_path / "shelves.csv"
+    pd.DataFrame({"goodreads_shelves": books}).to_csv(path, index=False)
+    shelves = pd.read_csv(path).goodreads_shelves
+    assert [parse_shelves(entry) for entry in shelves] == books
+    assert parse_shelves(books[0]) is books[0]
+
+
+def test_books_without_shelves_get_no_genres():
+    books = random_shelves(2)
+    shelves = pd.Series([None, books[0], np.nan, books[1]], index=[5, 6, 7, 8])
+    genres = assign_book_genres(shelves)
+
+    assert list(genres.index) == [5, 6, 7, 8]
+    assert genres.iloc[[0, 2]].isna().all()
+    assert genres[6] == extract_book_genre_info(books[0])
+    assert genres[8] == extract_book_genre_info(books[1])
+    assert assign_book_genres(pd.Series([None, np.nan])).isna().all()
@@ -0,0 +1,61 @@
+import pandas as pd
+
+from modules.book_info_extractor import (
+    clean_book_info,
+    clean_isbn_and_id_lists,
+    extract_book_details_from_store,
+)
+from modules.html_store import HtmlStore
+from tests.stub_servers import STUB_BOOK_PAGE
+
+
+def test_extract_book_details_from_store_keeps_book_ids(tmp_path):
+    store_path = str(tmp_path / "pages.db")
+    with HtmlStore(store_path) as store:
+        store.put_many((i, STUB_BOOK_PAGE.format(i)) for i in [30, 10, 20])
+
+    details = extract_book_details_from_store(store_path)
+    assert list(details.columns) == ["book_id", "book_title", "author", "isbn"]
+    assert list(details.book_id) == [10, 20, 30]
+    assert list(details.book_title) == ["Book 10", "Book 20", "Book 30"]
+
+    details = extract_book_details_from_store(store_path, books_list=[20, 99])
+    assert list(details.book_id) == [20, 99]
+    assert list(details.book_title) == ["Book 20", ""]
+
+
+def test_clean_book_info_applies_fixes_by_book_id():
+    details = pd.DataFrame(
+        {
+            "book_title": ["Book 20", "How to Teach English", "Book 30"],
+            "author": ["Author 20", None, "Author 30"],
+            "isbn": ["ISBN 9780000000020 ", "", "no isbn"],
+        }
+    )
+    fixes = {
+        "10": {"author": "Jeremy Harmer", "isbn": "9780521656139"},
+        "99": {"author": "Nobody"},
+    }
+
+    book_info = clean_book_info(details, [20, 10, 30], fixes=fixes)
+    assert list(book_info.id) == [20, 10]
+    assert list(book_info.author) == ["Author 20", "Jeremy Harmer"]
+    assert list(book_info.isbn) == ["9780000000020", "9780521656139"]
+
+    reordered = clean_book_info(details.iloc[::-1], [30, 10, 20], fixes=fixes)
+    assert list(reordered.id) == [10, 20]
+    assert list(reordered.author) == ["Jeremy Harmer", "Author 20"]
+
+
+def test_clean_isbn_and_id_lists_fixes_by_title_and_book_id():
+    book_info = pd.DataFrame(
+        {
+            "id": ["20", "10", "30"],
+            "book_title": ["Book 20", "Thirteen Reasons Why", "Book 30"],
+            "isbn": ["9780000000020", "0000", "123"],
+        }
+    )
+
+    isbns, ids = clean_isbn_and_id_lists(book_info, isbn_fixes={"30": "9780385536097"})
+    assert isbns == ["9780000000020", "0141328290", "9780385536097"]
+    assert ids == ["20", "10", "30"]
@@ -0,0 +1,64 @@
+import random
+
+from gensim import corpora
+from gensim.models import LdaModel
+
+from modules.coherence import CoherenceStatistics, evaluate_lda_models
+
+WORDS = [
+    "dragon",
+    "magic",
+    "castle",
+    "love",
+    "kiss",
+    "wedding",
+    "ship",
+    "space",
+    "alien",
+]
+
+
+def make_texts(seed, n_texts=60):
+    rng = random.Random(seed)
+    return [rng.sample(WORDS, 4) for _ in range(n_texts)]
+
+
+def train_models(texts, dictionary, directory):
+    corpus = [dictionary.doc2bow(text) for text in texts]
+    paths = []
+    for num_topics in [2, 3]:
+        path = str(directory / f"lda_{num_topics}")
+        LdaModel(
+            corpus, num_topics=num_topics, id2word=dictionary, random_state=1
+        ).save(path)
+        paths.append(path)
+    return paths
+
+
+def test_statistics_are_recounted_for_other_texts(tmp_path, monkeypatch):
+    texts = make_texts(0)
+    dictionary = corpora.Dictionary(texts)
+    paths = train_models(texts, dictionary, tmp_path)
+    statistics_path = str(tmp_path / "statistics.pkl")
+
+    builds = []
+    build = CoherenceStatistics.build.__func__
+
+    def counting_build(cls, *args, **kwargs):
+        builds.append(args)
+        return build(cls, *args, **kwargs)
+
+    monkeypatch.setattr(CoherenceStatistics, "build", classmethod(counting_build))
+
+    first = evaluate_lda_models(paths, texts, dictionary, statistics_path)
+    again = evaluate_lda_models(paths, texts, dictionary, statistics_path)
+    assert len(builds) == 1
+    assert first.equals(again)
+
+    # as many texts, but not the same ones
+    other_texts = make_texts(1)
+    assert len(other_texts) == len(texts)
+    other = evaluate_lda_models(paths, other_texts, dictionary, statistics_path)
+    assert len(builds) == 2
+    assert not other.equals(first)
+    assert CoherenceStatistics.load(statistics_path).n_documents == len(texts)
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+import modules.corpus_artifacts as corpus_artifacts
+import modules.phrases as phrases
+import modules.preprocessing as preprocessing
+from modules.corpus_artifacts import build_corpus_artifacts, load_corpus_artifacts
+
+REVIEWS = [
+    "Great science fiction about a distant planet",
+    "The science fiction classic every reader should know",
+    "A slow romance set on a distant planet",
+    "Science fiction with a romance nobody needed",
+]
+PARAMS = {"ngram": "bigram", "phrase_min_count": 2, "phrase_threshold": 1}
+
+
+@pytest.fixture
+def lemmatized(monkeypatch):
+    """Texts passed to the lemmatizer, which stands in for spaCy."""
+    calls = []
+
+    def fake_lemmatize(texts, tags=None, batch_size=None, n_process=None):
+        texts = [list(words) for words in texts]
+        calls.append(texts)
+        return iter(texts)
+
+    monkeypatch.setattr(preprocessing, "get_stop_words", lambda: ["the", "about"])
+    monkeypatch.setattr(phrases, "lemmatize_text_stream", fake_lemmatize)
+    return calls
+
+
+def test_artifacts_are_saved_then_loaded(tmp_path, lemmatized):
+    built = build_corpus_artifacts(REVIEWS, str(tmp_path), PARAMS)
+    assert len(lemmatized) == 1
+    assert built.texts == lemmatized[0]
+    assert built.texts[0] == ["great", "science_fiction", "distant", "planet"]
+    assert [phraser[["science", "fiction"]] for phraser in built.phrasers] == [
+        ["science_fiction"]
+    ]
+    bows = [built.dictionary.doc2bow(text) for text in built.texts]
+    assert [[(i, int(n)) for i, n in doc] for doc in built.corpus] == bows
+
+    loaded = build_corpus_artifacts(REVIEWS, str(tmp_path), PARAMS)
+    assert len(lemmatized) == 1
+    assert loaded.key == built.key
+    assert loaded.texts == built.texts
+    assert loaded.dictionary.token2id == built.dictionary.token2id
+    assert list(loaded.corpus) == list(built.corpus)
+    assert loaded.phrasers[0][["science", "fiction"]] == ["science_fiction"]
+    assert os.listdir(tmp_path) == [built.key]
+
+
+def test_changed_inputs_invalidate_the_artifacts(tmp_path, lemmatized, monkeypatch):
+    key = build_corpus_artifacts(REVIEWS, str(tmp_path), PARAMS).key
+
+    changed = build_corpus_artifacts(REVIEWS[:3], str(tmp_path), PARAMS)
+    assert len(lemmatized) == 2 and changed.key != key
+    assert len(changed.texts) == 3
+
+    changed = build_corpus_artifacts(
+        REVIEWS, str(tmp_path), dict(PARAMS, min_word_length=6)
+    )
+    assert len(lemmatized) == 3 and changed.key != key
+    assert "great" not in changed.dictionary.token2id
+
+    # artifacts written by older code are not reused, even under a known key
+    monkeypatch.setattr(
+        corpus_artifacts, "ARTIFACT_VERSION", corpus_artifacts.ARTIFACT_VERSION + 1
+    )
+    assert load_corpus_artifacts(str(tmp_path), key) is None
+    assert build_corpus_artifacts(REVIEWS, str(tmp_path), PARAMS).key != key
+    assert len(lemmatized) == 4
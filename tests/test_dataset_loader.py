@@ -0,0 +1,82 @@
+import ast
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from extra_info.helper_functions.dataset_loader import (
+    iter_dataset_chunks,
+    parse_entries,
+    parse_entry,
+)
+
+READABLE = [
+    "{'comment': 'A great read', 'work': '1', 'nhelpful': 0}\n",
+    "{'comment': \"It's a classic\", 'work': '2', 'nhelpful': 1}\n",
+    "{'comment': 'He said \"wow, great: read\" twice', 'work': '3', 'nhelpful': 0}\n",
+]
+# only `ast.literal_eval` reads these
+LITERAL_ONLY = [
+    "{'comment': 'Ends with \"quote\", then more', 'work': '4', 'nhelpful': 2}\n",
+    "{'comment': \"It's 'ok', I think\", 'work': '5', 'nhelpful': 0}\n",
+    "{'comment': 'No votes', 'work': '6', 'nhelpful': None}\n",
+]
+UNREADABLE = [
+    "not an entry\n",
+    "{'comment': 'Broken': 'entry', 'work': '7'}\n",
+    # a comment read as a key
+    "{'comment': 'Short', 'a comment that became a key': '8'}\n",
+]
+LINES = READABLE + LITERAL_ONLY + UNREADABLE
+
+
+def test_parse_entry_reads_python_dictionaries():
+    for line in READABLE:
+        entry = parse_entry(line)
+        assert entry == ast.literal_eval(line)
+        assert parse_entry(line, use_literal_eval=True) == entry
+
+
+def test_literal_eval_recovers_more_entries():
+    for line in LITERAL_ONLY:
+        with pytest.raises(ValueError):
+            parse_entry(line)
+        assert parse_entry(line, use_literal_eval=True) == ast.literal_eval(line)
+
+    for line in UNREADABLE:
+        with pytest.raises(ValueError):
+            parse_entry(line, use_literal_eval=True)
+
+
+def test_parse_entries_counts_problems():
+    data, problems = parse_entries(LINES)
+    assert [entry["work"] for entry in data] == ["1", "2", "3"]
+    assert problems == 6
+
+    data, problems = parse_entries(LINES, use_literal_eval=True)
+    assert [entry["work"] for entry in data] == ["1", "2", "3", "4", "5", "6"]
+    assert problems == 3
+
+
+@pytest.mark.parametrize("use_literal_eval", [False, True])
+def test_chunks_parsed_in_parallel_match_serial_parsing(tmp_path, use_literal_eval):
+    path = tmp_path / "reviews.txt"
+    path.write_text("".join(LINES * 5))
+    expected, problems = parse_entries(LINES * 5, use_literal_eval)
+
+    for n_jobs in [1, 2]:
+        counts = Counter()
+        chunks = list(
+            iter_dataset_chunks(
+                str(path),
+                chunksize=4,
+                n_jobs=n_jobs,
+                use_literal_eval=use_literal_eval,
+                counts=counts,
+            )
+        )
+        assert len(chunks) == 12
+        pd.testing.assert_frame_equal(
+            pd.concat(chunks, ignore_index=True, sort=False), pd.DataFrame(expected),
+        )
+        assert counts == Counter(entries=len(expected), problems=problems)
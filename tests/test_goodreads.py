@@ -0,0 +1,135 @@
+import time
+
+import pandas as pd
+import pytest
+
+from modules import http_client
+from modules.book_genre_extractor import parse_shelves
+from modules.goodreads_api_functions import (
+    acquire_goodreads_id,
+    get_book_shelves,
+    get_book_titles,
+    make_goodreads_scheduler,
+)
+from modules.goodreads_cache import NOT_FOUND, GoodreadsCache
+from tests.stub_servers import stub_goodreads_server
+
+# the stub maps an ISBN to its last five digits
+ISBNS = ["9780000000011", "9780000000022", "9780000000011", "9780000000313", "n/a"]
+MISSING = [313]
+
+
+@pytest.fixture(autouse=True)
+def no_disk_cache(monkeypatch):
+    monkeypatch.delenv("CAPSTONE_HTTP_CACHE_DIR", raising=False)
+
+
+@pytest.fixture(scope="module")
+def server():
+    with stub_goodreads_server(latency=0.01, missing=MISSING) as server:
+        yield server
+
+
+def lookup(server, cache, function, keys):
+    scheduler = make_goodreads_scheduler(None, max_retries=0)
+    server["requests"] = 0
+    result = function(
+        keys, cache=cache, base_url=server["base_url"], scheduler=scheduler
+    )
+    return result, server["requests"], scheduler.failed
+
+
+def test_cache_tells_not_found_from_missing():
+    with GoodreadsCache(":memory:") as cache:
+        assert cache.get_id("1") is None
+        cache.put_id("1", NOT_FOUND)
+        cache.put_id("2", 2)
+        assert cache.get_id("1") is NOT_FOUND
+        assert cache.get_id("2") == 2
+
+        assert cache.get_book(3) is None
+        cache.put_book(3, NOT_FOUND)
+        assert cache.get_book(3) is NOT_FOUND
+
+    with GoodreadsCache(":memory:", max_age=0.01) as cache:
+        cache.put_id("1", NOT_FOUND)
+        time.sleep(0.02)
+        assert cache.get_id("1") is None
+
+
+def test_acquire_goodreads_id(server, capsys):
+    with GoodreadsCache(":memory:") as cache:
+        ids, requests, failed = lookup(server, cache, acquire_goodreads_id, ISBNS)
+        assert ids == [11, 22, 11, None, None]
+        # repeated ISBNs are requested once
+        assert requests == 4
+        assert failed == {"9780000000313": "HTTP 404", "n/a": "HTTP 404"}
+        # failures are printed in the order the concurrent requests end
+        out = capsys.readouterr().out
+        assert "ISBNs that failed: " in out
+        assert "'9780000000313'" in out and "'n/a'" in out
+
+        # IDs and ISBNs without an ID are both cached
+        assert cache.get_id("9780000000313") is NOT_FOUND
+        ids, requests, failed = lookup(server, cache, acquire_goodreads_id, ISBNS)
+        assert ids == [11, 22, 11, None, None]
+        assert requests == 0
+        assert failed == {}
+        assert "failed" not in capsys.readouterr().out
+
+
+def test_book_titles_and_shelves_share_requests(server, capsys):
+    book_ids = [11, 22, 313, 11]
+    with GoodreadsCache(":memory:") as cache:
+        titles, requests, failed = lookup(server, cache, get_book_titles, book_ids)
+        assert titles == ["Book 11", "Book 22", None, "Book 11"]
+        assert requests == 3
+        assert failed == {313: "HTTP 404"}
+        assert "Books that failed: [313]" in capsys.readouterr().out
+
+        shelves, requests, failed = lookup(server, cache, get_book_shelves, book_ids)
+        assert requests == 0
+        assert shelves[2] is None
+        assert [shelf["@name"] for shelf in shelves[0]] == [
+            "to-read",
+            "fantasy",
+            "fiction",
+        ]
+        assert shelves[1][0]["@count"] == "220"
+
+
+def test_fetched_shelves_survive_a_csv_round_trip(server, tmp_path):
+    with GoodreadsCache(":memory:") as cache:
+        shelves, requests, _ = lookup(server, cache, get_book_shelves, [11, 22])
+    assert requests == 2
+    csv_path = str(tmp_path / "books.csv")
+    pd.DataFrame({"goodreads_shelves": shelves}).to_csv(csv_path, index=False)
+
+    books = pd.read_csv(csv_path)
+    assert [parse_shelves(entry) for entry in books.goodreads_shelves] == shelves
+
+
+def test_disk_cache_hits_skip_the_scheduler(server, tmp_path):
+    http_client.enable_cache(str(tmp_path / "http"))
+    try:
+        book_ids = list(range(1, 11))
+        with GoodreadsCache(":memory:") as cache:
+            titles, requests, _ = lookup(server, cache, get_book_titles, book_ids)
+        assert requests == 10
+
+        # a new Goodreads cache, but the responses are on disk
+        with GoodreadsCache(":memory:") as cache:
+            scheduler = make_goodreads_scheduler(1)
+            server["requests"] = 0
+            start = time.perf_counter()
+            cached_titles = get_book_titles(
+                book_ids, cache=cache, base_url=server["base_url"], scheduler=scheduler
+            )
+            elapsed = time.perf_counter() - start
+        assert cached_titles == titles
+        assert server["requests"] == 0
+        assert scheduler.stats["cached"] == 10
+        # at one request per second, ten requests would take nine seconds
+        assert elapsed < 5
+    finally:
+        http_client.disable_cache()
@@ -0,0 +1,159 @@
+import hashlib
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from modules.http_client import ResponseCache, cached_get
+
+LAST_MODIFIED = "Wed, 01 Jan 2020 00:00:00 GMT"
+
+
+@contextmanager
+def stub_server(pages):
+    """Serve `pages`, a dictionary of bodies by path, which can be changed
+    while the server runs. Pages under /etag/ have an ETag, the others the
+    "last_modified" date of the yielded state, and both are answered with
+    a 304 Not Modified when the client's copy is current. Unknown paths
+    get a 404.
+    """
+    state = {"requests": [], "not_modified": 0, "last_modified": LAST_MODIFIED}
+    lock = threading.Lock()
+
+    class StubHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            path = self.path.partition("?")[0]
+            with lock:
+                state["requests"].append((self.path, dict(self.headers)))
+            if path not in pages:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            body = pages[path]
+            if path.startswith("/etag/"):
+                validator = ("ETag", hashlib.md5(body).hexdigest())
+                current = self.headers.get("If-None-Match") == validator[1]
+            else:
+                validator = ("Last-Modified", state["last_modified"])
+                current = self.headers.get("If-Modified-Since") == validator[1]
+            if current:
+                with lock:
+                    state["not_modified"] += 1
+                self.send_response(304)
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header(*validator)
+            self.send_header("Content-Type", "text/plain")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    state["base_url"] = f"http://127.0.0.1:{server.server_port}"
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.parametrize("path", ["/etag/page", "/dated/page"])
+def test_stale_responses_are_revalidated(tmp_path, path):
+    pages = {path: b"first version"}
+    cache = ResponseCache(str(tmp_path), ttl=0.2)
+    with stub_server(pages) as server:
+        url = server["base_url"] + path
+        page = cached_get(url, cache=cache)
+        assert (page.text, page.from_cache) == ("first version", False)
+
+        # fresh responses don't touch the network
+        page = cached_get(url, cache=cache)
+        assert (page.text, page.from_cache) == ("first version", True)
+        assert len(server["requests"]) == 1
+
+        # stale ones are revalidated, and a 304 makes them fresh again
+        time.sleep(0.3)
+        page = cached_get(url, cache=cache)
+        assert (page.status_code, page.text, page.from_cache) == (
+            200,
+            "first version",
+            True,
+        )
+        assert server["not_modified"] == 1
+        headers = server["requests"][-1][1]
+        if path.startswith("/etag/"):
+            assert headers["If-None-Match"] == hashlib.md5(b"first version").hexdigest()
+        else:
+            assert headers["If-Modified-Since"] == LAST_MODIFIED
+        cached_get(url, cache=cache)
+        assert len(server["requests"]) == 2
+
+        time.sleep(0.3)
+        pages[path] = b"second version"
+        server["last_modified"] = "Thu, 02 Jan 2020 00:00:00 GMT"
+        page = cached_get(url, cache=cache)
+        assert (page.text, page.from_cache) == ("second version", False)
+        assert cached_get(url, cache=cache).text == "second version"
+
+
+def test_failed_responses_are_not_cached(tmp_path):
+    cache = ResponseCache(str(tmp_path))
+    with stub_server({}) as server:
+        url = server["base_url"] + "/missing"
+        assert cached_get(url, cache=cache).status_code == 404
+        assert cached_get(url, cache=cache).status_code == 404
+        assert len(server["requests"]) == 2
+
+
+def test_least_recently_used_responses_are_evicted(tmp_path):
+    pages = {f"/etag/{name}": name.encode() * 100 for name in "abc"}
+    pages["/etag/copy_of_a"] = pages["/etag/a"]
+    cache = ResponseCache(str(tmp_path), max_bytes=250)
+    with stub_server(pages) as server:
+
+        def fetch(name):
+            page = cached_get(f"{server['base_url']}/etag/{name}", cache=cache)
+            time.sleep(0.05)
+            return page
+
+        fetch("a")
+        fetch("b")
+        # identical bodies are stored once
+        fetch("copy_of_a")
+        assert len(os.listdir(tmp_path / "objects")) == 2
+        assert fetch("a").from_cache
+
+        fetch("c")
+        assert len(server["requests"]) == 4
+        assert all(fetch(name).from_cache for name in ["a", "copy_of_a", "c"])
+        assert not fetch("b").from_cache
+    assert len(os.listdir(tmp_path / "objects")) == 2
+
+
+def test_credentials_are_left_out_of_cache_keys(tmp_path):
+    key = ResponseCache.request_key("http://api/book", {"isbn": "1", "key": "one"})
+    assert key == ResponseCache.request_key("http://api/book", {"isbn": "1"})
+    assert key == ResponseCache.request_key(
+        "http://api/book", {"key": "two", "isbn": "1"}
+    )
+    assert key != ResponseCache.request_key("http://api/book", {"isbn": "2"})
+
+    cache = ResponseCache(str(tmp_path))
+    with stub_server({"/etag/book": b"details"}) as server:
+        url = server["base_url"] + "/etag/book"
+        cached_get(url, {"isbn": "1", "key": "secret-key"}, cache=cache)
+        page = cached_get(url, {"isbn": "1", "key": "new-key"}, cache=cache)
+        assert page.from_cache and page.text == "details"
+        assert "key=secret-key" in server["requests"][0][0]
+    for name in os.listdir(tmp_path / "index"):
+        assert "secret-key" not in (tmp_path / "index" / name).read_text()
@@ -0,0 +1,69 @@
+import pandas as pd
+
+from modules.incremental import update_processed_reviews
+
+
+class FakeProcess:
+    """Stand-in for the preprocessing chain that records what it processed."""
+
+    def __init__(self):
+        self.processed = []
+
+    def __call__(self, df):
+        self.processed.extend(df.reviews)
+        df = df.copy()
+        df["lemmatized_reviews"] = [review.split() for review in df.reviews]
+        return df
+
+
+def make_reviews(texts):
+    # every review has the same book and the "unknown" user, as after
+    # create_final_dataset fills in missing users
+    return pd.DataFrame(
+        {"reviews": texts, "id": ["1"] * len(texts), "user": ["unknown"] * len(texts)}
+    )
+
+
+def test_duplicate_keys_are_processed_once(tmp_path):
+    texts = ["good plot", "bad ending", "good plot", "long read"]
+    process = FakeProcess()
+    processed, n_changed = update_processed_reviews(
+        make_reviews(texts), tmp_path, process
+    )
+    assert n_changed == 4
+    assert processed.reviews.reviews.tolist() == texts
+    assert processed.reviews.lemmatized_reviews.tolist() == [t.split() for t in texts]
+
+    process = FakeProcess()
+    processed, n_changed = update_processed_reviews(
+        make_reviews(texts), tmp_path, process
+    )
+    assert n_changed == 0
+    assert process.processed == []
+    assert processed.reviews.reviews.tolist() == texts
+
+
+def test_changed_and_reordered_reviews(tmp_path):
+    update_processed_reviews(
+        make_reviews(["good plot", "bad ending", "good plot"]), tmp_path, FakeProcess()
+    )
+
+    process = FakeProcess()
+    texts = ["good plot", "short read", "good plot", "bad ending"]
+    processed, n_changed = update_processed_reviews(
+        make_reviews(texts), tmp_path, process
+    )
+    assert n_changed == 1
+    assert process.processed == ["short read"]
+    assert processed.reviews.reviews.tolist() == texts
+    assert processed.reviews.lemmatized_reviews.tolist() == [t.split() for t in texts]
+
+    # unchanged reviews in a new order come back in that order
+    process = FakeProcess()
+    texts = texts[::-1]
+    processed, n_changed = update_processed_reviews(
+        make_reviews(texts), tmp_path, process
+    )
+    assert n_changed == 0
+    assert processed.reviews.reviews.tolist() == texts
+    assert processed.reviews.lemmatized_reviews.tolist() == [t.split() for t in texts]
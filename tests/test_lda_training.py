@@ -0,0 +1,63 @@
+import random
+
+import pandas as pd
+import pytest
+from gensim import corpora
+from gensim.models import CoherenceModel, LdaModel
+
+import modules.lda_training as lda_training
+import modules.phrases as phrases
+import modules.preprocessing as preprocessing
+from modules.lda_training import build_grid, run_sweep
+
+WORDS = [
+    "dragon",
+    "magic",
+    "castle",
+    "love",
+    "kiss",
+    "wedding",
+    "ship",
+    "space",
+    "alien",
+]
+
+
+@pytest.fixture
+def reviews(monkeypatch):
+    rng = random.Random(0)
+    # spaCy isn't installed here: the cleaned words stand in for lemmas
+    monkeypatch.setattr(preprocessing, "get_stop_words", lambda: [])
+    monkeypatch.setattr(
+        phrases,
+        "lemmatize_text_stream",
+        lambda texts, **kwargs: (list(words) for words in texts),
+    )
+    return [" ".join(rng.sample(WORDS, 4)) for _ in range(60)]
+
+
+def test_sweep_scores_models_like_gensim(tmp_path, reviews, monkeypatch):
+    texts = [review.split() for review in reviews]
+    dictionary = corpora.Dictionary(texts)
+    grid = build_grid(topics=[2, 3], passes=[1])
+    results = run_sweep(reviews, str(tmp_path), grid, workers=1)
+
+    assert sorted(results.model) == sorted(config.name for config in grid)
+    for row in results.itertuples():
+        model = LdaModel.load(str(tmp_path / row.model))
+        expected = CoherenceModel(
+            model=model, texts=texts, dictionary=dictionary, coherence="c_v",
+        ).get_coherence()
+        assert row.coherence == pytest.approx(expected)
+
+    # trained models waiting for their coherence are not trained again
+    trained = pd.read_csv(tmp_path / "trained.csv")
+    (tmp_path / "results.csv").unlink()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("model trained again")
+
+    monkeypatch.setattr(lda_training, "train_lda_model", fail)
+    rerun = run_sweep(reviews, str(tmp_path), grid, workers=1)
+    assert sorted(rerun.model) == sorted(trained.model)
+    assert rerun.coherence.tolist() == pytest.approx(results.coherence.tolist())
@@ -0,0 +1,88 @@
+import random
+
+import pytest
+from gensim.models.phrases import Phraser, Phrases
+
+from modules.phrases import (
+    apply_phrases,
+    count_phrases,
+    load_phrasers,
+    save_phrasers,
+    train_phrasers,
+)
+
+WORDS = ["dark", "tower", "young", "adult", "fiction", "novel", "great", "story"]
+# the vocabulary is small, so phrases score well below the usual threshold
+PHRASES = [["science", "fiction"], ["new", "york", "city"], ["harry", "potter"]]
+
+
+def tokenized_reviews(n_reviews, seed=0):
+    rng = random.Random(seed)
+    reviews = []
+    for _ in range(n_reviews):
+        review = []
+        for _ in range(rng.randint(3, 12)):
+            review.extend(
+                rng.choice(PHRASES) if rng.random() < 0.2 else [rng.choice(WORDS)]
+            )
+        reviews.append(review)
+    return reviews
+
+
+def chunked(reviews, chunksize):
+    return [
+        reviews[start : start + chunksize]
+        for start in range(0, len(reviews), chunksize)
+    ]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_counting_chunks_matches_counting_everything(n_jobs):
+    reviews = tokenized_reviews(300)
+    expected = Phrases(reviews, min_count=3, threshold=0.1)
+
+    phrases = count_phrases(
+        chunked(reviews, 40), min_count=3, threshold=0.1, n_jobs=n_jobs
+    )
+    assert dict(phrases.vocab) == dict(expected.vocab)
+    assert phrases.corpus_word_count == expected.corpus_word_count
+    assert Phraser(phrases).phrasegrams == Phraser(expected).phrasegrams
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_trained_phrasers_match_the_notebooks(n_jobs):
+    reviews = tokenized_reviews(300)
+    bigram = Phraser(Phrases(reviews, min_count=3, threshold=0.1))
+    trigram = Phraser(
+        Phrases([bigram[review] for review in reviews], min_count=3, threshold=0.1)
+    )
+
+    phrasers = train_phrasers(
+        chunked(reviews, 40), ngram="trigram", min_count=3, threshold=0.1, n_jobs=n_jobs
+    )
+    assert [phraser.phrasegrams for phraser in phrasers] == [
+        bigram.phrasegrams,
+        trigram.phrasegrams,
+    ]
+    for review in reviews:
+        assert apply_phrases(review, phrasers) == trigram[bigram[review]]
+    assert apply_phrases(["harry", "potter"], phrasers) == ["harry_potter"]
+    assert train_phrasers(chunked(reviews, 40), ngram="unigram") == []
+
+
+def test_phrasers_are_saved_and_loaded(tmp_path):
+    reviews = tokenized_reviews(300)
+    phrasers = train_phrasers(
+        chunked(reviews, 40), ngram="trigram", min_count=3, threshold=0.1
+    )
+    save_phrasers(str(tmp_path / "phrasers"), phrasers)
+    loaded = load_phrasers(str(tmp_path / "phrasers"))
+
+    assert [phraser.phrasegrams for phraser in loaded] == [
+        phraser.phrasegrams for phraser in phrasers
+    ]
+    for review in reviews:
+        assert apply_phrases(review, loaded) == apply_phrases(review, phrasers)
+
+    save_phrasers(str(tmp_path / "unigram"), [])
+    assert load_phrasers(str(tmp_path / "unigram")) == []
@@ -0,0 +1,265 @@
+import os
+import time
+
+import pandas as pd
+import pytest
+
+import modules.pipeline as pipeline
+from modules.html_store import HtmlStore
+from modules.pipeline import (
+    DEFAULT_CONFIG,
+    STAGES,
+    Stage,
+    collect_goodreads_ids,
+    collect_shelves,
+    run_pipeline,
+    scrape_book_pages,
+    stage_key,
+    stage_params,
+)
+from tests.stub_servers import stub_goodreads_server, stub_librarything_server
+
+
+def _log(inputs, name):
+    with open(os.path.join(inputs["cache_dir"], "runs.log"), "a") as f:
+        f.write(f"{name}\n")
+
+
+def _read(path):
+    with open(path) as f:
+        return f.read()
+
+
+def _write(path, text):
+    with open(path, "w") as f:
+        f.write(text)
+
+
+def normalize(inputs, output_dir, params):
+    _log(inputs, "normalize")
+    text = " ".join(_read(inputs["text"]).lower().split())
+    _write(os.path.join(output_dir, "text.txt"), text)
+
+
+def count_words(inputs, output_dir, params):
+    _log(inputs, "words")
+    text = _read(os.path.join(inputs["normalize"], "text.txt"))
+    _write(os.path.join(output_dir, "count.txt"), str(len(text.split())))
+
+
+def count_letters(inputs, output_dir, params):
+    _log(inputs, "letters")
+    text = _read(os.path.join(inputs["normalize"], "text.txt"))
+    _write(os.path.join(output_dir, "count.txt"), str(len(text.replace(" ", ""))))
+
+
+def wait_for_sibling(inputs, output_dir, params):
+    """Succeeds only if the sibling stage runs at the same time."""
+    _log(inputs, params["name"])
+    _write(os.path.join(inputs["cache_dir"], f"{params['name']}.started"), "")
+    sibling = os.path.join(inputs["cache_dir"], f"{params['sibling']}.started")
+    deadline = time.monotonic() + 10
+    while not os.path.exists(sibling):
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"{params['sibling']} didn't start")
+        time.sleep(0.01)
+
+
+def fail(inputs, output_dir, params):
+    _log(inputs, "broken")
+    _write(os.path.join(output_dir, "partial.txt"), "")
+    raise ValueError("broken stage")
+
+
+def sleep(inputs, output_dir, params):
+    time.sleep(0.5)
+    _log(inputs, "slow")
+
+
+TEXT_STAGES = [
+    Stage("normalize", normalize, sources=("text",)),
+    Stage("words", count_words, ("normalize",)),
+    Stage("letters", count_letters, ("normalize",)),
+]
+
+
+def make_config(tmp_path, stages, text="Some Words"):
+    path = tmp_path / "input.txt"
+    path.write_text(text)
+    return {
+        "cache_dir": str(tmp_path / "cache"),
+        "inputs": {"text": str(path)},
+        "stages": {stage.name: {} for stage in stages},
+    }
+
+
+def runs(config):
+    path = os.path.join(config["cache_dir"], "runs.log")
+    if not os.path.exists(path):
+        return []
+    stages = _read(path).split()
+    os.remove(path)
+    return sorted(stages)
+
+
+def test_cached_stages_are_skipped(tmp_path):
+    config = make_config(tmp_path, TEXT_STAGES)
+    results = run_pipeline(config, targets=["words"], stages=TEXT_STAGES)
+    assert sorted(results) == ["normalize", "words"]
+    assert runs(config) == ["normalize", "words"]
+
+    results = run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == ["letters"]
+    assert results["words"].cached and not results["letters"].cached
+    assert _read(os.path.join(results["letters"].output_dir, "count.txt")) == "9"
+
+    run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == []
+
+    run_pipeline(config, stages=TEXT_STAGES, force=["words"])
+    assert runs(config) == ["words"]
+
+
+def test_changed_inputs_rerun_the_stages_after_them(tmp_path):
+    config = make_config(tmp_path, TEXT_STAGES)
+    run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == ["letters", "normalize", "words"]
+
+    # the normalized text is the same, so the stages after it are cached
+    (tmp_path / "input.txt").write_text("some   WORDS\n")
+    results = run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == ["normalize"]
+    assert not results["normalize"].cached and results["words"].cached
+
+    (tmp_path / "input.txt").write_text("some other words")
+    results = run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == ["letters", "normalize", "words"]
+    assert _read(os.path.join(results["words"].output_dir, "count.txt")) == "3"
+
+    # runtime parameters don't change the key, others do
+    config["stages"]["words"] = {"n_jobs": 4}
+    run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == []
+    config["stages"]["words"] = {"n_jobs": 4, "min_length": 2}
+    run_pipeline(config, stages=TEXT_STAGES)
+    assert runs(config) == ["words"]
+
+
+def test_independent_stages_run_at_the_same_time(tmp_path):
+    stages = [
+        Stage("left", wait_for_sibling, sources=("text",)),
+        Stage("right", wait_for_sibling, sources=("text",)),
+    ]
+    config = make_config(tmp_path, stages)
+    config["stages"] = {
+        "left": {"name": "left", "sibling": "right"},
+        "right": {"name": "right", "sibling": "left"},
+    }
+    results = run_pipeline(config, n_jobs=2, stages=stages)
+    assert sorted(results) == ["left", "right"]
+
+
+def test_failed_stages_are_not_cached(tmp_path, capsys):
+    stages = TEXT_STAGES[:1] + [
+        Stage("broken", fail, ("normalize",)),
+        Stage("slow", sleep, ("normalize",)),
+        Stage("after_broken", count_words, ("broken",)),
+    ]
+    config = make_config(tmp_path, stages)
+    with pytest.raises(RuntimeError, match="Stage broken failed"):
+        run_pipeline(config, n_jobs=2, stages=stages)
+    # the stage running at the same time is finished and cached
+    assert runs(config) == ["broken", "normalize", "slow"]
+    assert "[broken] failed: ValueError('broken stage')" in capsys.readouterr().out
+
+    stages_dir = os.path.join(config["cache_dir"], "stages")
+    assert sorted(os.listdir(stages_dir)) == ["normalize", "slow"]
+    with pytest.raises(RuntimeError):
+        run_pipeline(config, n_jobs=2, stages=stages)
+    assert runs(config) == ["broken"]
+    assert sorted(os.listdir(stages_dir)) == ["normalize", "slow"]
+
+
+def test_failed_pages_fail_the_scrape(tmp_path, capsys):
+    top_books = tmp_path / "top_books"
+    top_books.mkdir()
+    pd.DataFrame({"book_id": [1, 113, 150]}).to_csv(
+        top_books / "top_books.csv", index=False
+    )
+    inputs = {"top_books": str(top_books), "cache_dir": str(tmp_path)}
+    output_dir = tmp_path / "scrape"
+    output_dir.mkdir()
+    with stub_librarything_server(latency=0.01) as url_template:
+        params = dict(
+            DEFAULT_CONFIG["stages"]["scrape"],
+            url_template=url_template,
+            requests_per_second=200,
+            max_retries=0,
+        )
+        with pytest.raises(RuntimeError, match="1 pages failed"):
+            scrape_book_pages(inputs, str(output_dir), params)
+        assert "pages: 1 failed, 1 not found" in capsys.readouterr().out
+
+        scrape_book_pages(inputs, str(output_dir), dict(params, max_failures=1))
+    with HtmlStore(str(output_dir / "pages.db")) as store:
+        assert store.book_ids() == [1]
+
+
+def test_goodreads_stages_keep_ids_as_strings(tmp_path, monkeypatch):
+    monkeypatch.delenv("CAPSTONE_HTTP_CACHE_DIR", raising=False)
+    book_details = tmp_path / "book_details"
+    book_details.mkdir()
+    pd.DataFrame(
+        {
+            "id": ["1", "2", "3"],
+            "book_title": ["Book 1", "Book 2", "Book 3"],
+            "author": ["Author 1", "Author 2", "Author 3"],
+            "isbn": ["9780000000011", "9780000000313", "9780000000022"],
+        }
+    ).to_csv(book_details / "book_info.csv", index=False)
+    ids_dir = tmp_path / "goodreads_ids"
+    shelves_dir = tmp_path / "shelves"
+    ids_dir.mkdir()
+    shelves_dir.mkdir()
+    inputs = {
+        "book_details": str(book_details),
+        "goodreads_ids": str(ids_dir),
+        "cache_dir": str(tmp_path),
+    }
+    with stub_goodreads_server(missing=[313]) as server:
+        collect_goodreads_ids(
+            inputs,
+            str(ids_dir),
+            dict(DEFAULT_CONFIG["stages"]["goodreads_ids"], api_url=server["base_url"]),
+        )
+        collect_shelves(
+            inputs,
+            str(shelves_dir),
+            dict(DEFAULT_CONFIG["stages"]["shelves"], api_url=server["base_url"]),
+        )
+
+    ids = pd.read_csv(ids_dir / "goodreads_ids.csv", dtype=object)
+    assert list(ids.goodreads_id.fillna("")) == ["11", "", "22"]
+    books = pd.read_csv(shelves_dir / "goodreads_books.csv", dtype=object)
+    assert list(books.id) == ["1", "3"]
+    assert list(books.goodreads_book_titles) == ["Book 11", "Book 22"]
+
+
+def test_lda_workers_are_part_of_the_cache_key(monkeypatch):
+    monkeypatch.setattr(pipeline, "default_workers", lambda: 3)
+    lda = next(stage for stage in STAGES if stage.name == "lda")
+    params = stage_params(DEFAULT_CONFIG, "lda")
+    assert params["workers"] == 3
+    assert DEFAULT_CONFIG["stages"]["lda"]["workers"] is None
+
+    key = stage_key(lda, params, {})
+    assert stage_key(lda, dict(params, workers=3), {}) == key
+    assert stage_key(lda, dict(params, workers=1), {}) != key
+
+
+def test_runtime_params_are_left_out_of_the_cache_key():
+    scrape = next(stage for stage in STAGES if stage.name == "scrape")
+    params = stage_params(DEFAULT_CONFIG, "scrape")
+    assert stage_key(scrape, dict(params, max_workers=8), {}) == stage_key(
+        scrape, params, {}
+    )
@@ -0,0 +1,125 @@
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+
+import modules.preprocessing as preprocessing
+from modules.preprocessing import (
+    MORE_STOPWORDS,
+    VADER_COLUMNS,
+    ReviewCleaner,
+    score_sentiment,
+)
+from modules.text_cache import TextCache, text_key
+
+TEXTS = [
+    "wonderful story love character",
+    "boring plot terrible ending",
+    "",
+    None,
+    "wonderful story love character",
+    "detective murder case",
+    "great great great fun",
+]
+
+STOP_WORDS = ["the", "and", "not", "was", "this", "you", "her", "his"]
+# words, contractions, numbers, symbols and URLs reviews are made of
+PIECES = (
+    "The the AND and book Book don't Won't isn't it's wasn't reader's magic "
+    "Dragons! #fantasy a an of 3 1984 well-written e-mail page-turner 5/5 "
+    'stars... I LOVED it (sort of) "quoted" café naïve -- &amp; \n\t '
+    "http://www.example.com/page.html"
+).split(" ")
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_scores_match_vader(n_jobs):
+    scores = score_sentiment(TEXTS, n_jobs=n_jobs, chunksize=2)
+    analyzer = SentimentIntensityAnalyzer()
+    expected = [analyzer.polarity_scores(text or "") for text in TEXTS]
+
+    assert list(scores.columns) == VADER_COLUMNS
+    for col in VADER_COLUMNS:
+        polarity = [text_scores[col[len("vader_") :]] for text_scores in expected]
+        assert np.allclose(scores[col], polarity, atol=1e-6), col
+
+
+def test_cached_scores_are_reused(tmp_path, monkeypatch):
+    cache_path = str(tmp_path / "cache.db")
+    scored = []
+    original = preprocessing._score_sentiment_chunk
+
+    def record(texts):
+        scored.extend(texts)
+        return original(texts)
+
+    monkeypatch.setattr(preprocessing, "_score_sentiment_chunk", record)
+    first = score_sentiment(TEXTS, cache_path=cache_path)
+    # repeated and missing reviews are scored once
+    assert sorted(scored) == sorted(set(text or "" for text in TEXTS))
+
+    scored.clear()
+    second = score_sentiment(TEXTS + ["a new review"], cache_path=cache_path)
+    assert scored == ["a new review"]
+    assert second.iloc[: len(TEXTS)].equals(first)
+
+    # the cache is keyed by the hash of each review
+    with TextCache(cache_path, "sentiment") as cache:
+        cached = cache.get_many([text_key(TEXTS[0])])
+        assert cached[text_key(TEXTS[0])] == first.iloc[0].tolist()
+        cache.put_many([(text_key(TEXTS[1]), [0.5, 0.25, 0.5, 0.25])])
+    scores = score_sentiment(TEXTS[:2], cache_path=cache_path)
+    assert scores.iloc[1].tolist() == [0.5, 0.25, 0.5, 0.25]
+    assert scored == ["a new review"]
+
+
+def random_reviews(n_reviews, seed=0):
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(PIECES) for _ in range(rng.randint(0, 25)))
+        for _ in range(n_reviews)
+    ]
+
+
+def notebook_clean(reviews, stop_words):
+    """The cleaning cells of all_lda_models.ipynb."""
+    processed = reviews.str.replace("n't", " not", regex=True).str.replace(
+        "[^a-zA-Z#]", " ", regex=True
+    )
+    processed = processed.apply(
+        lambda x: " ".join([w for w in x.split() if len(w) > 2])
+    )
+
+    def remove_stopwords(rev):
+        return " ".join([i for i in rev if i not in stop_words])
+
+    cleaned = [remove_stopwords(r.split()) for r in processed]
+    return [r.lower() for r in cleaned]
+
+
+def test_cleaner_matches_the_notebooks():
+    reviews = pd.Series(random_reviews(300))
+    stop_words = STOP_WORDS + MORE_STOPWORDS
+    expected = notebook_clean(reviews, stop_words)
+
+    cleaner = ReviewCleaner(STOP_WORDS, extra_stop_words=MORE_STOPWORDS)
+    assert [cleaner.clean(review) for review in reviews] == expected
+    assert list(cleaner.clean_series(reviews)) == expected
+    assert list(cleaner.tokenize_series(reviews)) == [r.split() for r in expected]
+    assert list(cleaner.stream(reviews)) == [r.split() for r in expected]
+    # stopwords are matched before lowercasing, as in the notebooks
+    assert cleaner.clean("The BOOK and the Magic") == "the book magic"
+
+
+def test_missing_reviews_are_empty():
+    cleaner = ReviewCleaner(STOP_WORDS)
+    reviews = pd.Series(["Magic dragons", None, np.nan], index=[3, 4, 5])
+    assert cleaner.tokenize(None) == []
+    assert cleaner.clean(np.nan) == ""
+    assert cleaner.clean_series(reviews).to_dict() == {
+        3: "magic dragons",
+        4: "",
+        5: "",
+    }
@@ -0,0 +1,61 @@
+import time
+
+from requests.structures import CaseInsensitiveDict
+
+from modules.http_client import FetchedPage
+from modules.rate_limiter import AdaptiveScheduler
+
+
+def respond(status_code):
+    def request(key):
+        return FetchedPage(status_code, CaseInsensitiveDict(), b"")
+
+    return request
+
+
+def test_successes_raise_the_concurrency():
+    scheduler = AdaptiveScheduler(max_concurrency=8)
+    for key in range(10):
+        scheduler.fetch(respond(200), key)
+    assert scheduler.concurrency > 1
+
+
+def test_client_errors_leave_the_concurrency_unchanged():
+    scheduler = AdaptiveScheduler(max_concurrency=8)
+    for key in range(10):
+        assert scheduler.fetch(respond(404), key) is None
+    assert scheduler.concurrency == 1
+    assert scheduler.failed == {key: "HTTP 404" for key in range(10)}
+
+
+def test_throttled_requests_lower_the_concurrency():
+    scheduler = AdaptiveScheduler(
+        max_concurrency=8, initial_concurrency=8, max_retries=0
+    )
+    scheduler.fetch(respond(429), 0)
+    assert scheduler.concurrency == 4
+
+
+def test_available_responses_skip_the_rate_limit():
+    scheduler = AdaptiveScheduler(requests_per_second=1)
+    sent = []
+
+    def request(key):
+        sent.append(key)
+        return FetchedPage(200, CaseInsensitiveDict(), b"sent")
+
+    def lookup(key):
+        if key % 10:
+            return FetchedPage(200, CaseInsensitiveDict(), b"cached", True)
+        return None
+
+    start = time.perf_counter()
+    responses = dict(scheduler.map(request, range(1, 21), lookup=lookup))
+    elapsed = time.perf_counter() - start
+
+    # at one request per second, sending every key would take 19 seconds
+    assert elapsed < 5
+    assert sent == [10, 20]
+    assert responses[10].content == b"sent"
+    assert all(responses[key].content == b"cached" for key in range(1, 10))
+    assert scheduler.stats["cached"] == 18
@@ -0,0 +1,158 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+
+from modules.checkpoint import ScrapeCheckpoint
+from modules.html_store import HtmlStore
+from modules.scraper import scrape_pages, write_htmls_to_csv, write_htmls_to_store
+from tests.stub_servers import stub_librarything_server
+
+BOOKS = [1, 2, 113, 4, 5, 213, 7]
+FAILING = [113, 213]
+
+
+@pytest.fixture(scope="module")
+def url_template():
+    with stub_librarything_server(latency=0.01) as url_template:
+        yield url_template
+
+
+def test_scrape_pages_keeps_order_and_reports_failures(url_template):
+    pages = list(
+        scrape_pages(
+            BOOKS, max_workers=4, requests_per_second=200, url_template=url_template
+        )
+    )
+    assert [book_id for book_id, _ in pages] == BOOKS
+    for book_id, raw_html in pages:
+        if book_id in FAILING:
+            assert raw_html is None
+        else:
+            assert f"<h1>Book {book_id}</h1>" in raw_html
+
+
+def test_write_htmls_to_csv(tmp_path, url_template, capsys):
+    path = write_htmls_to_csv(
+        BOOKS,
+        str(tmp_path),
+        max_workers=4,
+        requests_per_second=200,
+        url_template=url_template,
+        max_retries=1,
+        backoff_base=0.01,
+    )
+    rows = pd.read_csv(path)
+    expected = [book_id for book_id in BOOKS if book_id not in FAILING]
+    assert list(rows.columns) == ["book_id", "raw_html"]
+    assert list(rows.book_id) == expected
+    assert all(
+        f"<h1>Book {book_id}</h1>" in raw_html
+        for book_id, raw_html in zip(rows.book_id, rows.raw_html)
+    )
+    assert f"Pages scraped incorrectly: {FAILING}" in capsys.readouterr().out
+
+
+def test_write_htmls_to_csv_resumes_from_checkpoint(tmp_path, url_template):
+    checkpoint_path = str(tmp_path / "checkpoint.db")
+    kwargs = dict(
+        max_workers=2,
+        requests_per_second=200,
+        url_template=url_template,
+        checkpoint_path=checkpoint_path,
+        max_retries=0,
+    )
+    first_path = write_htmls_to_csv(BOOKS[:3], str(tmp_path), **kwargs)
+    second_path = write_htmls_to_csv(BOOKS, str(tmp_path), **kwargs)
+    assert second_path == first_path
+    rows = pd.read_csv(second_path)
+    assert sorted(rows.book_id) == [1, 2, 4, 5, 7]
+    assert not rows.book_id.duplicated().any()
+
+
+def test_write_htmls_to_store(tmp_path, url_template):
+    store_path = str(tmp_path / "pages.db")
+    write_htmls_to_store(
+        BOOKS,
+        store_path,
+        max_workers=4,
+        requests_per_second=200,
+        url_template=url_template,
+        max_retries=0,
+    )
+    with HtmlStore(store_path) as store:
+        assert sorted(store.book_ids()) == [1, 2, 4, 5, 7]
+        assert "<h1>Book 4</h1>" in store.get(4)
+        assert store.get(113) is None
+
+
+def test_write_htmls_to_csv_gives_up_after_max_attempts(
+    tmp_path, url_template, capsys
+):
+    kwargs = dict(
+        requests_per_second=200,
+        url_template=url_template,
+        checkpoint_path=str(tmp_path / "checkpoint.db"),
+        max_retries=0,
+        max_attempts=2,
+    )
+    for _ in range(2):
+        write_htmls_to_csv([1, 150], str(tmp_path), **kwargs)
+    capsys.readouterr()
+
+    write_htmls_to_csv([1, 150], str(tmp_path), **kwargs)
+    out = capsys.readouterr().out
+    assert "Pages scraped incorrectly: []" in out
+    assert "Pages given up on after 2 attempts: [150]" in out
+
+
+def test_only_failures_that_may_go_away_are_retried(tmp_path):
+    requests = Counter()
+    with stub_librarything_server(
+        latency=0.01, flaky=[2], requests=requests
+    ) as url_template:
+        not_retried = set()
+        pages = list(
+            scrape_pages(
+                [1, 2, 113, 150],
+                requests_per_second=200,
+                url_template=url_template,
+                max_retries=2,
+                backoff_base=0.01,
+                not_retried=not_retried,
+            )
+        )
+        assert [book_id for book_id, raw_html in pages if raw_html] == [1, 2]
+        assert requests == {1: 1, 2: 2, 113: 1, 150: 3}
+        assert not_retried == {113}
+
+        checkpoint_path = str(tmp_path / "checkpoint.db")
+        kwargs = dict(
+            requests_per_second=200,
+            url_template=url_template,
+            checkpoint_path=checkpoint_path,
+            max_retries=0,
+        )
+        write_htmls_to_csv([113, 150], str(tmp_path), **kwargs)
+        write_htmls_to_csv([113, 150], str(tmp_path), **kwargs)
+        # the 404 is done with, the 503 is tried again on the next run
+        assert requests[113] == 2
+        assert requests[150] == 5
+        with ScrapeCheckpoint(checkpoint_path) as checkpoint:
+            assert checkpoint.completed_ids() == {113}
+            assert checkpoint.failed_ids() == [150]
+
+
+def test_checkpoint_is_closed_on_errors(tmp_path, monkeypatch):
+    closed = []
+    monkeypatch.setattr(
+        "modules.scraper.ScrapeCheckpoint.close", lambda self: closed.append(True)
+    )
+    with pytest.raises(ValueError):
+        write_htmls_to_csv(
+            [1],
+            str(tmp_path),
+            requests_per_second=0,
+            checkpoint_path=str(tmp_path / "checkpoint.db"),
+        )
+    assert closed == [True]
@@ -0,0 +1,108 @@
+from collections import Counter
+
+import pandas as pd
+import pytest
+from gensim import corpora
+from gensim.models import LdaModel
+
+import modules.streaming_corpus as streaming_corpus
+from extra_info.helper_functions.dataset_loader import iter_dataset_chunks
+from modules.streaming_corpus import StreamingCorpus, update_lda_model
+
+DUMP = """{'comment': 'a great read', 'work': '1'}
+{'comment': 'slow start', 'work': '2'}
+not an entry
+{'comment': 'loved the ending', 'work': '3'}
+"""
+
+
+class SplittingCleaner:
+    """Stand-in for ReviewCleaner, which needs the NLTK stopwords."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def tokenize_series(self, reviews):
+        self.calls += 1
+        return reviews.str.split()
+
+
+def fake_lemmatize(tokenized_reviews, tags, n_process):
+    # spaCy isn't needed to check the corpus bookkeeping
+    return iter(tokenized_reviews)
+
+
+def test_dataset_chunks_count_entries_without_printing(tmp_path, capsys):
+    path = tmp_path / "reviews.txt"
+    path.write_text(DUMP)
+    counts = Counter()
+    chunks = list(iter_dataset_chunks(str(path), chunksize=2, counts=counts))
+
+    assert [len(chunk) for chunk in chunks] == [2, 1]
+    assert counts == {"entries": 3, "problems": 1}
+    assert capsys.readouterr().out == ""
+
+
+def test_len_is_counted_once(tmp_path, monkeypatch, capsys):
+    path = tmp_path / "reviews.txt"
+    path.write_text(DUMP)
+    passes = []
+
+    def counting_lemmatize(tokenized_reviews, tags, n_process):
+        passes.append(len(tokenized_reviews))
+        return fake_lemmatize(tokenized_reviews, tags, n_process)
+
+    monkeypatch.setattr(streaming_corpus, "lemmatize_text_stream", counting_lemmatize)
+    corpus = StreamingCorpus(
+        str(path),
+        column="comment",
+        chunksize=2,
+        min_review_length=3,
+        cleaner=SplittingCleaner(),
+    )
+
+    with pytest.raises(TypeError):
+        len(corpus)
+    assert passes == []
+
+    dictionary = corpus.build_dictionary()
+    n_chunks = len(passes)
+    assert len(corpus) == 2
+    assert len(passes) == n_chunks
+    assert [len(bow) for bow in corpus] == [3, 3]
+    assert len(dictionary) == 6
+    assert capsys.readouterr().out == ""
+
+
+def test_len_after_a_pass(tmp_path, monkeypatch):
+    path = tmp_path / "reviews.csv"
+    pd.DataFrame({"reviews": ["one two", "three", "four five six"]}).to_csv(
+        path, index=False
+    )
+    monkeypatch.setattr(streaming_corpus, "lemmatize_text_stream", fake_lemmatize)
+    corpus = StreamingCorpus(str(path), cleaner=SplittingCleaner())
+    corpus.build_dictionary()
+
+    monkeypatch.setattr(streaming_corpus, "lemmatize_text_stream", None)
+    assert len(corpus) == 3
+
+
+def test_update_processes_the_new_reviews_once(tmp_path, monkeypatch):
+    path = tmp_path / "reviews.csv"
+    reviews = ["great plot twist", "slow plot", "great ending", "twist ending"]
+    pd.DataFrame({"reviews": reviews}).to_csv(path, index=False)
+    monkeypatch.setattr(streaming_corpus, "lemmatize_text_stream", fake_lemmatize)
+    texts = [review.split() for review in reviews]
+    dictionary = corpora.Dictionary(texts)
+    model = LdaModel(
+        [dictionary.doc2bow(text) for text in texts],
+        id2word=dictionary,
+        num_topics=2,
+        random_state=1,
+    )
+    cleaner = SplittingCleaner()
+
+    update_lda_model(model, str(path), chunksize=2, cleaner=cleaner)
+    # one chunk of reviews, cleaned once
+    assert cleaner.calls == 1
+    assert model.state.numdocs == 2 * len(reviews)
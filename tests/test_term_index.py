@@ -0,0 +1,48 @@
+from collections import Counter
+
+import pandas as pd
+
+from modules.benchmarks import benchmark_word_frequencies
+from modules.term_index import TermIndex
+
+REVIEWS = pd.DataFrame(
+    {
+        "reviews": [
+            "Harry_potter is great , great fun",
+            "harry_potter and the Dragon dragon dragon",
+            "fun fun It's a great read",
+            "the dragon's lair",
+        ],
+        "book_genres": ["fantasy", "fantasy", "fiction", "fantasy"],
+        "id": ["1", "1", "2", "3"],
+    }
+)
+
+
+def word_counts(reviews):
+    # as counted by the FreqDist of generate_word_counts_fig
+    return Counter(" ".join(reviews).split())
+
+
+def test_counts_match_whitespace_tokens():
+    index = TermIndex.build(REVIEWS)
+    fantasy = REVIEWS.reviews[REVIEWS.book_genres == "fantasy"]
+    assert index.term_frequencies("fantasy").to_dict() == word_counts(fantasy)
+    assert index.term_frequencies().to_dict() == word_counts(REVIEWS.reviews)
+    assert index.term_frequencies(book_id="1")["Harry_potter"] == 1
+    top = index.top_terms("fantasy", n=3)
+    assert list(top.items()) == [("dragon", 2), ("great", 2), ("the", 2)]
+
+
+def test_stop_words_match_in_any_case():
+    index = TermIndex.build(REVIEWS)
+    counts = index.term_frequencies(stop_words=["the", "it's", "HARRY_POTTER"])
+    assert "It's" not in counts
+    assert "the" not in counts
+    assert "Harry_potter" not in counts and "harry_potter" not in counts
+    assert counts["Dragon"] == 1
+
+
+def test_benchmark_agrees_with_freqdist():
+    results = benchmark_word_frequencies(REVIEWS, ["fantasy", "fiction"], terms=3)
+    assert results["identical_counts"] == 1.0
@@ -0,0 +1,176 @@
+import json
+import threading
+import time
+from concurrent.futures import Future
+from urllib.error import HTTPError
+from urllib.request import Request, urlopen
+
+import numpy as np
+import pytest
+from gensim import corpora
+from gensim.models import LdaModel
+
+import modules.phrases as phrases
+import modules.topic_inference as topic_inference
+from modules.preprocessing import ReviewCleaner
+from modules.topic_inference import TopicInferenceService, make_topic_server
+
+
+class FakeService:
+    """Stand-in for TopicInferenceService, which needs a model and spaCy.
+    Reviews starting with "fail" raise, those starting with "hang" never
+    get their topics.
+    """
+
+    def submit(self, review):
+        future = Future()
+        if review.startswith("fail"):
+            future.set_exception(RuntimeError("inference failed"))
+        elif not review.startswith("hang"):
+            future.set_result({"dominant_topic": "topic_1", "review": review})
+        return future
+
+
+@pytest.fixture
+def url():
+    server = make_topic_server(FakeService(), port=0, timeout=0.2)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/topics"
+    server.shutdown()
+    server.server_close()
+
+
+def post(url, body):
+    data = body if isinstance(body, bytes) else json.dumps(body).encode()
+    try:
+        with urlopen(Request(url, data=data, method="POST"), timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_topics_of_one_and_several_reviews(url):
+    assert post(url, {"review": "good"}) == (
+        200,
+        {"dominant_topic": "topic_1", "review": "good"},
+    )
+    status, response = post(url, {"reviews": ["a", "b"]})
+    assert status == 200
+    assert [topics["review"] for topics in response] == ["a", "b"]
+
+
+@pytest.mark.parametrize(
+    "body", [b"not json", {"text": "good"}, {"reviews": "good"}, {"review": 1}, [1]]
+)
+def test_invalid_requests(url, body):
+    status, response = post(url, body)
+    assert status == 400
+    assert "error" in response
+
+
+def test_inference_errors(url):
+    status, response = post(url, {"reviews": ["good", "fail"]})
+    assert status == 500
+    assert "inference failed" in response["error"]
+
+
+def test_timeouts(url):
+    for body in [{"review": "hang"}, {"reviews": ["good", "hang"]}]:
+        status, response = post(url, body)
+        assert status == 503
+        assert "error" in response
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Reviews lemmatized together, by a stand-in for spaCy that fails on
+    reviews containing "broken".
+    """
+    batches = []
+
+    def fake_lemmatize(texts, tags=None, batch_size=None, n_process=None):
+        texts = [list(words) for words in texts]
+        batches.append(texts)
+        if any("broken" in words for words in texts):
+            raise ValueError("broken review")
+        return iter(texts)
+
+    monkeypatch.setattr(topic_inference, "get_nlp", lambda: None)
+    monkeypatch.setattr(phrases, "lemmatize_text_stream", fake_lemmatize)
+    return batches
+
+
+@pytest.fixture
+def model_path(tmp_path):
+    texts = [
+        "wizard spell magic castle dragon".split(),
+        "detective murder weapon case police".split(),
+    ] * 20
+    dictionary = corpora.Dictionary(texts)
+    model = LdaModel(
+        [dictionary.doc2bow(text) for text in texts],
+        id2word=dictionary,
+        num_topics=2,
+        passes=5,
+        random_state=1,
+    )
+    path = str(tmp_path / "lda.model")
+    model.save(path)
+    return path
+
+
+def make_service(model_path, **kwargs):
+    return TopicInferenceService(model_path, cleaner=ReviewCleaner([]), **kwargs)
+
+
+def test_service_predicts_the_topics_of_the_model(model_path, batches):
+    model = LdaModel.load(model_path)
+    reviews = ["A wizard casts a magic spell", "The police detective found the case"]
+    with make_service(model_path) as service:
+        responses = [service.predict(review) for review in reviews]
+
+    for review, response in zip(reviews, responses):
+        bow = model.id2word.doc2bow(ReviewCleaner([]).tokenize(review))
+        expected = np.zeros(2)
+        for topic, p in model.get_document_topics(bow, minimum_probability=0):
+            expected[topic] = p
+        topics = [response["topics"][name] for name in ["topic_1", "topic_2"]]
+        # inference starts from a random point, so results differ slightly
+        assert np.allclose(topics, expected, atol=0.02)
+        assert response["dominant_topic"] == f"topic_{expected.argmax() + 1}"
+    assert responses[0]["dominant_topic"] != responses[1]["dominant_topic"]
+
+
+def test_queued_reviews_are_batched(model_path, batches):
+    with make_service(model_path, max_batch_size=4, max_wait=0.5) as service:
+        futures = [service.submit(f"magic review {i}") for i in range(10)]
+        responses = [future.result(5) for future in futures]
+
+    assert [len(batch) for batch in batches] == [4, 4, 2]
+    assert [words for batch in batches for words in batch] == [["magic", "review"]] * 10
+    assert all(response["dominant_topic"] for response in responses)
+
+
+def test_partial_batches_are_sent_after_max_wait(model_path, batches):
+    with make_service(model_path, max_batch_size=64, max_wait=0.1) as service:
+        start = time.monotonic()
+        service.predict("magic spell", timeout=5)
+        elapsed = time.monotonic() - start
+    assert 0.1 <= elapsed < 2
+    assert [len(batch) for batch in batches] == [1]
+
+
+def test_inference_errors_reach_every_review_of_the_batch(model_path, batches):
+    service = make_service(model_path, max_batch_size=2, max_wait=0.5)
+    with pytest.raises(RuntimeError, match="must be started"):
+        service.submit("magic")
+
+    with service:
+        futures = [service.submit(review) for review in ["magic", "broken"]]
+        for future in futures:
+            with pytest.raises(ValueError, match="broken review"):
+                future.result(5)
+        # the worker keeps serving later batches
+        assert service.predict("magic spell", timeout=5)["topics"]
+    assert service._worker is None
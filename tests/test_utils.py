@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import modules.utils as utils
+from modules.text_cache import TextCache, text_key
+from modules.utils import create_final_dataset, detect_languages, looks_english
+
+ENGLISH = "I loved this book and I think that it is one of the best I have read"
+REVIEWS = [
+    ENGLISH,
+    "Un roman magnifique, je le recommande à tous les lecteurs de fantasy",
+    "Great read!",
+    "",
+    None,
+    ENGLISH,
+    "Ein wunderbares Buch, das ich jedem empfehlen kann",
+    "Great read!",
+]
+
+
+def make_inputs():
+    reviews = pd.DataFrame(
+        {
+            "reviews": ["great", "dull", "fine", "long", "short", "odd", "meh"],
+            "stars": ["5", "2", "3", "4", "1", "3", "2"],
+            "n_helpful": ["3", "0", "1", "2", "0", "5", "1"],
+            "time": ["t1", "t2", "t3", "t4", "t5", "t6", "t7"],
+            "user": ["ann", None, "bob", None, "cat", "dan", "eve"],
+            "id": ["30", "4", "30", "200", "4", "9", np.nan],
+        }
+    )
+    book_info = pd.DataFrame(
+        {
+            "book_title": ["Z", "A", "B", "C", "D"],
+            "author": ["zed", "amy", "ben", "cid", np.nan],
+            "isbn": ["1", "2", "3", "4", "5"],
+            "id": ["200", "4", "30", "77", "9"],
+        }
+    )
+    genres = pd.DataFrame(
+        {
+            "isbn": ["2", "3", "1", "4"],
+            "goodreads_shelves": ["{}", "{}", "{}", "{}"],
+            "book_genres": [
+                "['science fiction', 'fantasy']",
+                "['fiction']",
+                "['young adult', 'romance', 'drama']",
+                np.nan,
+            ],
+            "id": ["4", "30", "200", "77"],
+        }
+    )
+    return reviews, book_info, genres
+
+
+def test_compact_final_dataset_matches_original():
+    original = create_final_dataset(*make_inputs())
+    compact = create_final_dataset(*make_inputs(), compact=True)
+
+    assert list(compact.columns) == list(original.columns)
+    pd.testing.assert_frame_equal(
+        compact.astype(str), original.astype(str).reset_index(drop=True)
+    )
+    assert set(compact.book_genres) == {"sciencefiction", "fiction", "youngadult"}
+    assert compact.id.astype(str).tolist() == original.id.tolist()
+
+
+def test_compact_final_dataset_leaves_inputs_unchanged():
+    inputs = make_inputs()
+    copies = [df.copy() for df in inputs]
+    create_final_dataset(*inputs, compact=True)
+    for df, copy in zip(inputs, copies):
+        pd.testing.assert_frame_equal(df, copy)
+
+
+def test_looks_english():
+    assert looks_english(ENGLISH)
+    # too short, not English, or not only ASCII
+    assert not looks_english("Great read!")
+    assert not looks_english(REVIEWS[6])
+    assert not looks_english(ENGLISH.replace("book", "livre éblouissant"))
+    assert not looks_english("")
+    assert not looks_english(np.nan)
+
+
+def fake_detect_language(text):
+    # stands in for langdetect, whose results are random for short texts
+    if not isinstance(text, str) or not text:
+        return ""
+    return {"Un": "fr", "Ei": "de"}.get(text[:2], "en")
+
+
+@pytest.fixture
+def detected(monkeypatch):
+    """Texts passed to the language detector."""
+    texts = []
+
+    def detect_language(text):
+        texts.append(text)
+        return fake_detect_language(text)
+
+    monkeypatch.setattr(utils, "detect_language", detect_language)
+    return texts
+
+
+EXPECTED = ["en", "fr", "en", "", "", "en", "de", "en"]
+
+
+def test_obviously_english_reviews_skip_the_detector(detected):
+    assert detect_languages(REVIEWS) == EXPECTED
+    # each review is detected once
+    assert detected == REVIEWS[1:5] + REVIEWS[6:7]
+
+    detected.clear()
+    assert detect_languages(REVIEWS, fast_path=False) == EXPECTED
+    assert detected == REVIEWS[:5] + REVIEWS[6:7]
+
+
+def test_detected_languages_are_cached(tmp_path, detected):
+    cache_path = str(tmp_path / "cache.db")
+    assert detect_languages(REVIEWS, cache_path=cache_path) == EXPECTED
+    detected.clear()
+    assert detect_languages(REVIEWS + ["Ein Buch"], cache_path=cache_path) == (
+        EXPECTED + ["de"]
+    )
+    assert detected == ["Ein Buch"]
+
+    # the cache is keyed by the hash of each review
+    with TextCache(cache_path, "languages") as cache:
+        assert cache.get_many([text_key(REVIEWS[1])]) == {text_key(REVIEWS[1]): "fr"}
+        cache.put_many([(text_key(REVIEWS[2]), "es")])
+    assert detect_languages(REVIEWS[:3], cache_path=cache_path) == ["en", "fr", "es"]
+    assert detected == ["Ein Buch"]
+
+
+def test_languages_detected_in_parallel_match(monkeypatch):
+    monkeypatch.setattr(utils, "detect_language", fake_detect_language)
+    assert detect_languages(REVIEWS * 5, n_jobs=2, chunksize=3) == EXPECTED * 5